@@ -4,7 +4,7 @@ from models import (
     RequisicionCompra, DetalleRequisicion, CotizacionCompra, DetalleCotizacionCompra,
     OrdenCompra, DetalleOrdenCompra, FacturaCompra, DetalleFacturaCompra,
     CotizacionVenta, DetalleCotizacionVenta, Remision, DetalleRemision,
-    FacturaVenta, DetalleFacturaVenta, ConfiguracionSistema
+    FacturaVenta, DetalleFacturaVenta
 )
 from datetime import datetime
 import os
@@ -13,52 +13,103 @@ from utils.import_utils import (
     importar_proveedores_desde_csv, 
     importar_clientes_desde_csv, 
     importar_productos_desde_csv,
-    generar_ejemplo_csv
+    generar_ejemplo_csv,
+    iniciar_importacion,
+    obtener_importacion
 )
 import io
-from flask import send_file
+from flask import send_file, send_from_directory, abort
 from utils.pos_utils import (
     procesar_venta, 
     buscar_producto_por_codigo,
-    obtener_resumen_ventas
+    obtener_resumen_ventas,
+    obtener_version_catalogo,
+    obtener_catalogo_pos,
+    inicializar_version_catalogo,
+    cancelar_venta
+)
+from utils.indice_productos import indice_productos
+from utils.carrito_utils import almacen_carrito, depurar_carritos
+from utils.paginacion_utils import paginar_listado, cache_conteos
+from utils.busqueda_utils import inicializar_indice_busqueda, buscar_productos_texto
+from utils.metricas_utils import metricas_dashboard, iniciar_reconciliacion_periodica
+from utils.base_datos_utils import configurar_base_datos, registrar_pragmas, solo_lectura
+from utils.resumen_ventas_utils import (
+    resumen_pendiente_de_construir,
+    reconstruir_resumen_ventas,
+    obtener_ventas_por_hora,
+    obtener_ventas_por_producto
 )
 import json
-from facturacion_utils import generar_xml_cfdi, generar_qr_cfdi, generar_timbre_fiscal
-from utils.corporativo_utils import generar_folio, convertir_documento, obtener_estados_siguientes, validar_conversion
+import uuid
+from utils.cfdi_utils import obtener_cfdi_venta
+from utils.configuracion_utils import cache_configuracion
+from utils.consultas_utils import opciones_documento, registrar_contador_consultas
+from utils.instrumentacion_utils import registrar_instrumentacion, registro_metricas
+from utils.perfilador_utils import registrar_perfilador, acceso_perfiles, listar_perfiles, directorio_perfiles
+from utils.analitica_utils import cache_analitica, top_productos, top_clientes, matriz_mapa_calor
+from utils.exportacion_utils import EXPORTACIONES, FORMATOS, exportar
+from utils.reabastecimiento_utils import calcular_sugerencias, ejecutar_reabastecimiento, iniciar_reabastecimiento_nocturno
+from utils.impuestos_utils import calcular_impuestos_venta
+from utils.facturacion_lote_utils import seleccionar_ventas_para_facturar, iniciar_lote_facturacion, obtener_lote
+from utils.corporativo_utils import (
+    generar_folio, convertir_documento, convertir_documentos, transicionar_documentos,
+    obtener_estados_siguientes, validar_conversion
+)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'clave_secreta_tienda_abarrotes_2024'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///tienda_abarrotes.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///tienda_abarrotes.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Cabecera X-Consultas y aviso en el log cuando una ruta pasa su presupuesto de consultas
+app.config['CONTAR_CONSULTAS'] = os.environ.get('CONTAR_CONSULTAS') == '1'
+# Duración, consultas SQL y filas leídas por ruta, publicadas en /metrics
+app.config['INSTRUMENTACION'] = os.environ.get('INSTRUMENTACION', '1') == '1'
+# Perfilador por muestreo: por petición con el token (X-Perfilar o ?perfilar=) o una fracción del tráfico
+app.config['PERFILADOR_TOKEN'] = os.environ.get('PERFILADOR_TOKEN')
+app.config['PERFILADOR_MUESTREO'] = float(os.environ.get('PERFILADOR_MUESTREO', '0'))
+# Hora local (0-23) de la generación nocturna de requisiciones de reabastecimiento; vacía la desactiva
+app.config['REABASTECIMIENTO_HORA'] = int(os.environ['REABASTECIMIENTO_HORA']) if os.environ.get('REABASTECIMIENTO_HORA') else None
 
+# WAL, pragmas y pool para SQLite, más conexiones de solo lectura para reportes
+configurar_base_datos(app)
 db.init_app(app)
+registrar_instrumentacion(app)
+registrar_perfilador(app)
+registrar_pragmas(app)
+registrar_contador_consultas(app)
 
 # Context processor para agregar variables globales a todos los templates
 @app.context_processor
 def inject_global_vars():
     return {
         'now': datetime.now(),
-        'current_year': datetime.now().year
+        'current_year': datetime.now().year,
+        'configuracion_sistema': cache_configuracion.todas()
     }
 
 # Crear tablas al inicio
 with app.app_context():
     db.create_all()
+    indice_productos.cargar()
+    inicializar_indice_busqueda()
+    inicializar_version_catalogo()
+    metricas_dashboard.reconciliar()
+    if resumen_pendiente_de_construir():
+        reconstruir_resumen_ventas()
+    depurar_carritos()
+
+# Junto con las métricas se borran los carritos abandonados
+iniciar_reconciliacion_periodica(app, tareas=[depurar_carritos])
+if app.config['REABASTECIMIENTO_HORA'] is not None:
+    iniciar_reabastecimiento_nocturno(app, app.config['REABASTECIMIENTO_HORA'])
 
 # ========== RUTAS PRINCIPALES ==========
 @app.route('/')
 def index():
     try:
-        total_proveedores = Proveedor.query.count() or 0
-        total_clientes = Cliente.query.count() or 0
-        total_productos = Producto.query.count() or 0
-        productos_bajo_stock = Producto.query.filter(Producto.stock <= Producto.stock_minimo).count() or 0
-        
-        return render_template('index.html',
-                             total_proveedores=total_proveedores,
-                             total_clientes=total_clientes,
-                             total_productos=total_productos,
-                             productos_bajo_stock=productos_bajo_stock)
+        # Contadores en memoria, mantenidos por metricas_utils
+        return render_template('index.html', **metricas_dashboard.obtener())
     except Exception as e:
         return render_template('index.html',
                              total_proveedores=0,
@@ -67,10 +118,30 @@ def index():
                              productos_bajo_stock=0)
 
 # ========== MÓDULO DE PROVEEDORES ==========
+def _paginar_proveedores(args):
+    return paginar_listado(Proveedor.query, Proveedor.nombre, Proveedor.id, args, 'proveedores', {})
+
 @app.route('/proveedores')
 def lista_proveedores():
-    proveedores = Proveedor.query.order_by(Proveedor.nombre).all()
-    return render_template('proveedores/lista.html', proveedores=proveedores)
+    proveedores, paginacion = _paginar_proveedores(request.args)
+    return render_template('proveedores/lista.html', proveedores=proveedores, paginacion=paginacion)
+
+@app.route('/api/proveedores')
+@solo_lectura()
+def api_lista_proveedores():
+    proveedores, paginacion = _paginar_proveedores(request.args)
+    return jsonify({
+        'items': [{
+            'id': p.id,
+            'nombre': p.nombre,
+            'contacto': p.contacto,
+            'telefono': p.telefono,
+            'email': p.email,
+            'rfc': p.rfc
+        } for p in proveedores],
+        'total': paginacion['total'],
+        'siguiente_cursor': paginacion['siguiente_cursor']
+    })
 
 @app.route('/proveedores/nuevo', methods=['GET', 'POST'])
 def nuevo_proveedor():
@@ -96,6 +167,7 @@ def nuevo_proveedor():
             )
             db.session.add(proveedor)
             db.session.commit()
+            cache_conteos.invalidar('proveedores')
             flash('✅ Proveedor creado exitosamente', 'success')
             return redirect(url_for('lista_proveedores'))
         except Exception as e:
@@ -147,6 +219,7 @@ def eliminar_proveedor(id):
             
         db.session.delete(proveedor)
         db.session.commit()
+        cache_conteos.invalidar('proveedores')
         flash('✅ Proveedor eliminado exitosamente', 'success')
     except Exception as e:
         db.session.rollback()
@@ -155,18 +228,38 @@ def eliminar_proveedor(id):
     return redirect(url_for('lista_proveedores'))
 
 # ========== MÓDULO DE CLIENTES ==========
-@app.route('/clientes')
-def lista_clientes():
-    tipo = request.args.get('tipo', 'all')
+def _paginar_clientes(args):
+    tipo = args.get('tipo', 'all')
     
-    if tipo == 'mostrador':
-        clientes = Cliente.query.filter_by(tipo_cliente='mostrador').order_by(Cliente.nombre).all()
-    elif tipo == 'registrado':
-        clientes = Cliente.query.filter_by(tipo_cliente='registrado').order_by(Cliente.nombre).all()
-    else:
-        clientes = Cliente.query.order_by(Cliente.nombre).all()
+    query = Cliente.query
+    if tipo in ('mostrador', 'registrado'):
+        query = query.filter_by(tipo_cliente=tipo)
     
-    return render_template('clientes/lista.html', clientes=clientes, tipo_seleccionado=tipo)
+    clientes, paginacion = paginar_listado(query, Cliente.nombre, Cliente.id, args, 'clientes', {'tipo': tipo})
+    return clientes, paginacion, tipo
+
+@app.route('/clientes')
+def lista_clientes():
+    clientes, paginacion, tipo = _paginar_clientes(request.args)
+    return render_template('clientes/lista.html', clientes=clientes, tipo_seleccionado=tipo, paginacion=paginacion)
+
+@app.route('/api/clientes')
+@solo_lectura()
+def api_lista_clientes():
+    clientes, paginacion, tipo = _paginar_clientes(request.args)
+    return jsonify({
+        'items': [{
+            'id': c.id,
+            'nombre': c.nombre,
+            'apellido': c.apellido,
+            'telefono': c.telefono,
+            'email': c.email,
+            'tipo_cliente': c.tipo_cliente,
+            'rfc': c.rfc
+        } for c in clientes],
+        'total': paginacion['total'],
+        'siguiente_cursor': paginacion['siguiente_cursor']
+    })
 
 @app.route('/clientes/nuevo', methods=['GET', 'POST'])
 def nuevo_cliente():
@@ -194,6 +287,7 @@ def nuevo_cliente():
             )
             db.session.add(cliente)
             db.session.commit()
+            cache_conteos.invalidar('clientes')
             flash('✅ Cliente creado exitosamente', 'success')
             return redirect(url_for('lista_clientes'))
         except Exception as e:
@@ -228,6 +322,7 @@ def editar_cliente(id):
             cliente.uso_cfdi = request.form.get('uso_cfdi', 'G03')
             
             db.session.commit()
+            cache_conteos.invalidar('clientes')
             flash('✅ Cliente actualizado exitosamente', 'success')
             return redirect(url_for('lista_clientes'))
         except Exception as e:
@@ -242,6 +337,7 @@ def eliminar_cliente(id):
         cliente = Cliente.query.get_or_404(id)
         db.session.delete(cliente)
         db.session.commit()
+        cache_conteos.invalidar('clientes')
         flash('✅ Cliente eliminado exitosamente', 'success')
     except Exception as e:
         db.session.rollback()
@@ -250,10 +346,9 @@ def eliminar_cliente(id):
     return redirect(url_for('lista_clientes'))
 
 # ========== MÓDULO DE PRODUCTOS ==========
-@app.route('/productos')
-def lista_productos():
-    categoria = request.args.get('categoria', 'all')
-    stock = request.args.get('stock', 'all')
+def _paginar_productos(args):
+    categoria = args.get('categoria', 'all')
+    stock = args.get('stock', 'all')
     
     query = Producto.query
     
@@ -265,7 +360,13 @@ def lista_productos():
     elif stock == 'sin':
         query = query.filter(Producto.stock == 0)
     
-    productos = query.order_by(Producto.nombre).all()
+    productos, paginacion = paginar_listado(query, Producto.nombre, Producto.id, args, 'productos',
+                                            {'categoria': categoria, 'stock': stock})
+    return productos, paginacion, categoria, stock
+
+@app.route('/productos')
+def lista_productos():
+    productos, paginacion, categoria, stock = _paginar_productos(request.args)
     categorias = db.session.query(Producto.categoria).distinct().all()
     categorias = [cat[0] for cat in categorias if cat[0]]
     
@@ -273,7 +374,28 @@ def lista_productos():
                          productos=productos, 
                          categorias=categorias,
                          categoria_seleccionada=categoria,
-                         stock_seleccionado=stock)
+                         stock_seleccionado=stock,
+                         paginacion=paginacion)
+
+@app.route('/api/productos')
+@solo_lectura()
+def api_lista_productos():
+    productos, paginacion, categoria, stock = _paginar_productos(request.args)
+    return jsonify({
+        'items': [{
+            'id': p.id,
+            'nombre': p.nombre,
+            'codigo': p.codigo,
+            'codigo_barras': p.codigo_barras,
+            'categoria': p.categoria,
+            'precio_venta': p.precio_venta,
+            'stock': p.stock,
+            'stock_minimo': p.stock_minimo,
+            'activo': p.activo
+        } for p in productos],
+        'total': paginacion['total'],
+        'siguiente_cursor': paginacion['siguiente_cursor']
+    })
 
 @app.route('/productos/nuevo', methods=['GET', 'POST'])
 def nuevo_producto():
@@ -317,11 +439,14 @@ def nuevo_producto():
                 unidad_medida_sat=request.form.get('unidad_medida_sat', 'H87'),
                 clave_unidad_sat=request.form.get('clave_unidad_sat', 'E48'),
                 objeto_impuesto_sat=request.form.get('objeto_impuesto_sat', '02'),
+                tasa_iva_sat=request.form.get('tasa_iva_sat', '0.160000'),
                 proveedor_id=int(request.form['proveedor_id'])
             )
             
             db.session.add(producto)
             db.session.commit()
+            indice_productos.invalidar()
+            cache_conteos.invalidar('productos')
             flash('✅ Producto creado exitosamente', 'success')
             return redirect(url_for('lista_productos'))
         except Exception as e:
@@ -373,9 +498,12 @@ def editar_producto(id):
             producto.unidad_medida_sat = request.form.get('unidad_medida_sat', 'H87')
             producto.clave_unidad_sat = request.form.get('clave_unidad_sat', 'E48')
             producto.objeto_impuesto_sat = request.form.get('objeto_impuesto_sat', '02')
+            producto.tasa_iva_sat = request.form.get('tasa_iva_sat', '0.160000')
             producto.proveedor_id = int(request.form['proveedor_id'])
             
             db.session.commit()
+            indice_productos.invalidar()
+            cache_conteos.invalidar('productos')
             flash('✅ Producto actualizado exitosamente', 'success')
             return redirect(url_for('lista_productos'))
         except Exception as e:
@@ -390,6 +518,8 @@ def eliminar_producto(id):
         producto = Producto.query.get_or_404(id)
         db.session.delete(producto)
         db.session.commit()
+        indice_productos.invalidar()
+        cache_conteos.invalidar('productos')
         flash('✅ Producto eliminado exitosamente', 'success')
     except Exception as e:
         db.session.rollback()
@@ -398,21 +528,206 @@ def eliminar_producto(id):
     return redirect(url_for('lista_productos'))
 
 # ========== MÓDULO POS (EXISTENTE) ==========
+def _caja_actual():
+    """Identificador de la caja; la cookie solo guarda este id, el carrito vive en el servidor"""
+    if 'caja_id' not in session:
+        session['caja_id'] = uuid.uuid4().hex
+    return session['caja_id']
+
 @app.route('/pos')
 def punto_venta():
-    if 'carrito' not in session:
-        session['carrito'] = []
-    
-    productos = Producto.query.filter_by(activo=True).all()
-    clientes = Cliente.query.order_by(Cliente.nombre).all()
+    carrito = almacen_carrito().obtener(_caja_actual())
     
+    # El catálogo y los clientes se cargan desde el navegador con /api/pos/catalogo y /api/clientes
     hoy = datetime.now().date()
     resumen = obtener_resumen_ventas(hoy, hoy)
     
-    return render_template('pos/pos.html', 
-                         productos=productos, 
-                         clientes=clientes,
-                         resumen=resumen)
+    return render_template('pos/pos.html', resumen=resumen, carrito=carrito)
+
+@app.route('/pos/agregar-carrito', methods=['POST'])
+def agregar_carrito():
+    producto_id = request.form.get('producto_id', type=int)
+    cantidad = request.form.get('cantidad', 1, type=int)
+    producto = indice_productos.obtener(producto_id) if producto_id else None
+    
+    if not producto or not producto.activo:
+        return jsonify({'success': False, 'message': 'Producto no encontrado'})
+    if cantidad < 1:
+        return jsonify({'success': False, 'message': 'La cantidad debe ser mayor a cero'})
+    
+    caja = _caja_actual()
+    almacen = almacen_carrito()
+    if almacen.cantidad(caja, producto.id) + cantidad > producto.stock:
+        return jsonify({'success': False, 'message': f'Stock insuficiente para {producto.nombre}'})
+    
+    # Solo viaja el renglón que cambió; el navegador lo integra a su copia del carrito
+    item = almacen.agregar(caja, producto.id, producto.nombre, producto.precio_venta, cantidad)
+    return jsonify({'success': True, 'item': item})
+
+@app.route('/pos/actualizar-carrito', methods=['POST'])
+def actualizar_carrito():
+    datos = request.get_json(silent=True) or request.form
+    try:
+        producto_id = int(datos['producto_id'])
+        cantidad = int(datos.get('cantidad', 0))
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Indique producto_id y cantidad'}), 400
+    
+    producto = indice_productos.obtener(producto_id)
+    if producto and cantidad > producto.stock:
+        return jsonify({'success': False, 'message': f'Stock insuficiente para {producto.nombre}'})
+    
+    # cantidad 0 elimina el renglón
+    item = almacen_carrito().actualizar(_caja_actual(), producto_id, cantidad)
+    return jsonify({'success': True, 'item': item, 'producto_id': producto_id})
+
+@app.route('/pos/limpiar-carrito', methods=['POST'])
+def limpiar_carrito():
+    almacen_carrito().limpiar(_caja_actual())
+    return jsonify({'success': True})
+
+@app.route('/pos/procesar-venta', methods=['POST'])
+def pos_procesar_venta():
+    caja = _caja_actual()
+    carrito = almacen_carrito().obtener(caja)
+    cliente_id = request.form.get('cliente_id', type=int)
+    efectivo = request.form.get('efectivo', 0, type=float)
+    
+    venta, error = procesar_venta(carrito, cliente_id=cliente_id, efectivo=efectivo)
+    if error:
+        return jsonify({'success': False, 'message': error})
+    
+    almacen_carrito().limpiar(caja)
+    return jsonify({
+        'success': True,
+        'venta_id': venta.id,
+        'folio': venta.folio,
+        'total': float(venta.total),
+        'cambio': float(venta.cambio or 0)
+    })
+
+@app.route('/api/pos/catalogo')
+@solo_lectura()
+def api_catalogo_pos():
+    version, total = obtener_version_catalogo()
+    desde = request.args.get('desde', '')
+    despues_de = request.args.get('despues_de', 0, type=int)
+    limite = max(1, min(request.args.get('por_pagina', 500, type=int), 2000))
+    
+    etag = f'{version}:{desde}:{despues_de}:{limite}'
+    if request.if_none_match.contains(etag):
+        return Response(status=304)
+    
+    if desde == version:
+        productos = []
+    else:
+        try:
+            productos = obtener_catalogo_pos(desde, despues_de, limite)
+        except ValueError:
+            # Versión ilegible: se responde con el catálogo completo
+            desde = ''
+            productos = obtener_catalogo_pos(None, despues_de, limite)
+    
+    respuesta = jsonify({
+        'version': version,
+        'total': total,
+        'delta': bool(desde),
+        'productos': [p._asdict() for p in productos],
+        'siguiente': productos[-1].id if len(productos) == limite else None
+    })
+    respuesta.set_etag(etag)
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+@app.route('/pos/buscar-producto', methods=['POST'])
+def pos_buscar_producto():
+    codigo = request.form.get('codigo', '')
+    producto = buscar_producto_por_codigo(codigo) if codigo else None
+    
+    if not producto:
+        return jsonify({'success': False, 'message': f'No se encontró el producto con código {codigo}'})
+    
+    return jsonify({'success': True, 'producto': producto._asdict()})
+
+@app.route('/pos/imprimir-ticket/<int:venta_id>')
+def imprimir_ticket(venta_id):
+    venta = Venta.query.options(*opciones_documento(Venta)).get_or_404(venta_id)
+    
+    # Los precios del ticket ya incluyen el IVA; solo se desglosa lo que contienen
+    impuestos = calcular_impuestos_venta(venta)
+    
+    return render_template('pos/ticket.html', venta=venta, impuestos=impuestos)
+
+@app.route('/pos/cancelar-venta/<int:venta_id>', methods=['POST'])
+def pos_cancelar_venta(venta_id):
+    venta, error = cancelar_venta(venta_id)
+    
+    if error:
+        return jsonify({'success': False, 'message': error})
+    
+    return jsonify({'success': True, 'folio': venta.folio})
+
+@app.route('/api/ventas/resumen')
+@solo_lectura()
+def api_resumen_ventas():
+    try:
+        hoy = datetime.now().date()
+        desde = datetime.strptime(request.args['desde'], '%Y-%m-%d').date() if request.args.get('desde') else hoy
+        hasta = datetime.strptime(request.args['hasta'], '%Y-%m-%d').date() if request.args.get('hasta') else hoy
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Las fechas deben tener el formato AAAA-MM-DD'}), 400
+    
+    resumen = obtener_resumen_ventas(desde, hasta)
+    
+    return jsonify({
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'total_ventas': int(resumen.total_ventas or 0),
+        'total_ingresos': float(resumen.total_ingresos or 0),
+        'por_hora': [{
+            'hora': fila.hora,
+            'total_ventas': fila.total_ventas,
+            'total_ingresos': float(fila.total_ingresos)
+        } for fila in obtener_ventas_por_hora(hasta)],
+        'productos': [{
+            'producto_id': fila.producto_id,
+            'cantidad': int(fila.cantidad),
+            'importe': float(fila.importe)
+        } for fila in obtener_ventas_por_producto(desde, hasta)]
+    })
+
+@app.route('/api/analitica/ventas')
+@solo_lectura()
+def api_analitica_ventas():
+    try:
+        hoy = datetime.now().date()
+        desde = datetime.strptime(request.args['desde'], '%Y-%m-%d').date() if request.args.get('desde') else hoy
+        hasta = datetime.strptime(request.args['hasta'], '%Y-%m-%d').date() if request.args.get('hasta') else hoy
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Las fechas deben tener el formato AAAA-MM-DD'}), 400
+    
+    # Un límite ilegible se toma como el valor por defecto
+    limite = min(max(request.args.get('limite', 20, type=int), 1), 200)
+    
+    if desde > hasta:
+        return jsonify({'success': False, 'message': 'La fecha inicial es posterior a la final'}), 400
+    
+    analisis = cache_analitica.obtener(desde, hasta)
+    columnas_producto = ['producto_id', 'nombre', 'categoria', 'cantidad', 'importe', 'margen_unitario', 'margen', 'margen_pct']
+    
+    return jsonify({
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'total_ventas': analisis.total_ventas,
+        'total_ingresos': analisis.total_ingresos,
+        'top_productos': top_productos(analisis, limite)[columnas_producto].to_dict('records'),
+        'top_margen': top_productos(analisis, limite, por='margen')[columnas_producto].to_dict('records'),
+        'mapa_calor': [{
+            'dia': dia,
+            'ventas_por_hora': valores.tolist()
+        } for dia, valores in matriz_mapa_calor(analisis).iterrows()],
+        'top_clientes': top_clientes(analisis, limite).to_dict('records')
+    })
 
 # ... (resto de las rutas POS existentes)
 
@@ -456,7 +771,7 @@ def nueva_requisicion():
 
 @app.route('/compras/requisiciones/<int:id>/editar', methods=['GET', 'POST'])
 def editar_requisicion(id):
-    requisicion = RequisicionCompra.query.get_or_404(id)
+    requisicion = RequisicionCompra.query.options(*opciones_documento(RequisicionCompra)).get_or_404(id)
     
     if request.method == 'POST':
         try:
@@ -493,6 +808,37 @@ def editar_requisicion(id):
     
     return render_template('compras/requisiciones/editar.html', requisicion=requisicion)
 
+@app.route('/api/reabastecimiento')
+@solo_lectura()
+def api_reabastecimiento():
+    sugerencias = calcular_sugerencias()
+    return jsonify({
+        'total': len(sugerencias),
+        'sugerencias': [{
+            'producto_id': s.producto_id,
+            'nombre': s.nombre,
+            'proveedor_id': s.proveedor_id,
+            'stock': s.stock,
+            'en_camino': s.en_camino,
+            'velocidad_diaria': round(s.velocidad, 3),
+            'dias_cobertura': round(s.dias_cobertura, 1) if s.velocidad else None,
+            'cantidad': s.cantidad
+        } for s in sugerencias]
+    })
+
+@app.route('/compras/requisiciones/reabastecimiento', methods=['POST'])
+def generar_reabastecimiento():
+    try:
+        resultado = ejecutar_reabastecimiento()
+        if resultado.requisiciones:
+            flash(f'✅ {resultado.requisiciones} requisiciones generadas con {resultado.renglones} productos', 'success')
+        else:
+            flash('ℹ️ No hay productos por reabastecer', 'info')
+    except Exception as e:
+        flash(f'❌ Error al generar el reabastecimiento: {str(e)}', 'danger')
+    
+    return redirect(url_for('lista_requisiciones', estado='pendientes'))
+
 @app.route('/compras/requisiciones/<int:id>/aprobar')
 def aprobar_requisicion(id):
     requisicion = RequisicionCompra.query.get_or_404(id)
@@ -502,9 +848,13 @@ def aprobar_requisicion(id):
         return redirect(url_for('detalle_requisicion', id=id))
     
     try:
-        requisicion.estado = 'aprobada'
-        db.session.commit()
-        flash('✅ Requisición aprobada exitosamente', 'success')
+        # UPDATE condicionado a 'pendiente': si otro usuario ya la cambió no se toca
+        if transicionar_documentos('requisicion', [id], 'aprobada'):
+            db.session.commit()
+            flash('✅ Requisición aprobada exitosamente', 'success')
+        else:
+            db.session.rollback()
+            flash('❌ Solo se pueden aprobar requisiciones pendientes', 'danger')
     except Exception as e:
         db.session.rollback()
         flash(f'❌ Error al aprobar requisición: {str(e)}', 'danger')
@@ -520,9 +870,13 @@ def rechazar_requisicion(id):
         return redirect(url_for('detalle_requisicion', id=id))
     
     try:
-        requisicion.estado = 'rechazada'
-        db.session.commit()
-        flash('✅ Requisición rechazada', 'info')
+        # UPDATE condicionado a 'pendiente': si otro usuario ya la cambió no se toca
+        if transicionar_documentos('requisicion', [id], 'rechazada'):
+            db.session.commit()
+            flash('✅ Requisición rechazada', 'info')
+        else:
+            db.session.rollback()
+            flash('❌ Solo se pueden rechazar requisiciones pendientes', 'danger')
     except Exception as e:
         db.session.rollback()
         flash(f'❌ Error al rechazar requisición: {str(e)}', 'danger')
@@ -538,28 +892,12 @@ def convertir_requisicion_cotizacion(id):
         return redirect(url_for('detalle_requisicion', id=id))
     
     try:
-        cotizacion = CotizacionCompra(
-            folio=generar_folio('COT'),
-            requisicion_id=requisicion.id,
-            estado='pendiente',
-            total=0.0
-        )
-        db.session.add(cotizacion)
-        db.session.flush()
-        
-        # Copiar detalles
-        for detalle in requisicion.detalles:
-            nuevo_detalle = DetalleCotizacionCompra(
-                cotizacion_id=cotizacion.id,
-                producto_id=detalle.producto_id,
-                descripcion=detalle.descripcion,
-                cantidad=detalle.cantidad,
-                precio_unitario=detalle.precio_estimado or 0,
-                importe=detalle.cantidad * (detalle.precio_estimado or 0)
-            )
-            db.session.add(nuevo_detalle)
-            cotizacion.total += nuevo_detalle.importe
-        
+        # Renglones y total se copian en SQL, sin cargar los detalles
+        cotizacion = convertir_documento(requisicion, 'cotizacion_compra')
+        if cotizacion is None:
+            db.session.rollback()
+            flash('❌ La requisición ya tiene una cotización', 'danger')
+            return redirect(url_for('detalle_requisicion', id=id))
         db.session.commit()
         flash('✅ Cotización creada a partir de la requisición', 'success')
         return redirect(url_for('editar_cotizacion_compra', id=cotizacion.id))
@@ -569,21 +907,63 @@ def convertir_requisicion_cotizacion(id):
         flash(f'❌ Error al crear cotización: {str(e)}', 'danger')
         return redirect(url_for('detalle_requisicion', id=id))
 
+@app.route('/api/documentos/<tipo_origen>/convertir/<tipo_destino>', methods=['POST'])
+def api_convertir_documentos(tipo_origen, tipo_destino):
+    # Convierte en una sola transacción los documentos de la lista {"ids": [...]}
+    ids = (request.get_json(silent=True) or {}).get('ids') or []
+    try:
+        convertidos = convertir_documentos(tipo_origen, tipo_destino, ids)
+        db.session.commit()
+    except (ValueError, TypeError) as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+    
+    return jsonify({
+        'success': True,
+        'convertidos': [{
+            'origen_id': documento.origen_id,
+            'destino_id': documento.destino_id,
+            'folio': documento.folio
+        } for documento in convertidos],
+        'omitidos': len(set(ids)) - len(convertidos)
+    })
+
+@app.route('/api/documentos/<tipo>/estado', methods=['POST'])
+def api_cambiar_estado_documentos(tipo):
+    # {"ids": [...], "estado": "aprobada", "comentario": "..."}; los que no pueden cambiar se omiten
+    datos = request.get_json(silent=True) or {}
+    ids = datos.get('ids') or []
+    try:
+        cambiados = transicionar_documentos(tipo, ids, datos.get('estado'), datos.get('comentario'))
+        db.session.commit()
+    except (ValueError, TypeError) as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+    
+    return jsonify({'success': True, 'cambiados': cambiados, 'omitidos': len(set(ids)) - len(cambiados)})
+
 # ... (rutas similares para cotizaciones, órdenes de compra, facturas de compra)
 
 # ========== MÓDULO DE VENTAS CORPORATIVAS ==========
 @app.route('/ventas/cotizaciones')
 def lista_cotizaciones_venta():
     estado = request.args.get('estado', 'todos')
+    carga = opciones_documento(CotizacionVenta, detalles=False)
     
     if estado == 'pendientes':
-        cotizaciones = CotizacionVenta.query.filter_by(estado='pendiente').order_by(CotizacionVenta.fecha_creacion.desc()).all()
+        cotizaciones = CotizacionVenta.query.options(*carga).filter_by(estado='pendiente').order_by(CotizacionVenta.fecha_creacion.desc()).all()
     elif estado == 'aceptadas':
-        cotizaciones = CotizacionVenta.query.filter_by(estado='aceptada').order_by(CotizacionVenta.fecha_creacion.desc()).all()
+        cotizaciones = CotizacionVenta.query.options(*carga).filter_by(estado='aceptada').order_by(CotizacionVenta.fecha_creacion.desc()).all()
     elif estado == 'rechazadas':
-        cotizaciones = CotizacionVenta.query.filter_by(estado='rechazada').order_by(CotizacionVenta.fecha_creacion.desc()).all()
+        cotizaciones = CotizacionVenta.query.options(*carga).filter_by(estado='rechazada').order_by(CotizacionVenta.fecha_creacion.desc()).all()
     else:
-        cotizaciones = CotizacionVenta.query.order_by(CotizacionVenta.fecha_creacion.desc()).all()
+        cotizaciones = CotizacionVenta.query.options(*carga).order_by(CotizacionVenta.fecha_creacion.desc()).all()
     
     return render_template('ventas/cotizaciones/lista.html', cotizaciones=cotizaciones, estado_seleccionado=estado)
 
@@ -636,29 +1016,13 @@ def configuracion_general():
                 'zona_horaria': request.form.get('zona_horaria', 'America/Mexico_City')
             }
             
-            for clave, valor in configuraciones.items():
-                config = ConfiguracionSistema.query.filter_by(clave=clave).first()
-                if config:
-                    config.valor = valor
-                else:
-                    config = ConfiguracionSistema(
-                        clave=clave,
-                        valor=valor,
-                        tipo='string',
-                        descripcion=f'Configuración de {clave}',
-                        categoria='general'
-                    )
-                    db.session.add(config)
-            
-            db.session.commit()
+            cache_configuracion.guardar(configuraciones, 'general')
             flash('✅ Configuración general guardada exitosamente', 'success')
         except Exception as e:
             db.session.rollback()
             flash(f'❌ Error al guardar configuración: {str(e)}', 'danger')
     
-    # Obtener configuraciones actuales
-    configs = ConfiguracionSistema.query.filter_by(categoria='general').all()
-    configuracion = {config.clave: config.valor for config in configs}
+    configuracion = cache_configuracion.categoria('general')
     
     return render_template('configuracion/general.html', configuracion=configuracion)
 
@@ -676,28 +1040,13 @@ def configuracion_facturacion():
                 'llave_privada_pac': request.form.get('llave_privada_pac', '')
             }
             
-            for clave, valor in configuraciones.items():
-                config = ConfiguracionSistema.query.filter_by(clave=clave).first()
-                if config:
-                    config.valor = valor
-                else:
-                    config = ConfiguracionSistema(
-                        clave=clave,
-                        valor=valor,
-                        tipo='string' if clave != 'modo_prueba_facturacion' else 'boolean',
-                        descripcion=f'Configuración de {clave}',
-                        categoria='facturacion'
-                    )
-                    db.session.add(config)
-            
-            db.session.commit()
+            cache_configuracion.guardar(configuraciones, 'facturacion', tipos={'modo_prueba_facturacion': 'boolean'})
             flash('✅ Configuración de facturación guardada exitosamente', 'success')
         except Exception as e:
             db.session.rollback()
             flash(f'❌ Error al guardar configuración: {str(e)}', 'danger')
     
-    configs = ConfiguracionSistema.query.filter_by(categoria='facturacion').all()
-    configuracion = {config.clave: config.valor for config in configs}
+    configuracion = cache_configuracion.categoria('facturacion')
     
     return render_template('configuracion/facturacion.html', configuracion=configuracion)
 
@@ -713,28 +1062,13 @@ def configuracion_apariencia():
                 'favicon_url': request.form.get('favicon_url', '')
             }
             
-            for clave, valor in configuraciones.items():
-                config = ConfiguracionSistema.query.filter_by(clave=clave).first()
-                if config:
-                    config.valor = valor
-                else:
-                    config = ConfiguracionSistema(
-                        clave=clave,
-                        valor=valor,
-                        tipo='string',
-                        descripcion=f'Configuración de {clave}',
-                        categoria='apariencia'
-                    )
-                    db.session.add(config)
-            
-            db.session.commit()
+            cache_configuracion.guardar(configuraciones, 'apariencia')
             flash('✅ Configuración de apariencia guardada exitosamente', 'success')
         except Exception as e:
             db.session.rollback()
             flash(f'❌ Error al guardar configuración: {str(e)}', 'danger')
     
-    configs = ConfiguracionSistema.query.filter_by(categoria='apariencia').all()
-    configuracion = {config.clave: config.valor for config in configs}
+    configuracion = cache_configuracion.categoria('apariencia')
     
     return render_template('configuracion/apariencia.html', configuracion=configuracion)
 
@@ -757,6 +1091,17 @@ def importar_proveedores():
             return redirect(request.url)
         
         if archivo and archivo.filename.endswith('.csv'):
+            # El formulario con JavaScript pide JSON: la importación sigue en segundo plano
+            # y la página consulta el avance por bloques
+            if request.accept_mimetypes.best == 'application/json':
+                importacion = iniciar_importacion(app, 'proveedores', archivo)
+                return jsonify({
+                    'success': True,
+                    'importacion': importacion.progreso(),
+                    'progreso_url': url_for('progreso_importacion', importacion_id=importacion.id),
+                    'lista_url': url_for('lista_proveedores')
+                }), 202
+            
             try:
                 registros, errores = importar_proveedores_desde_csv(archivo)
                 
@@ -777,6 +1122,14 @@ def importar_proveedores():
     
     return render_template('proveedores/importar.html')
 
+@app.route('/api/importaciones/<importacion_id>')
+def progreso_importacion(importacion_id):
+    importacion = obtener_importacion(importacion_id)
+    if not importacion:
+        return jsonify({'success': False, 'message': 'Importación no encontrada'}), 404
+    
+    return jsonify(importacion.progreso())
+
 @app.route('/proveedores/descargar-ejemplo')
 def descargar_ejemplo_proveedores():
     csv_data = generar_ejemplo_csv('proveedores')
@@ -791,13 +1144,10 @@ def descargar_ejemplo_proveedores():
 
 # ========== API PARA BÚSQUEDA RÁPIDA ==========
 @app.route('/api/productos/buscar')
+@solo_lectura()
 def buscar_productos():
     termino = request.args.get('q', '')
-    productos = Producto.query.filter(
-        (Producto.nombre.ilike(f'%{termino}%')) | 
-        (Producto.codigo.ilike(f'%{termino}%')) |
-        (Producto.codigo_barras.ilike(f'%{termino}%'))
-    ).limit(10).all()
+    productos = buscar_productos_texto(termino, limite=10)
     
     resultados = [{
         'id': p.id,
@@ -813,46 +1163,132 @@ def buscar_productos():
 # ========== RUTAS DE FACTURACIÓN ==========
 @app.route('/facturar/<int:venta_id>')
 def facturar_venta(venta_id):
-    venta = Venta.query.get_or_404(venta_id)
+    venta = Venta.query.options(*opciones_documento(Venta)).get_or_404(venta_id)
     cliente = venta.cliente
     
-    emisor_info = {
-        'rfc': 'ABC123456789',
-        'razon_social': 'Mi Tienda de Abarrotes SA de CV',
-        'regimen_fiscal': '601',
-        'codigo_postal': '01000'
-    }
-    
-    xml_cfdi = generar_xml_cfdi(venta, cliente, emisor_info)
-    qr_url = generar_qr_cfdi(xml_cfdi, emisor_info)
-    timbre = generar_timbre_fiscal(xml_cfdi)
+    # El XML timbrado se guarda la primera vez; las siguientes vistas lo leen de la base de datos
+    emisor = cache_configuracion.emisor_cfdi()
+    documento = obtener_cfdi_venta(venta, cliente, emisor)
     
     return render_template('facturacion/factura.html', 
                          venta=venta,
-                         xml_cfdi=xml_cfdi,
-                         qr_url=qr_url,
-                         uuid=timbre['uuid'],
-                         fecha_timbrado=timbre['fecha_timbrado'],
-                         no_certificado_sat=timbre['no_certificado_sat'])
+                         emisor=emisor,
+                         impuestos=calcular_impuestos_venta(venta),
+                         xml_cfdi=documento.xml,
+                         qr_url=documento.qr_url,
+                         uuid=documento.uuid,
+                         fecha_timbrado=documento.fecha_timbrado,
+                         no_certificado_sat=documento.no_certificado_sat)
 
 @app.route('/descargar-factura/<int:venta_id>')
 def descargar_factura(venta_id):
-    venta = Venta.query.get_or_404(venta_id)
+    venta = Venta.query.options(*opciones_documento(Venta)).get_or_404(venta_id)
     cliente = venta.cliente
-    emisor_info = {
-        'rfc': 'ABC123456789',
-        'razon_social': 'Mi Tienda de Abarrotes SA de CV',
-        'regimen_fiscal': '601',
-        'codigo_postal': '01000'
-    }
     
-    xml_cfdi = generar_xml_cfdi(venta, cliente, emisor_info)
+    documento = obtener_cfdi_venta(venta, cliente, cache_configuracion.emisor_cfdi())
     
     return Response(
-        xml_cfdi,
+        documento.xml,
         mimetype='application/xml',
         headers={'Content-Disposition': f'attachment;filename=factura_{venta.folio}.xml'}
     )
 
+@app.route('/facturacion/lotes', methods=['POST'])
+def iniciar_facturacion_lote():
+    datos = request.get_json(silent=True) or request.form
+    try:
+        desde = datetime.strptime(datos['desde'], '%Y-%m-%d').date() if datos.get('desde') else None
+        hasta = datetime.strptime(datos['hasta'], '%Y-%m-%d').date() if datos.get('hasta') else None
+        ventas = datos.get('ventas') or []
+        if isinstance(ventas, str):
+            ventas = [v for v in ventas.split(',') if v.strip()]
+        ventas = [int(v) for v in ventas]
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'message': 'Fechas (AAAA-MM-DD) o ids de venta inválidos'}), 400
+    
+    if not (desde or hasta or ventas):
+        return jsonify({'success': False, 'message': 'Indique un rango de fechas o una lista de ventas'}), 400
+    
+    venta_ids = seleccionar_ventas_para_facturar(desde, hasta, ventas)
+    if not venta_ids:
+        return jsonify({'success': False, 'message': 'No hay ventas completadas para facturar'}), 404
+    
+    lote = iniciar_lote_facturacion(app, venta_ids, cache_configuracion.emisor_cfdi())
+    
+    return jsonify({
+        'success': True,
+        'lote': lote.progreso(),
+        'progreso_url': url_for('progreso_facturacion_lote', lote_id=lote.id),
+        'descarga_url': url_for('descargar_facturacion_lote', lote_id=lote.id)
+    }), 202
+
+@app.route('/api/facturacion/lotes/<lote_id>')
+def progreso_facturacion_lote(lote_id):
+    lote = obtener_lote(lote_id)
+    if not lote:
+        return jsonify({'success': False, 'message': 'Lote no encontrado'}), 404
+    
+    return jsonify(lote.progreso())
+
+@app.route('/facturacion/lotes/<lote_id>/descargar')
+def descargar_facturacion_lote(lote_id):
+    lote = obtener_lote(lote_id)
+    if not lote:
+        return jsonify({'success': False, 'message': 'Lote no encontrado'}), 404
+    if lote.estado != 'terminado':
+        return jsonify({'success': False, 'message': f'El lote está {lote.estado}', 'lote': lote.progreso()}), 409
+    
+    return send_file(
+        lote.archivo,
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name=f'facturas_{lote.fecha_inicio.strftime("%Y%m%d_%H%M%S")}.zip'
+    )
+
+# ========== EXPORTACIÓN ==========
+@app.route('/exportar/<tipo>.<formato>')
+def exportar_listado(tipo, formato):
+    # El archivo se genera mientras se envía; ?detalles=1 exporta los renglones de los documentos
+    if tipo not in EXPORTACIONES or formato not in FORMATOS:
+        abort(404)
+    try:
+        desde = datetime.strptime(request.args['desde'], '%Y-%m-%d').date() if request.args.get('desde') else None
+        hasta = datetime.strptime(request.args['hasta'], '%Y-%m-%d').date() if request.args.get('hasta') else None
+        contenido = exportar(
+            tipo, formato,
+            detalles=request.args.get('detalles') == '1',
+            estado=request.args.get('estado'),
+            desde=desde,
+            hasta=hasta
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    nombre = f"{tipo}{'_detalles' if request.args.get('detalles') == '1' else ''}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    return Response(contenido, mimetype=FORMATOS[formato], headers={
+        'Content-Disposition': f'attachment; filename={nombre}',
+        'X-Accel-Buffering': 'no'
+    })
+
+# ========== MÉTRICAS ==========
+@app.route('/metrics')
+def metricas():
+    # Formato de texto de Prometheus; cada proceso publica solo sus propias peticiones
+    return Response(registro_metricas.exportar_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/perfiles')
+def lista_perfiles():
+    # Sin el token de administración la página no existe
+    if not acceso_perfiles(app):
+        abort(404)
+    return render_template('perfiles/lista.html', perfiles=listar_perfiles(app),
+                           token=request.args.get('perfilar'))
+
+@app.route('/perfiles/<nombre>')
+def descargar_perfil(nombre):
+    if not acceso_perfiles(app):
+        abort(404)
+    return send_from_directory(directorio_perfiles(app), nombre, mimetype='text/plain', as_attachment=True)
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""
+Asesor de índices: siembra una base de datos grande, recorre todas las rutas GET
+de la aplicación capturando el SQL que ejecutan y muestra el plan de cada consulta
+(EXPLAIN QUERY PLAN), marcando los recorridos completos de tabla.
+
+Uso:
+    python asesor_indices.py [--productos 100000] [--ventas 200000] [--base ruta.db]
+
+Termina con código 1 si alguna consulta recorre una tabla completa.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from collections import OrderedDict
+
+# Variantes de filtros que las rutas solo ejecutan con ciertos parámetros
+VARIANTES = [
+    '/productos?stock=bajo',
+    '/productos?stock=sin',
+    '/productos?categoria=Abarrotes',
+    '/clientes?tipo=registrado',
+    '/compras/requisiciones?estado=pendientes',
+    '/compras/requisiciones?estado=aprobadas',
+    '/ventas/cotizaciones?estado=pendientes',
+    '/ventas/cotizaciones?estado=aceptadas',
+    '/api/productos/buscar?q=producto 12',
+    '/api/productos?categoria=Bebidas',
+    '/api/productos?stock=bajo',
+    '/api/clientes?tipo=mostrador',
+    '/api/pos/catalogo?desde=2000-01-01T00:00:00_0'
+]
+
+# Rutas que modifican datos con GET; se recorren al final para no alterar las demás
+RUTAS_AL_FINAL = ('eliminar', 'aprobar', 'rechazar', 'convertir')
+
+
+def clasificar_paso(detalle):
+    """Devuelve la alerta para un paso del plan, o None si usa índice"""
+    if detalle.startswith('SCAN ') and 'USING' not in detalle and 'VIRTUAL TABLE' not in detalle \
+            and 'CONSTANT ROW' not in detalle:
+        return 'ESCANEO COMPLETO'
+    if detalle.startswith('USE TEMP B-TREE'):
+        return 'ORDENAMIENTO TEMPORAL'
+    return None
+
+
+def urls_a_recorrer(app):
+    """Una URL por cada ruta GET (con id 1 en los parámetros) más las variantes de filtros"""
+    from flask import url_for
+
+    urls = []
+    with app.test_request_context():
+        for regla in app.url_map.iter_rules():
+            if 'GET' not in regla.methods or regla.endpoint == 'static':
+                continue
+            urls.append(url_for(regla.endpoint, **{argumento: 1 for argumento in regla.arguments}))
+
+    urls.sort(key=lambda url: any(palabra in url for palabra in RUTAS_AL_FINAL))
+    return urls + VARIANTES
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Captura los planes de consulta de todas las rutas')
+    parser.add_argument('--productos', type=int, default=100000)
+    parser.add_argument('--clientes', type=int, default=20000)
+    parser.add_argument('--ventas', type=int, default=200000)
+    parser.add_argument('--documentos', type=int, default=5000)
+    parser.add_argument('--base', help='Base de datos SQLite a usar (se siembra si no existe)')
+    args = parser.parse_args()
+
+    ruta = args.base or os.path.join(tempfile.mkdtemp(), 'asesor_indices.db')
+    sembrar = not os.path.exists(ruta)
+
+    # La aplicación toma la base de datos de DATABASE_URL al importarse
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(ruta)}'
+    from sqlalchemy import event
+    from app import app
+    from models import db
+    from benchmarks.comun import sembrar_datos
+
+    # Algunas plantillas enlazan módulos que aún no existen; se ignoran esos enlaces
+    # para que la plantilla termine de renderizar y se capturen también sus consultas
+    app.url_build_error_handlers.append(lambda error, endpoint, valores: '#')
+
+    with app.app_context():
+        if sembrar:
+            print(f"Sembrando {ruta}...")
+            sembrar_datos(productos=args.productos, clientes=args.clientes,
+                          ventas=args.ventas, documentos=args.documentos)
+        with db.engine.begin() as conexion:
+            conexion.exec_driver_sql('ANALYZE')
+        motor = db.engine
+
+    consultas = OrderedDict()
+    ruta_actual = {'url': None}
+
+    def capturar(conexion, cursor, sentencia, parametros, contexto, executemany):
+        if not sentencia.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'WITH')):
+            return
+        if executemany:
+            parametros = parametros[0] if parametros else ()
+        registro = consultas.setdefault(sentencia, {'parametros': parametros, 'rutas': set(), 'veces': 0})
+        registro['rutas'].add(ruta_actual['url'])
+        registro['veces'] += 1
+
+    event.listen(motor, 'before_cursor_execute', capturar)
+
+    cliente = app.test_client()
+    for url in urls_a_recorrer(app):
+        ruta_actual['url'] = url
+        respuesta = cliente.get(url)
+        print(f"{respuesta.status_code}  {url}")
+
+    event.remove(motor, 'before_cursor_execute', capturar)
+
+    alertas = 0
+    escaneos_completos = 0
+    print(f"\n{len(consultas)} consultas distintas\n")
+    with motor.connect() as conexion:
+        for sentencia, registro in consultas.items():
+            plan = conexion.exec_driver_sql(f'EXPLAIN QUERY PLAN {sentencia}', registro['parametros']).all()
+            pasos = [(fila[3], clasificar_paso(fila[3])) for fila in plan]
+            if not any(alerta for detalle, alerta in pasos):
+                continue
+
+            alertas += 1
+            if any(alerta == 'ESCANEO COMPLETO' for detalle, alerta in pasos):
+                escaneos_completos += 1
+            print('-' * 80)
+            print(f"Rutas: {', '.join(sorted(registro['rutas']))}  (ejecutada {registro['veces']} veces)")
+            print(' '.join(sentencia.split()))
+            for detalle, alerta in pasos:
+                print(f"    {'>> ' + alerta + ': ' if alerta else ''}{detalle}")
+
+    print('=' * 80)
+    print(f"{alertas} consultas con alertas, {escaneos_completos} con recorridos completos de tabla")
+    return 1 if escaneos_completos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
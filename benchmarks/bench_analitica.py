@@ -0,0 +1,111 @@
+"""
+Analítica de ventas sobre 10M de partidas: tiempo y memoria pico de
+calcular_analisis_ventas con distintos tamaños de bloque, y costo de una
+consulta repetida que se responde desde la cache.
+
+    python -m benchmarks.bench_analitica
+    python -m benchmarks.bench_analitica --detalles 1000000 --bloques 20000,200000
+
+La memoria pico (tracemalloc) se mide en una segunda corrida para no mezclar el
+costo del rastreo con el tiempo.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from sqlalchemy import text
+from benchmarks.comun import crear_app_benchmark, sembrar_datos
+from models import db
+from utils import analitica_utils
+from utils.analitica_utils import calcular_analisis_ventas, cache_analitica
+from utils.resumen_ventas_utils import reconstruir_resumen_ventas
+
+PRODUCTOS = 20000
+CLIENTES = 5000
+LINEAS_POR_VENTA = 4
+
+
+def sembrar_ventas(detalles):
+    """Inserta las ventas y sus partidas con CTE recursivas, sin pasar filas por Python"""
+    ventas = detalles // LINEAS_POR_VENTA
+    db.session.execute(text("""
+        INSERT INTO ventas (id, folio, cliente_id, total, efectivo, cambio, fecha_creacion, estado)
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :ventas)
+        SELECT i, 'V' || i,
+               CASE WHEN i % 4 = 0 THEN abs(random()) % :clientes + 1 END,
+               0, 0, 0,
+               datetime('now', '-' || (abs(random()) % 525600) || ' minutes'),
+               CASE WHEN i % 40 = 0 THEN 'cancelada' ELSE 'completada' END
+        FROM n
+    """), {'ventas': ventas, 'clientes': CLIENTES})
+    db.session.execute(text("""
+        INSERT INTO detalles_venta (venta_id, producto_id, cantidad, precio_unitario, subtotal)
+        SELECT venta_id, producto_id, cantidad, p.precio_venta, cantidad * p.precio_venta
+        FROM (
+            WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < :detalles - 1)
+            SELECT i / :lineas + 1 AS venta_id,
+                   abs(random()) % :productos + 1 AS producto_id,
+                   abs(random()) % 3 + 1 AS cantidad
+            FROM n
+        ) d JOIN productos p ON p.id = d.producto_id
+    """), {'detalles': ventas * LINEAS_POR_VENTA, 'lineas': LINEAS_POR_VENTA, 'productos': PRODUCTOS})
+    db.session.execute(text("""
+        UPDATE ventas SET total = (SELECT sum(subtotal) FROM detalles_venta WHERE venta_id = ventas.id),
+                          efectivo = 0, cambio = 0
+    """))
+    db.session.commit()
+    reconstruir_resumen_ventas()
+
+
+def corrida(desde, hasta, rastrear):
+    if rastrear:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    analisis = calcular_analisis_ventas(desde, hasta)
+    duracion = time.perf_counter() - inicio
+    pico = 0
+    if rastrear:
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    db.session.rollback()
+    return analisis, duracion, pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analítica de ventas por bloques')
+    parser.add_argument('--detalles', type=int, default=10000000)
+    parser.add_argument('--bloques', default='50000,200000,1000000')
+    argumentos = parser.parse_args()
+
+    uri = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'analitica.db')}"
+    app = crear_app_benchmark(uri, produccion=True)
+    with app.app_context():
+        sembrar_datos(productos=PRODUCTOS, clientes=CLIENTES, ventas=0, documentos=0)
+        inicio = time.perf_counter()
+        sembrar_ventas(argumentos.detalles)
+        print(f'Datos: {argumentos.detalles:,} partidas sembradas en {time.perf_counter() - inicio:.1f} s\n')
+
+        hasta = date.today()
+        desde = hasta - timedelta(days=366)
+        print(f"{'Bloque':>10} {'Filas':>12} {'Tiempo s':>9} {'Filas/s':>12} {'Pico MB':>9}")
+        for tamano in (int(valor) for valor in argumentos.bloques.split(',')):
+            analitica_utils.TAMANO_BLOQUE_ANALITICA = tamano
+            analisis, duracion, _ = corrida(desde, hasta, rastrear=False)
+            _, _, pico = corrida(desde, hasta, rastrear=True)
+            print(f'{tamano:>10,} {analisis.filas_leidas:>12,} {duracion:>9.2f} '
+                  f'{analisis.filas_leidas / duracion:>12,.0f} {pico / 2 ** 20:>9.1f}')
+
+        cache_analitica.obtener(desde, hasta)
+        inicio = time.perf_counter()
+        repeticiones = 100
+        for _ in range(repeticiones):
+            cache_analitica.obtener(desde, hasta)
+        print(f'\nConsulta repetida desde la cache: {(time.perf_counter() - inicio) / repeticiones * 1000:.2f} ms')
+        print(f'Productos: {len(analisis.productos):,}, clientes: {len(analisis.clientes):,}, '
+              f'ventas: {analisis.total_ventas:,}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""
+Compara escaneos por segundo del índice en memoria contra la consulta original.
+"""
+import random
+from benchmarks.comun import crear_app_benchmark, sembrar_productos, medir
+from models import Producto
+from utils.indice_productos import indice_productos
+
+TOTAL_PRODUCTOS = 50000
+ESCANEOS = 20000
+
+
+def buscar_en_base_de_datos(codigo):
+    """Consulta usada antes del índice"""
+    return Producto.query.filter(
+        (Producto.codigo_barras == codigo) | (Producto.id == codigo)
+    ).first()
+
+
+def main():
+    app = crear_app_benchmark()
+    with app.app_context():
+        sembrar_productos(TOTAL_PRODUCTOS)
+        codigos = [f'750{random.randrange(TOTAL_PRODUCTOS):010d}' for _ in range(ESCANEOS)]
+
+        indice_productos.cargar()
+
+        medir('Consulta SQL (codigo_barras OR id)', lambda i: buscar_en_base_de_datos(codigos[i]), ESCANEOS)
+        medir('Índice en memoria', lambda i: indice_productos.buscar(codigos[i]), ESCANEOS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Latencia de /api/productos/buscar con el índice FTS5 contra ILIKE '%termino%'.
+Uso: python -m benchmarks.bench_busqueda_texto [10000 100000 1000000]
+"""
+import sys
+import time
+from benchmarks.comun import crear_app_benchmark, sembrar_productos
+from models import db, Producto
+from utils.busqueda_utils import inicializar_indice_busqueda, buscar_productos_texto
+
+TAMANOS = [10000, 100000, 1000000]
+TERMINOS = ['producto 12', 'prod0004', '750000001', 'azucar', 'descr']
+REPETICIONES = 50
+
+
+def buscar_con_ilike(termino):
+    """Consulta usada antes del índice"""
+    return Producto.query.filter(
+        (Producto.nombre.ilike(f'%{termino}%')) |
+        (Producto.codigo.ilike(f'%{termino}%')) |
+        (Producto.codigo_barras.ilike(f'%{termino}%'))
+    ).limit(10).all()
+
+
+def latencia_ms(funcion):
+    inicio = time.perf_counter()
+    for i in range(REPETICIONES):
+        funcion(TERMINOS[i % len(TERMINOS)])
+    return (time.perf_counter() - inicio) / REPETICIONES * 1000
+
+
+def main(tamanos):
+    for total in tamanos:
+        app = crear_app_benchmark()
+        with app.app_context():
+            sembrar_productos(total)
+            db.session.execute(Producto.__table__.insert(), [{
+                'nombre': 'Azúcar estándar 1kg', 'precio_compra': 20.0, 'precio_venta': 28.0, 'proveedor_id': 1
+            }])
+            db.session.commit()
+            inicializar_indice_busqueda()
+
+            ilike = latencia_ms(buscar_con_ilike)
+            fts = latencia_ms(lambda termino: buscar_productos_texto(termino, limite=10))
+            print(f"{total:>9,} productos: ILIKE {ilike:8.2f} ms | FTS5 {fts:8.2f} ms")
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or TAMANOS)
@@ -0,0 +1,50 @@
+"""
+Costo de agregar y actualizar renglones del carrito según su tamaño, con ambos
+backends del servidor, y tamaño que tendría la cookie firmada si el carrito
+siguiera en la sesión de Flask.
+"""
+import os
+import tempfile
+import time
+
+TAMANOS_CARRITO = [10, 100, 1000]
+CAMBIOS = 200
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'carrito.db')}"
+
+from app import app  # noqa: E402  (la base de datos se toma de DATABASE_URL al importar)
+from benchmarks.comun import sembrar_productos  # noqa: E402
+from utils.indice_productos import indice_productos  # noqa: E402
+
+
+def medir(cliente, tamano):
+    cliente.post('/pos/limpiar-carrito')
+    for producto_id in range(1, tamano + 1):
+        cliente.post('/pos/agregar-carrito', data={'producto_id': producto_id, 'cantidad': 1})
+
+    inicio = time.perf_counter()
+    for i in range(CAMBIOS):
+        respuesta = cliente.post('/pos/actualizar-carrito', json={'producto_id': i % tamano + 1, 'cantidad': 2})
+    por_cambio = (time.perf_counter() - inicio) / CAMBIOS * 1000
+
+    # Lo que pesaría la cookie si el carrito completo siguiera en la sesión
+    carrito = [{
+        'producto_id': producto_id, 'nombre': f'Producto {producto_id}', 'precio': 15.0,
+        'cantidad': 2, 'subtotal': 30.0
+    } for producto_id in range(1, tamano + 1)]
+    cookie = app.session_interface.get_signing_serializer(app).dumps({'carrito': carrito})
+    return por_cambio, len(respuesta.data), len(cookie)
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        sembrar_productos(max(TAMANOS_CARRITO), stock=1000)
+        indice_productos.cargar()
+
+    print(f"{'Backend':<8} {'Renglones':>9} {'ms/cambio':>10} {'Respuesta':>10} {'Cookie con carrito':>19}")
+    for backend in ('memoria', 'sqlite'):
+        app.config['CARRITO_BACKEND'] = backend
+        cliente = app.test_client()
+        for tamano in TAMANOS_CARRITO:
+            por_cambio, respuesta, cookie = medir(cliente, tamano)
+            print(f"{backend:<8} {tamano:>9} {por_cambio:>10.2f} {respuesta:>8} B {cookie:>17,} B")
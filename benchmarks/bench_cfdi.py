@@ -0,0 +1,60 @@
+"""
+Latencia de la primera factura de una venta (arma el XML, timbra y guarda)
+contra las repetidas (se sirven desde documentos_cfdi).
+"""
+import time
+from benchmarks.comun import crear_app_benchmark, sembrar_productos
+from models import db, Cliente, Venta
+from facturacion_utils import generar_xml_cfdi
+from utils.cfdi_utils import obtener_cfdi_venta
+from utils.pos_utils import procesar_venta
+
+EMISOR = {
+    'rfc': 'ABC123456789',
+    'razon_social': 'Mi Tienda de Abarrotes SA de CV',
+    'regimen_fiscal': '601',
+    'codigo_postal': '01000'
+}
+TAMANOS_VENTA = [1, 10, 100, 500]
+VENTAS_POR_TAMANO = 20
+REPETICIONES = 5
+
+
+def crear_ventas(lineas, cliente_id):
+    ventas = []
+    for _ in range(VENTAS_POR_TAMANO):
+        venta, error = procesar_venta([{
+            'producto_id': i + 1, 'cantidad': 2, 'precio': 15.0, 'subtotal': 30.0
+        } for i in range(lineas)], efectivo=0, cliente_id=cliente_id)
+        assert error is None, error
+        ventas.append(venta.id)
+    return ventas
+
+
+def cronometrar(funcion, ventas):
+    inicio = time.perf_counter()
+    for venta_id in ventas:
+        db.session.expire_all()
+        venta = db.session.get(Venta, venta_id)
+        funcion(venta, venta.cliente)
+    return (time.perf_counter() - inicio) / len(ventas) * 1000
+
+
+if __name__ == '__main__':
+    app = crear_app_benchmark()
+    with app.app_context():
+        sembrar_productos(max(TAMANOS_VENTA), stock=100000)
+        cliente = Cliente(nombre='Cliente', apellido='Factura', rfc='XEXX010101000', codigo_postal='01000')
+        db.session.add(cliente)
+        db.session.commit()
+
+        print(f"{'Líneas':>7} {'Sin cache':>12} {'Primera':>12} {'Repetida':>12}")
+        for lineas in TAMANOS_VENTA:
+            ventas = crear_ventas(lineas, cliente.id)
+            sin_cache = cronometrar(lambda v, c: generar_xml_cfdi(v, c, EMISOR), ventas)
+            primera = cronometrar(lambda v, c: obtener_cfdi_venta(v, c, EMISOR), ventas)
+            repetida = sum(
+                cronometrar(lambda v, c: obtener_cfdi_venta(v, c, EMISOR), ventas)
+                for _ in range(REPETICIONES)
+            ) / REPETICIONES
+            print(f"{lineas:>7} {sin_cache:>9.2f} ms {primera:>9.2f} ms {repetida:>9.2f} ms")
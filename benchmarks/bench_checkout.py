@@ -0,0 +1,76 @@
+"""
+Latencia de procesar_venta según el tamaño del carrito y prueba de estrés
+de cobros concurrentes sobre el mismo producto.
+"""
+import os
+import tempfile
+import threading
+import time
+from benchmarks.comun import crear_app_benchmark, sembrar_productos
+from models import db, Producto, Venta
+from utils.pos_utils import procesar_venta
+
+TAMANOS_CARRITO = [1, 10, 100, 500]
+REPETICIONES = 20
+CAJAS = 8
+COBROS_POR_CAJA = 50
+STOCK_DISPUTADO = 100
+
+
+def armar_carrito(lineas):
+    return [{
+        'producto_id': i + 1,
+        'cantidad': 1,
+        'precio': 15.0,
+        'subtotal': 15.0
+    } for i in range(lineas)]
+
+
+def medir_latencia():
+    app = crear_app_benchmark()
+    with app.app_context():
+        sembrar_productos(max(TAMANOS_CARRITO), stock=REPETICIONES * 10)
+        for lineas in TAMANOS_CARRITO:
+            carrito = armar_carrito(lineas)
+            inicio = time.perf_counter()
+            for _ in range(REPETICIONES):
+                venta, error = procesar_venta(carrito, efectivo=0)
+                assert error is None, error
+            promedio = (time.perf_counter() - inicio) / REPETICIONES * 1000
+            print(f"Carrito de {lineas:>4} líneas: {promedio:8.2f} ms por venta")
+
+
+def estres_concurrente():
+    ruta = os.path.join(tempfile.mkdtemp(), 'estres.db')
+    app = crear_app_benchmark(f'sqlite:///{ruta}')
+    with app.app_context():
+        sembrar_productos(1, stock=STOCK_DISPUTADO)
+
+    exitos = []
+    rechazos = []
+
+    def caja():
+        with app.app_context():
+            for _ in range(COBROS_POR_CAJA):
+                venta, error = procesar_venta(armar_carrito(1), efectivo=0)
+                (exitos if venta else rechazos).append(error)
+
+    hilos = [threading.Thread(target=caja) for _ in range(CAJAS)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    with app.app_context():
+        stock_final = db.session.get(Producto, 1).stock
+        ventas = Venta.query.count()
+
+    print(f"Cobros: {CAJAS * COBROS_POR_CAJA}, exitosos: {len(exitos)}, rechazados: {len(rechazos)}")
+    print(f"Stock inicial: {STOCK_DISPUTADO}, stock final: {stock_final}, ventas registradas: {ventas}")
+    assert stock_final >= 0, "El stock quedó negativo"
+    assert stock_final == STOCK_DISPUTADO - len(exitos) == STOCK_DISPUTADO - ventas
+
+
+if __name__ == '__main__':
+    medir_latencia()
+    estres_concurrente()
@@ -0,0 +1,91 @@
+"""
+Cobros y reportes concurrentes sobre una base SQLite en archivo, comparando la
+configuración por defecto contra el perfil de producción (WAL, pragmas, pool y
+conexiones de solo lectura para los reportes).
+"""
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from sqlalchemy.exc import OperationalError
+from benchmarks.comun import crear_app_benchmark, sembrar_datos
+from models import db, Producto
+from utils.base_datos_utils import solo_lectura
+from utils.pos_utils import procesar_venta
+from utils.resumen_ventas_utils import (
+    reconstruir_resumen_ventas,
+    obtener_resumen_rango,
+    obtener_ventas_por_producto
+)
+
+CAJAS = 4
+LECTORES = 4
+DURACION = 10
+PRODUCTOS = 5000
+
+
+def cobrar(i):
+    producto_id = i % PRODUCTOS + 1
+    venta, error = procesar_venta([{
+        'producto_id': producto_id, 'cantidad': 1, 'precio': 15.0, 'subtotal': 15.0
+    }], efectivo=0)
+    return venta is not None
+
+
+def reportar(i):
+    with solo_lectura():
+        hasta = date.today()
+        desde = hasta - timedelta(days=30)
+        obtener_resumen_rango(desde, hasta)
+        obtener_ventas_por_producto(desde, hasta)
+        Producto.query.filter(Producto.stock <= Producto.stock_minimo).order_by(
+            Producto.nombre, Producto.id
+        ).limit(50).all()
+    return True
+
+
+def ejecutar(produccion):
+    ruta = os.path.join(tempfile.mkdtemp(), 'concurrencia.db')
+    app = crear_app_benchmark(f'sqlite:///{ruta}', produccion=produccion)
+    with app.app_context():
+        sembrar_datos(productos=PRODUCTOS, clientes=500, ventas=50000, documentos=0)
+        db.session.query(Producto).update({Producto.stock: 100000})
+        db.session.commit()
+        reconstruir_resumen_ventas()
+
+    contadores = {'cobros': 0, 'reportes': 0, 'bloqueos': 0}
+    lock = threading.Lock()
+    limite = time.perf_counter() + DURACION
+
+    def trabajador(funcion, contador, desplazamiento):
+        i = desplazamiento
+        with app.app_context():
+            while time.perf_counter() < limite:
+                try:
+                    ok = funcion(i)
+                except OperationalError:
+                    db.session.rollback()
+                    ok = False
+                with lock:
+                    contadores[contador if ok else 'bloqueos'] += 1
+                db.session.remove()
+                i += 1
+
+    hilos = [threading.Thread(target=trabajador, args=(cobrar, 'cobros', n * 1000)) for n in range(CAJAS)]
+    hilos += [threading.Thread(target=trabajador, args=(reportar, 'reportes', 0)) for _ in range(LECTORES)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    nombre = 'producción (WAL)' if produccion else 'por defecto'
+    print(f"{nombre:<18} cobros: {contadores['cobros'] / DURACION:8.1f}/s  "
+          f"reportes: {contadores['reportes'] / DURACION:8.1f}/s  "
+          f"bloqueos: {contadores['bloqueos']}")
+
+
+if __name__ == '__main__':
+    print(f"{CAJAS} cajas y {LECTORES} lectores durante {DURACION} s")
+    ejecutar(produccion=False)
+    ejecutar(produccion=True)
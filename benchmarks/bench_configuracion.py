@@ -0,0 +1,60 @@
+"""
+Lectura y guardado de la configuración: consultas por clave (como hacían las rutas
+de configuración) contra el cache tipado con upsert en bloque. También comprueba
+que una segunda copia del cache (otro proceso) vea el cambio al vencer su intervalo.
+"""
+import time
+from benchmarks.comun import crear_app_benchmark
+from models import db, ConfiguracionSistema
+from utils.configuracion_utils import CacheConfiguracion
+
+CLAVES = 40
+REPETICIONES = 500
+
+
+def guardar_por_clave(valores):
+    for clave, valor in valores.items():
+        config = ConfiguracionSistema.query.filter_by(clave=clave).first()
+        if config:
+            config.valor = valor
+        else:
+            db.session.add(ConfiguracionSistema(
+                clave=clave, valor=valor, tipo='string',
+                descripcion=f'Configuración de {clave}', categoria='general'
+            ))
+    db.session.commit()
+
+
+def cronometrar(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1000
+
+
+if __name__ == '__main__':
+    app = crear_app_benchmark()
+    cache = CacheConfiguracion()
+    otro_proceso = CacheConfiguracion(intervalo=0)
+    valores = {f'clave_{i}': f'valor {i}' for i in range(CLAVES)}
+
+    with app.app_context():
+        guardado_clave = cronometrar(lambda: guardar_por_clave(valores), 50)
+        guardado_cache = cronometrar(lambda: cache.guardar(valores, 'general'), 50)
+
+        def leer_por_clave():
+            configs = ConfiguracionSistema.query.filter_by(categoria='general').all()
+            return {config.clave: config.valor for config in configs}
+
+        lectura_clave = cronometrar(leer_por_clave, REPETICIONES)
+        lectura_cache = cronometrar(lambda: cache.categoria('general'), REPETICIONES)
+
+        otro_proceso.cargar()
+        cache.guardar({'clave_0': 'cambiado'}, 'general')
+        visto = otro_proceso.obtener('clave_0')
+
+    print(f"{CLAVES} claves")
+    print(f"Guardar: por clave {guardado_clave:.2f} ms, upsert en bloque {guardado_cache:.2f} ms")
+    print(f"Leer categoría: consulta {lectura_clave:.3f} ms, cache {lectura_cache:.4f} ms")
+    print(f"Otro proceso ve el cambio: {visto == 'cambiado'}")
+    assert visto == 'cambiado'
@@ -0,0 +1,93 @@
+"""
+Conversión de documentos: una orden de compra de 5,000 renglones a factura y 500
+requisiciones a cotización en una transacción, contra la copia renglón por renglón
+con objetos del ORM que hacía convertir_requisicion_cotizacion.
+"""
+import os
+import tempfile
+import time
+from benchmarks.comun import crear_app_benchmark, sembrar_productos
+from models import (
+    db, RequisicionCompra, DetalleRequisicion, CotizacionCompra, DetalleCotizacionCompra,
+    OrdenCompra, DetalleOrdenCompra, FacturaCompra
+)
+from utils.corporativo_utils import convertir_documentos
+
+RENGLONES_ORDEN = 5000
+REQUISICIONES = 500
+RENGLONES_REQUISICION = 10
+
+
+def sembrar_documentos():
+    orden = OrdenCompra(folio='OC-BENCH', proveedor_id=1, estado='completada', total=0.0)
+    db.session.add(orden)
+    db.session.flush()
+    db.session.execute(DetalleOrdenCompra.__table__.insert(), [{
+        'orden_compra_id': orden.id, 'producto_id': i % 1000 + 1, 'descripcion': f'Producto {i}',
+        'cantidad': 10, 'precio_unitario': 12.5, 'importe': 125.0
+    } for i in range(RENGLONES_ORDEN)])
+
+    db.session.execute(RequisicionCompra.__table__.insert(), [{
+        'folio': f'REQ-BENCH-{i}', 'estado': 'aprobada', 'total_estimado': 0.0
+    } for i in range(REQUISICIONES)])
+    db.session.execute(DetalleRequisicion.__table__.insert(), [{
+        'requisicion_id': i // RENGLONES_REQUISICION + 1, 'producto_id': i % 1000 + 1,
+        'descripcion': f'Producto {i}', 'cantidad': 5, 'precio_estimado': 10.0
+    } for i in range(REQUISICIONES * RENGLONES_REQUISICION)])
+    db.session.commit()
+    return orden.id
+
+
+def convertir_uno_a_uno(requisicion):
+    """Versión anterior: un objeto DetalleCotizacionCompra por renglón"""
+    cotizacion = CotizacionCompra(folio=f'COT-ORM-{requisicion.id}', requisicion_id=requisicion.id,
+                                  estado='pendiente', total=0.0)
+    db.session.add(cotizacion)
+    db.session.flush()
+    for detalle in requisicion.detalles:
+        nuevo = DetalleCotizacionCompra(
+            cotizacion_id=cotizacion.id, producto_id=detalle.producto_id, descripcion=detalle.descripcion,
+            cantidad=detalle.cantidad, precio_unitario=detalle.precio_estimado or 0,
+            importe=detalle.cantidad * (detalle.precio_estimado or 0)
+        )
+        db.session.add(nuevo)
+        cotizacion.total += nuevo.importe
+
+
+def main():
+    uri = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'conversion.db')}"
+    app = crear_app_benchmark(uri, produccion=True)
+    with app.app_context():
+        sembrar_productos(1000)
+        orden_id = sembrar_documentos()
+
+        inicio = time.perf_counter()
+        factura = convertir_documentos('orden_compra', 'factura_compra', [orden_id])[0]
+        db.session.commit()
+        duracion = time.perf_counter() - inicio
+        total = db.session.get(FacturaCompra, factura.destino_id).total
+        print(f"{'Orden de ' + format(RENGLONES_ORDEN, ',') + ' renglones a factura':<45} {duracion * 1000:>9.1f} ms"
+              f"  (total {total:,.2f})")
+
+        ids = list(range(1, REQUISICIONES + 1))
+        inicio = time.perf_counter()
+        for requisicion in RequisicionCompra.query.filter(RequisicionCompra.id.in_(ids[:50])):
+            convertir_uno_a_uno(requisicion)
+        db.session.rollback()
+        duracion = (time.perf_counter() - inicio) * REQUISICIONES / 50
+        print(f"{f'{REQUISICIONES} requisiciones, ORM renglón a renglón':<45} {duracion * 1000:>9.1f} ms  (estimado con 50)")
+
+        inicio = time.perf_counter()
+        convertidos = convertir_documentos('requisicion', 'cotizacion_compra', ids)
+        db.session.commit()
+        print(f"{f'{REQUISICIONES} requisiciones en una transacción':<45} "
+              f"{(time.perf_counter() - inicio) * 1000:>9.1f} ms  ({len(convertidos)} cotizaciones)")
+
+        repetidos = convertir_documentos('requisicion', 'cotizacion_compra', ids)
+        assert not repetidos, 'las requisiciones ya convertidas deben omitirse'
+        assert db.session.query(db.func.count(DetalleCotizacionCompra.id)).scalar() == \
+            REQUISICIONES * RENGLONES_REQUISICION
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Cambios de estado: aprobar 500 requisiciones pendientes con transicionar_documentos
+(un UPDATE condicionado más la bitácora por bloque) contra cargar y confirmar cada
+documento como hacía aprobar_requisicion.
+"""
+import os
+import tempfile
+import time
+from benchmarks.comun import crear_app_benchmark
+from models import db, RequisicionCompra, HistorialEstado
+from utils.corporativo_utils import transicionar_documentos
+
+REQUISICIONES = 500
+
+
+def sembrar(inicio, total):
+    db.session.execute(RequisicionCompra.__table__.insert(), [{
+        'folio': f'REQ-BENCH-{i}', 'estado': 'pendiente', 'total_estimado': 0.0
+    } for i in range(inicio, inicio + total)])
+    db.session.commit()
+
+
+def main():
+    uri = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'estados.db')}"
+    app = crear_app_benchmark(uri, produccion=True)
+    with app.app_context():
+        sembrar(0, REQUISICIONES * 2)
+        uno_a_uno = list(range(1, REQUISICIONES + 1))
+        en_bloque = list(range(REQUISICIONES + 1, REQUISICIONES * 2 + 1))
+
+        inicio = time.perf_counter()
+        for requisicion_id in uno_a_uno:
+            requisicion = db.session.get(RequisicionCompra, requisicion_id)
+            if requisicion.estado == 'pendiente':
+                requisicion.estado = 'aprobada'
+                db.session.commit()
+        print(f"{'Uno a uno (ORM, un commit por documento)':<45} {(time.perf_counter() - inicio) * 1000:>9.1f} ms")
+
+        inicio = time.perf_counter()
+        cambiados = transicionar_documentos('requisicion', en_bloque, 'aprobada', 'Aprobación masiva')
+        db.session.commit()
+        print(f"{'transicionar_documentos':<45} {(time.perf_counter() - inicio) * 1000:>9.1f} ms  "
+              f"({len(cambiados)} aprobadas)")
+
+        # La segunda vez no hay pendientes: nada cambia y no se escribe bitácora
+        assert transicionar_documentos('requisicion', en_bloque, 'aprobada') == []
+        db.session.commit()
+        assert db.session.query(db.func.count(HistorialEstado.id)).scalar() == REQUISICIONES
+
+
+if __name__ == '__main__':
+    main()
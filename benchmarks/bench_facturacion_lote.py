@@ -0,0 +1,58 @@
+"""
+Facturación de fin de mes: una venta a la vez con obtener_cfdi_venta contra el
+lote con precarga y pool de procesos, y el mismo lote repetido (todo reutilizado).
+"""
+import os
+import tempfile
+import time
+import zipfile
+from benchmarks.comun import crear_app_benchmark, sembrar_datos
+from models import db, Venta, DocumentoCFDI
+from utils.cfdi_utils import obtener_cfdi_venta
+from utils.facturacion_lote_utils import LoteFacturacion, procesar_lote, seleccionar_ventas_para_facturar
+
+EMISOR = {
+    'rfc': 'ABC123456789',
+    'razon_social': 'Mi Tienda de Abarrotes SA de CV',
+    'regimen_fiscal': '601',
+    'codigo_postal': '01000'
+}
+VENTAS = 3000
+LINEAS = 8
+
+
+def facturar_en_lote(venta_ids, directorio):
+    lote = LoteFacturacion(venta_ids, EMISOR, directorio)
+    inicio = time.perf_counter()
+    procesar_lote(lote)
+    duracion = time.perf_counter() - inicio
+    assert lote.estado == 'terminado', lote.mensaje
+    with zipfile.ZipFile(lote.archivo) as archivo_zip:
+        assert len(archivo_zip.namelist()) == len(venta_ids)
+    return duracion, lote
+
+
+if __name__ == '__main__':
+    directorio = tempfile.mkdtemp()
+    app = crear_app_benchmark(f'sqlite:///{os.path.join(directorio, "lote.db")}')
+    with app.app_context():
+        sembrar_datos(productos=2000, clientes=300, ventas=VENTAS, documentos=0, lineas=LINEAS)
+        venta_ids = seleccionar_ventas_para_facturar(venta_ids=list(range(1, VENTAS + 1)))
+        print(f"{len(venta_ids)} ventas completadas de {LINEAS} líneas, {os.cpu_count()} CPUs")
+
+        muestra = venta_ids[:300]
+        inicio = time.perf_counter()
+        for venta_id in muestra:
+            venta = db.session.get(Venta, venta_id)
+            obtener_cfdi_venta(venta, venta.cliente, EMISOR)
+        por_venta = (time.perf_counter() - inicio) / len(muestra)
+        print(f"{'Una por una (estimado)':<28} {por_venta * len(venta_ids):8.2f} s")
+
+        db.session.query(DocumentoCFDI).delete()
+        db.session.commit()
+
+        duracion, lote = facturar_en_lote(venta_ids, directorio)
+        print(f"{'Lote (pool de procesos)':<28} {duracion:8.2f} s  generadas: {lote.generadas}")
+
+        duracion, lote = facturar_en_lote(venta_ids, directorio)
+        print(f"{'Lote repetido':<28} {duracion:8.2f} s  reutilizadas: {lote.reutilizadas}")
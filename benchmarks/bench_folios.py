@@ -0,0 +1,91 @@
+"""
+Prueba de estrés de folios: varios procesos, cada uno con varios hilos, registran
+ventas (serie VTA, por bloques) y requisiciones (serie REQ, dentro de la transacción)
+sobre la misma base SQLite. Al final no debe haber folios repetidos y la serie REQ
+no debe tener huecos.
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from benchmarks.comun import crear_app_benchmark, sembrar_productos
+
+PROCESOS = 4
+HILOS_POR_PROCESO = 4
+VENTAS_POR_HILO = 50
+REQUISICIONES_POR_HILO = 10
+
+
+def trabajador(uri):
+    from models import db, RequisicionCompra
+    from utils.corporativo_utils import generar_folio
+    from utils.pos_utils import procesar_venta
+
+    app = crear_app_benchmark(uri, produccion=True)
+    errores = []
+
+    def hilo():
+        with app.app_context():
+            for i in range(VENTAS_POR_HILO):
+                venta, error = procesar_venta([{
+                    'producto_id': i % 100 + 1, 'cantidad': 1, 'precio': 15.0, 'subtotal': 15.0
+                }], efectivo=0)
+                if error:
+                    errores.append(error)
+                db.session.remove()
+            for _ in range(REQUISICIONES_POR_HILO):
+                try:
+                    db.session.add(RequisicionCompra(
+                        folio=generar_folio('REQ'), solicitante='Estrés', departamento='Compras'
+                    ))
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    errores.append(str(e))
+                db.session.remove()
+
+    hilos = [threading.Thread(target=hilo) for _ in range(HILOS_POR_PROCESO)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return errores
+
+
+def numeros(folios):
+    return sorted(int(folio.rsplit('-', 1)[1]) for folio in folios)
+
+
+if __name__ == '__main__':
+    uri = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'folios.db')}"
+    app = crear_app_benchmark(uri, produccion=True)
+    with app.app_context():
+        sembrar_productos(100, stock=1000000)
+
+    inicio = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(PROCESOS) as pool:
+        errores = [error for lista in pool.map(trabajador, [uri] * PROCESOS) for error in lista]
+    duracion = time.perf_counter() - inicio
+
+    from models import db, Venta, RequisicionCompra
+    with app.app_context():
+        ventas = [folio for folio, in db.session.query(Venta.folio)]
+        requisiciones = [folio for folio, in db.session.query(RequisicionCompra.folio)]
+
+    esperadas = PROCESOS * HILOS_POR_PROCESO * VENTAS_POR_HILO
+    print(f"{PROCESOS} procesos x {HILOS_POR_PROCESO} hilos en {duracion:.2f} s, errores: {len(errores)}")
+    for error in errores[:5]:
+        print(f"  {error}")
+
+    numeros_venta = numeros(ventas)
+    print(f"VTA: {len(ventas)} de {esperadas}, repetidos: {len(ventas) - len(set(ventas))}, "
+          f"mayor: {numeros_venta[-1]} (los bloques sin usar quedan como huecos)")
+
+    numeros_req = numeros(requisiciones)
+    huecos = numeros_req[-1] - len(numeros_req)
+    print(f"REQ: {len(requisiciones)}, repetidos: {len(requisiciones) - len(set(requisiciones))}, huecos: {huecos}")
+
+    assert not errores
+    assert len(ventas) == len(set(ventas)) == esperadas
+    assert numeros_req == list(range(1, len(numeros_req) + 1))
@@ -0,0 +1,46 @@
+"""
+Importa un CSV generado de 100k productos y reporta el tiempo total.
+"""
+import io
+import time
+from benchmarks.comun import crear_app_benchmark
+from models import db, Proveedor, Producto
+from utils.import_utils import importar_productos_desde_csv
+
+TOTAL_FILAS = 100000
+DUPLICADOS = 1000
+
+
+def generar_csv(total):
+    """Genera el CSV en memoria; las últimas filas repiten códigos para ejercitar duplicados"""
+    salida = io.StringIO()
+    salida.write('codigo,codigo_barras,nombre,descripcion,precio_compra,precio_venta,stock,stock_minimo,categoria,proveedor_id,activo\n')
+    for i in range(total):
+        n = i if i < total - DUPLICADOS else i - DUPLICADOS
+        salida.write(f'PROD{n:07d},750{n:010d},Producto {n},Descripción {n},10.5,15.0,100,5,Abarrotes,1,True\n')
+    salida.seek(0)
+    return salida
+
+
+def main():
+    app = crear_app_benchmark()
+    with app.app_context():
+        db.session.add(Proveedor(nombre='Proveedor Benchmark'))
+        db.session.commit()
+
+        archivo = generar_csv(TOTAL_FILAS)
+
+        def progreso(filas_leidas, importados):
+            print(f"  {filas_leidas:>7} filas leídas, {importados:>7} importadas", end='\r')
+
+        inicio = time.perf_counter()
+        importados, errores = importar_productos_desde_csv(archivo, progreso=progreso)
+        duracion = time.perf_counter() - inicio
+
+        print()
+        print(f"Importados: {importados}, errores: {len(errores)}, en BD: {Producto.query.count()}")
+        print(f"Tiempo: {duracion:.2f} s ({TOTAL_FILAS / duracion:,.0f} filas/s)")
+
+
+if __name__ == '__main__':
+    main()
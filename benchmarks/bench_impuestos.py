@@ -0,0 +1,61 @@
+"""
+Cálculo de impuestos y armado del CFDI para documentos de 10,000 líneas con
+tasas mezcladas. No usa base de datos: las líneas son copias ligeras como las
+que usa la facturación por lotes.
+"""
+import random
+import time
+from decimal import Decimal
+from facturacion_utils import generar_xml_cfdi
+from utils.facturacion_lote_utils import VentaLote, DetalleLote, ProductoLote
+from utils.impuestos_utils import calcular_impuestos, TASAS_IVA
+
+LINEAS = 10000
+REPETICIONES = 10
+EMISOR = {
+    'rfc': 'ABC123456789',
+    'razon_social': 'Mi Tienda de Abarrotes SA de CV',
+    'regimen_fiscal': '601',
+    'codigo_postal': '01000'
+}
+
+
+def armar_venta(lineas, semilla=1):
+    aleatorio = random.Random(semilla)
+    detalles = []
+    for i in range(lineas):
+        cantidad = aleatorio.randint(1, 12)
+        precio = Decimal(aleatorio.randint(100, 99999)) / 100
+        producto = ProductoLote(f'750{i:010d}', f'Producto {i}',
+                                '01' if i % 17 == 0 else '02', aleatorio.choice(TASAS_IVA))
+        detalles.append(DetalleLote(cantidad, precio, precio * cantidad, producto))
+    total = sum(detalle.subtotal for detalle in detalles)
+    return VentaLote(1, 'V000000001', total, detalles)
+
+
+def cronometrar(funcion):
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        resultado = funcion()
+    return (time.perf_counter() - inicio) / REPETICIONES * 1000, resultado
+
+
+if __name__ == '__main__':
+    venta = armar_venta(LINEAS)
+    lineas = [(d.subtotal, d.producto.objeto_impuesto_sat, d.producto.tasa_iva_sat) for d in venta.detalles]
+
+    duracion, impuestos = cronometrar(lambda: calcular_impuestos(lineas))
+    print(f"{'calcular_impuestos (base)':<32} {duracion:8.2f} ms")
+    assert impuestos.total_impuestos_trasladados == sum(t.importe for t in impuestos.traslados if t.importe)
+    assert impuestos.subtotal == sum(c.base for c in impuestos.conceptos)
+
+    duracion, incluidos = cronometrar(lambda: calcular_impuestos(lineas, incluidos=True))
+    print(f"{'calcular_impuestos (incluidos)':<32} {duracion:8.2f} ms")
+    assert incluidos.total == sum(importe for importe, objeto, tasa in lineas)
+
+    duracion, xml_cfdi = cronometrar(lambda: generar_xml_cfdi(venta, None, EMISOR))
+    print(f"{'generar_xml_cfdi':<32} {duracion:8.2f} ms  ({len(xml_cfdi) / 1024:,.0f} KB)")
+
+    for traslado in impuestos.traslados:
+        print(f"  {traslado.tipo_factor:<7} {traslado.tasa_o_cuota or '':<9} base {traslado.base:>14} "
+              f"importe {traslado.importe if traslado.importe is not None else '-':>12}")
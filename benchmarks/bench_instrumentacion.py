@@ -0,0 +1,54 @@
+"""
+Costo de la instrumentación por petición: peticiones por segundo con INSTRUMENTACION
+activa e inactiva, y costo del row_factory que cuenta filas en una lectura grande.
+"""
+import os
+import sqlite3
+import tempfile
+import time
+
+PETICIONES = 2000
+FILAS_LECTURA = 200000
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'instrumentacion.db')}"
+
+from app import app  # noqa: E402  (la base de datos se toma de DATABASE_URL al importar)
+from benchmarks.comun import sembrar_datos  # noqa: E402
+from utils.instrumentacion_utils import _contar_fila  # noqa: E402
+
+RUTAS = ['/api/productos', '/pos/imprimir-ticket/1', '/api/ventas/resumen']
+
+
+def peticiones_por_segundo(cliente, url):
+    inicio = time.perf_counter()
+    for _ in range(PETICIONES):
+        cliente.get(url)
+    return PETICIONES / (time.perf_counter() - inicio)
+
+
+def lectura(row_factory):
+    conexion = sqlite3.connect(':memory:')
+    conexion.row_factory = row_factory
+    inicio = time.perf_counter()
+    conexion.execute(f'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {FILAS_LECTURA}) '
+                     'SELECT i, i * 2, \'x\' FROM n').fetchall()
+    return (time.perf_counter() - inicio) * 1000
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        sembrar_datos(productos=2000, clientes=50, ventas=500, documentos=10, lineas=5)
+    cliente = app.test_client()
+
+    print(f"{'Ruta':<26} {'sin medir':>10} {'medido':>10} {'costo':>8}")
+    for url in RUTAS:
+        cliente.get(url)
+        app.config['INSTRUMENTACION'] = False
+        sin_medir = peticiones_por_segundo(cliente, url)
+        app.config['INSTRUMENTACION'] = True
+        medido = peticiones_por_segundo(cliente, url)
+        costo = (1 / medido - 1 / sin_medir) * 1e6
+        print(f"{url:<26} {sin_medir:>8.0f}/s {medido:>8.0f}/s {costo:>6.0f} us")
+
+    print(f"Lectura de {FILAS_LECTURA:,} filas: sin row_factory {lectura(None):.1f} ms, "
+          f"contando filas {lectura(_contar_fila):.1f} ms")
@@ -0,0 +1,49 @@
+"""
+Reabastecimiento sobre 100k productos: tiempo de la agregación de velocidad de venta
+y de la generación en bloque de las requisiciones por proveedor, contra la revisión
+de un producto a la vez con Producto.necesita_reabastecimiento.
+"""
+import os
+import tempfile
+import time
+from benchmarks.comun import crear_app_benchmark, sembrar_datos
+from models import db, Producto, RequisicionCompra, DetalleRequisicion
+from utils.reabastecimiento_utils import calcular_sugerencias, ejecutar_reabastecimiento
+
+PRODUCTOS = 100000
+VENTAS = 300000
+
+
+def main():
+    uri = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'reabastecimiento.db')}"
+    app = crear_app_benchmark(uri, produccion=True)
+    with app.app_context():
+        inicio = time.perf_counter()
+        sembrar_datos(productos=PRODUCTOS, clientes=1000, ventas=VENTAS, documentos=0, lineas=3)
+        print(f'Datos: {PRODUCTOS:,} productos, {VENTAS * 3:,} partidas en {time.perf_counter() - inicio:.1f} s\n')
+
+        inicio = time.perf_counter()
+        bajos = sum(1 for producto in Producto.query.filter_by(activo=True) if producto.necesita_reabastecimiento())
+        print(f"{'Uno a uno (stock <= stock_minimo)':<40} {time.perf_counter() - inicio:>8.2f} s  {bajos:,} productos")
+        db.session.expunge_all()
+
+        inicio = time.perf_counter()
+        sugerencias = calcular_sugerencias()
+        print(f"{'calcular_sugerencias':<40} {time.perf_counter() - inicio:>8.2f} s  {len(sugerencias):,} productos")
+
+        inicio = time.perf_counter()
+        resultado = ejecutar_reabastecimiento()
+        print(f"{'ejecutar_reabastecimiento':<40} {time.perf_counter() - inicio:>8.2f} s  "
+              f"{resultado.requisiciones:,} requisiciones, {resultado.renglones:,} renglones")
+
+        # La segunda corrida ve lo generado como pendiente y no vuelve a pedirlo
+        inicio = time.perf_counter()
+        repetida = ejecutar_reabastecimiento()
+        print(f"{'segunda corrida':<40} {time.perf_counter() - inicio:>8.2f} s  {repetida.renglones:,} renglones")
+
+        assert db.session.query(db.func.count(RequisicionCompra.id)).scalar() == resultado.requisiciones
+        assert db.session.query(db.func.count(DetalleRequisicion.id)).scalar() == resultado.renglones
+
+
+if __name__ == '__main__':
+    main()
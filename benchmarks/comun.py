@@ -0,0 +1,172 @@
+"""
+Utilidades compartidas por los benchmarks.
+Se ejecutan desde la raíz del proyecto, por ejemplo:
+    python -m benchmarks.bench_busqueda_pos
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from flask import Flask
+from models import (
+    db, Proveedor, Producto, Cliente, Venta, DetalleVenta,
+    RequisicionCompra, DetalleRequisicion, CotizacionCompra, DetalleCotizacionCompra,
+    OrdenCompra, DetalleOrdenCompra, FacturaCompra, DetalleFacturaCompra,
+    CotizacionVenta, DetalleCotizacionVenta, Remision, DetalleRemision,
+    FacturaVenta, DetalleFacturaVenta
+)
+from utils.base_datos_utils import configurar_base_datos, registrar_pragmas
+
+CATEGORIAS = ['Abarrotes', 'Bebidas', 'Lácteos', 'Limpieza', 'Botanas', 'Enlatados', 'Panadería', 'Higiene']
+
+# (documento, detalle, columna que los une, estados posibles)
+DOCUMENTOS = [
+    (RequisicionCompra, DetalleRequisicion, 'requisicion_id', ['pendiente', 'aprobada', 'rechazada']),
+    (CotizacionCompra, DetalleCotizacionCompra, 'cotizacion_id', ['pendiente', 'aceptada', 'rechazada']),
+    (OrdenCompra, DetalleOrdenCompra, 'orden_compra_id', ['pendiente', 'parcial', 'completada', 'cancelada']),
+    (FacturaCompra, DetalleFacturaCompra, 'factura_id', ['pendiente', 'pagada', 'cancelada']),
+    (CotizacionVenta, DetalleCotizacionVenta, 'cotizacion_id', ['pendiente', 'aceptada', 'rechazada']),
+    (Remision, DetalleRemision, 'remision_id', ['pendiente', 'entregada', 'cancelada']),
+    (FacturaVenta, DetalleFacturaVenta, 'factura_id', ['pendiente', 'pagada', 'cancelada'])
+]
+
+
+def crear_app_benchmark(uri='sqlite://', produccion=False):
+    """
+    Crea una aplicación mínima con su propia base de datos (en memoria por defecto).
+    Con produccion=True aplica el perfil de SQLite de la aplicación (WAL, pragmas, pool).
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if produccion:
+        configurar_base_datos(app)
+    db.init_app(app)
+    if produccion:
+        registrar_pragmas(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def sembrar_productos(total, stock=1000):
+    """Inserta un proveedor y `total` productos con códigos predecibles"""
+    proveedor = Proveedor(nombre='Proveedor Benchmark')
+    db.session.add(proveedor)
+    db.session.flush()
+
+    db.session.execute(Producto.__table__.insert(), [{
+        'codigo': f'PROD{i:07d}',
+        'codigo_barras': f'750{i:010d}',
+        'nombre': f'Producto {i}',
+        'precio_compra': 10.0,
+        'precio_venta': 15.0,
+        'stock': stock,
+        'stock_minimo': 5,
+        'proveedor_id': proveedor.id,
+        'activo': True
+    } for i in range(total)])
+    db.session.commit()
+
+
+def _insertar_en_bloques(tabla, filas, tamano=10000):
+    bloque = []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) >= tamano:
+            db.session.execute(tabla.insert(), bloque)
+            bloque = []
+    if bloque:
+        db.session.execute(tabla.insert(), bloque)
+
+
+def sembrar_datos(productos=10000, clientes=2000, ventas=20000, documentos=500, lineas=3, semilla=1):
+    """
+    Llena todas las tablas con datos sintéticos: catálogo, ventas con sus detalles
+    y `documentos` documentos de cada tipo de compras y ventas corporativas.
+    """
+    aleatorio = random.Random(semilla)
+    ahora = datetime.utcnow()
+    total_proveedores = max(1, productos // 100)
+
+    _insertar_en_bloques(Proveedor.__table__, ({
+        'nombre': f'Proveedor {i}', 'rfc': f'PRO{i:09d}', 'fecha_creacion': ahora
+    } for i in range(total_proveedores)))
+
+    _insertar_en_bloques(Producto.__table__, ({
+        'codigo': f'PROD{i:07d}',
+        'codigo_barras': f'750{i:010d}',
+        'nombre': f'Producto {i}',
+        'precio_compra': 10.0 + i % 90,
+        'precio_venta': 15.0 + i % 90,
+        'stock': aleatorio.randint(0, 200),
+        'stock_minimo': 5,
+        'categoria': CATEGORIAS[i % len(CATEGORIAS)],
+        'proveedor_id': i % total_proveedores + 1,
+        'activo': i % 50 != 0
+    } for i in range(productos)))
+
+    _insertar_en_bloques(Cliente.__table__, ({
+        'nombre': f'Cliente {i}',
+        'email': f'cliente{i}@correo.com',
+        'tipo_cliente': 'registrado' if i % 3 else 'mostrador',
+        'rfc': f'CLI{i:09d}',
+        'fecha_registro': ahora
+    } for i in range(clientes)))
+
+    fechas = [ahora - timedelta(minutes=aleatorio.randint(0, 60 * 24 * 365)) for _ in range(ventas)]
+    _insertar_en_bloques(Venta.__table__, ({
+        'folio': f'V{i:09d}',
+        'cliente_id': aleatorio.randint(1, clientes) if clientes and i % 4 == 0 else None,
+        'total': 15.0 * lineas,
+        'efectivo': 100.0,
+        'cambio': 100.0 - 15.0 * lineas,
+        'fecha_creacion': fechas[i],
+        'estado': 'cancelada' if i % 40 == 0 else 'completada'
+    } for i in range(ventas)))
+    _insertar_en_bloques(DetalleVenta.__table__, ({
+        'venta_id': i // lineas + 1,
+        'producto_id': aleatorio.randint(1, productos),
+        'cantidad': 1,
+        'precio_unitario': 15.0,
+        'subtotal': 15.0
+    } for i in range(ventas * lineas)))
+
+    for documento, detalle, columna, estados in DOCUMENTOS:
+        tabla = documento.__table__
+        filas = []
+        for i in range(documentos):
+            fila = {
+                'folio': f'{tabla.name[:3].upper()}{i:08d}',
+                'fecha_creacion': ahora - timedelta(days=aleatorio.randint(0, 365)),
+                'estado': aleatorio.choice(estados)
+            }
+            if 'total' in tabla.c:
+                fila['total'] = 100.0 * lineas
+            if 'proveedor_id' in tabla.c:
+                fila['proveedor_id'] = aleatorio.randint(1, total_proveedores)
+            if 'cliente_id' in tabla.c and clientes:
+                fila['cliente_id'] = aleatorio.randint(1, clientes)
+            filas.append(fila)
+        _insertar_en_bloques(tabla, filas)
+
+        precio = 'precio_estimado' if 'precio_estimado' in detalle.__table__.c else 'precio_unitario'
+        _insertar_en_bloques(detalle.__table__, ({
+            columna: i // lineas + 1,
+            'producto_id': aleatorio.randint(1, productos),
+            'descripcion': 'Partida de prueba',
+            'cantidad': 10,
+            precio: 10.0,
+            **({'importe': 100.0} if 'importe' in detalle.__table__.c else {})
+        } for i in range(documentos * lineas)))
+
+    db.session.commit()
+
+
+def medir(nombre, funcion, repeticiones):
+    """Ejecuta `funcion` `repeticiones` veces e imprime operaciones por segundo"""
+    inicio = time.perf_counter()
+    for i in range(repeticiones):
+        funcion(i)
+    duracion = time.perf_counter() - inicio
+    print(f"{nombre:<40} {repeticiones / duracion:>12,.0f} ops/s")
+    return duracion
@@ -0,0 +1,418 @@
+"""
+Generador de datos sintéticos a escala para todas las tablas de models.py:
+proveedores, catálogo con datos fiscales, clientes, ventas con sus detalles y
+devoluciones, y las cadenas completas de documentos corporativos
+(requisición → cotización → orden → factura de compra y
+cotización → remisión → factura de venta), más contadores de folio,
+configuración y resúmenes de ventas.
+
+Los CFDI guardados y los carritos se quedan vacíos: la aplicación los produce al usarse.
+
+    python -m benchmarks.datos_sinteticos --escala grande --base sqlite:////tmp/tienda_grande.db
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from benchmarks.comun import crear_app_benchmark, _insertar_en_bloques
+from models import (
+    db, Proveedor, Producto, Cliente, Venta, DetalleVenta, Devolucion, DetalleDevolucion,
+    RequisicionCompra, DetalleRequisicion, CotizacionCompra, DetalleCotizacionCompra,
+    OrdenCompra, DetalleOrdenCompra, FacturaCompra, DetalleFacturaCompra,
+    CotizacionVenta, DetalleCotizacionVenta, Remision, DetalleRemision,
+    FacturaVenta, DetalleFacturaVenta, ContadorFolio
+)
+from utils.configuracion_utils import cache_configuracion
+from utils.folios_utils import formatear_folio
+from utils.resumen_ventas_utils import reconstruir_resumen_ventas
+
+# `documentos` es el número de requisiciones y de cotizaciones de venta que inician cada cadena
+ESCALAS = {
+    'pequena': {'proveedores': 50, 'productos': 2000, 'clientes': 1000, 'ventas': 20000, 'documentos': 500},
+    'mediana': {'proveedores': 300, 'productos': 20000, 'clientes': 10000, 'ventas': 200000, 'documentos': 5000},
+    'grande': {'proveedores': 1000, 'productos': 100000, 'clientes': 50000, 'ventas': 1000000, 'documentos': 20000}
+}
+
+DIAS_HISTORIA = 365
+
+# (tipo de producto, categoría, tasa de IVA); alimentos básicos a tasa 0, el resto al 16%
+TIPOS_PRODUCTO = [
+    ('Arroz', 'Abarrotes', '0.000000'), ('Frijol negro', 'Abarrotes', '0.000000'),
+    ('Azúcar estándar', 'Abarrotes', '0.000000'), ('Aceite vegetal', 'Abarrotes', '0.000000'),
+    ('Sopa de pasta', 'Abarrotes', '0.000000'), ('Café soluble', 'Abarrotes', '0.000000'),
+    ('Leche entera', 'Lácteos', '0.000000'), ('Yogur natural', 'Lácteos', '0.000000'),
+    ('Queso panela', 'Lácteos', '0.000000'), ('Pan de caja', 'Panadería', '0.000000'),
+    ('Tortillas de harina', 'Panadería', '0.000000'), ('Atún en agua', 'Enlatados', '0.000000'),
+    ('Chiles en vinagre', 'Enlatados', '0.000000'), ('Refresco de cola', 'Bebidas', '0.160000'),
+    ('Agua mineral', 'Bebidas', '0.160000'), ('Jugo de naranja', 'Bebidas', '0.000000'),
+    ('Papas fritas', 'Botanas', '0.160000'), ('Cacahuates enchilados', 'Botanas', '0.160000'),
+    ('Detergente en polvo', 'Limpieza', '0.160000'), ('Cloro', 'Limpieza', '0.160000'),
+    ('Jabón de tocador', 'Higiene', '0.160000'), ('Papel higiénico', 'Higiene', '0.160000')
+]
+MARCAS = ['La Costeña', 'Del Valle', 'San Marcos', 'El Dorado', 'Buen Día', 'Doña Lupe', 'Herdez',
+          'La Moderna', 'Santa Clara', 'Don Chema', 'Los Altos', 'Sol de Oro']
+PRESENTACIONES = ['250 g', '500 g', '1 kg', '1 L', '600 ml', '2 L', 'paquete', '4 piezas', 'lata', 'bolsa']
+
+NOMBRES = ['José', 'María', 'Juan', 'Guadalupe', 'Luis', 'Ana', 'Carlos', 'Rosa', 'Jorge', 'Laura',
+           'Miguel', 'Patricia', 'Pedro', 'Verónica', 'Alejandro', 'Sofía', 'Ricardo', 'Fernanda']
+APELLIDOS = ['Hernández', 'García', 'Martínez', 'López', 'González', 'Pérez', 'Rodríguez', 'Sánchez',
+             'Ramírez', 'Cruz', 'Flores', 'Gómez', 'Morales', 'Vázquez', 'Jiménez', 'Reyes']
+REGIMENES_FISCALES = ['601', '605', '612', '616', '626']
+USOS_CFDI = ['G01', 'G03', 'S01']
+DEPARTAMENTOS = ['Compras', 'Almacén', 'Tienda', 'Administración']
+CONDICIONES_PAGO = ['Contado', '15 días', '30 días']
+
+# Peso relativo de cada hora local de apertura (7 a 22 h): picos a mediodía y por la tarde
+PESO_HORAS = {7: 2, 8: 4, 9: 5, 10: 6, 11: 7, 12: 9, 13: 10, 14: 9, 15: 6, 16: 6,
+              17: 8, 18: 10, 19: 10, 20: 8, 21: 5, 22: 2}
+
+# Renglones por venta y su peso: la mayoría son compras chicas
+PESO_RENGLONES = {1: 30, 2: 22, 3: 15, 4: 10, 5: 7, 6: 5, 8: 5, 12: 4, 20: 2}
+
+TAMANO_BLOQUE_VENTAS = 10000
+
+
+def _centavos(valor):
+    return round(valor / 100, 2)
+
+
+def _rfc(aleatorio, letras):
+    fecha = f'{aleatorio.randint(60, 99)}{aleatorio.randint(1, 12):02d}{aleatorio.randint(1, 28):02d}'
+    iniciales = ''.join(aleatorio.choice('ABCDEFGHIJKLMNOPRSTUVZ') for _ in range(letras))
+    homoclave = ''.join(aleatorio.choice('ABCDEFGHJKLMNPRSTUVWXYZ0123456789') for _ in range(3))
+    return f'{iniciales}{fecha}{homoclave}'
+
+
+def _utc(local):
+    """Hora local del servidor (sin zona) a UTC sin zona, como guarda la aplicación"""
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class GeneradorDatos:
+    """Genera una escala completa con una semilla fija; mismos parámetros, mismos datos"""
+
+    def __init__(self, proveedores, productos, clientes, ventas, documentos, semilla=1, progreso=print):
+        self.total_proveedores = proveedores
+        self.total_productos = productos
+        self.total_clientes = clientes
+        self.total_ventas = ventas
+        self.total_documentos = documentos
+        self.aleatorio = random.Random(semilla)
+        self.progreso = progreso or (lambda mensaje: None)
+        self.ahora = datetime.now().replace(microsecond=0)
+        self.precios = []
+        self.folios = {}
+
+    def generar(self):
+        pasos = [
+            ('proveedores', self.proveedores), ('productos', self.productos), ('clientes', self.clientes),
+            ('ventas', self.ventas), ('compras', self.cadena_compras), ('ventas corporativas', self.cadena_ventas),
+            ('folios y configuración', self.folios_y_configuracion), ('resúmenes', reconstruir_resumen_ventas)
+        ]
+        for nombre, paso in pasos:
+            inicio = time.perf_counter()
+            paso()
+            db.session.commit()
+            self.progreso(f'  {nombre}: {time.perf_counter() - inicio:.1f} s')
+
+    # ---------- catálogos ----------
+
+    def proveedores(self):
+        a = self.aleatorio
+        _insertar_en_bloques(Proveedor.__table__, ({
+            'nombre': f'{a.choice(MARCAS)} Distribuidora {i + 1}',
+            'contacto': f'{a.choice(NOMBRES)} {a.choice(APELLIDOS)}',
+            'telefono': f'55{a.randint(10000000, 99999999)}',
+            'email': f'ventas{i + 1}@proveedor{i + 1}.com.mx',
+            'direccion': f'Calle {a.choice(APELLIDOS)} #{a.randint(1, 999)}',
+            'razon_social': f'Distribuidora {i + 1} SA de CV',
+            'rfc': _rfc(a, 3),
+            'regimen_fiscal': '601',
+            'codigo_postal': f'{a.randint(1000, 99999):05d}',
+            'fecha_creacion': self.ahora - timedelta(days=a.randint(DIAS_HISTORIA, 3 * DIAS_HISTORIA))
+        } for i in range(self.total_proveedores)))
+
+    def productos(self):
+        a = self.aleatorio
+        filas = []
+        for i in range(self.total_productos):
+            tipo, categoria, tasa = a.choice(TIPOS_PRODUCTO)
+            precio_compra = a.randint(800, 12000)
+            precio_venta = int(precio_compra * a.uniform(1.15, 1.45))
+            self.precios.append(precio_venta)
+            filas.append({
+                'codigo': f'PROD{i:07d}',
+                'codigo_barras': f'750{i:010d}',
+                'nombre': f'{tipo} {a.choice(MARCAS)} {a.choice(PRESENTACIONES)}',
+                'descripcion': f'{tipo} de la categoría {categoria}',
+                'precio_compra': _centavos(precio_compra),
+                'precio_venta': _centavos(precio_venta),
+                'stock': a.randint(0, 300),
+                'stock_minimo': a.choice([5, 10, 20]),
+                'categoria': categoria,
+                'clave_producto_sat': '50000000',
+                'objeto_impuesto_sat': '02',
+                'tasa_iva_sat': tasa,
+                'proveedor_id': a.randint(1, self.total_proveedores),
+                'activo': a.random() > 0.02,
+                'fecha_creacion': self.ahora - timedelta(days=a.randint(0, DIAS_HISTORIA)),
+                'fecha_actualizacion': self.ahora - timedelta(days=a.randint(0, 30))
+            })
+        _insertar_en_bloques(Producto.__table__, filas)
+
+        # Popularidad tipo Zipf: pocos productos concentran la mayoría de las ventas
+        orden = list(range(1, self.total_productos + 1))
+        a.shuffle(orden)
+        acumulado = 0.0
+        self.productos_por_popularidad = orden
+        self.pesos_productos = []
+        for rango in range(1, self.total_productos + 1):
+            acumulado += 1 / rango ** 0.9
+            self.pesos_productos.append(acumulado)
+
+    def clientes(self):
+        a = self.aleatorio
+        filas = []
+        for i in range(self.total_clientes):
+            registrado = a.random() < 0.35
+            nombre, apellido = a.choice(NOMBRES), f'{a.choice(APELLIDOS)} {a.choice(APELLIDOS)}'
+            filas.append({
+                'nombre': nombre,
+                'apellido': apellido,
+                'telefono': f'55{a.randint(10000000, 99999999)}',
+                'email': f'{nombre.lower()}.{i + 1}@correo.com',
+                'direccion': f'Av. {a.choice(APELLIDOS)} #{a.randint(1, 999)}',
+                'tipo_cliente': 'registrado' if registrado else 'mostrador',
+                'fecha_registro': self.ahora - timedelta(days=a.randint(0, 2 * DIAS_HISTORIA)),
+                'razon_social': f'{nombre} {apellido}'.upper() if registrado else None,
+                'rfc': _rfc(a, 4) if registrado else None,
+                'regimen_fiscal': a.choice(REGIMENES_FISCALES) if registrado else None,
+                'codigo_postal': f'{a.randint(1000, 99999):05d}' if registrado else None,
+                'uso_cfdi': a.choice(USOS_CFDI) if registrado else None
+            })
+        _insertar_en_bloques(Cliente.__table__, filas)
+
+    def _elegir_productos(self, cantidad):
+        elegidos = self.aleatorio.choices(self.productos_por_popularidad, cum_weights=self.pesos_productos, k=cantidad)
+        return list(dict.fromkeys(elegidos))
+
+    # ---------- punto de venta ----------
+
+    def ventas(self):
+        a = self.aleatorio
+        horas, pesos_horas = list(PESO_HORAS), list(PESO_HORAS.values())
+        renglones, pesos_renglones = list(PESO_RENGLONES), list(PESO_RENGLONES.values())
+        inicio_historia = (self.ahora - timedelta(days=DIAS_HISTORIA)).replace(hour=0, minute=0, second=0)
+
+        # Fechas ordenadas para que los ids crezcan con el tiempo, como en producción
+        dias = sorted(a.randrange(DIAS_HISTORIA) for _ in range(self.total_ventas))
+        detalle_id = devolucion_id = 0
+
+        for inicio_bloque in range(0, self.total_ventas, TAMANO_BLOQUE_VENTAS):
+            ventas, detalles, devoluciones, detalles_devolucion = [], [], [], []
+            for venta_id in range(inicio_bloque + 1, min(inicio_bloque + TAMANO_BLOQUE_VENTAS, self.total_ventas) + 1):
+                local = inicio_historia + timedelta(
+                    days=dias[venta_id - 1], hours=a.choices(horas, pesos_horas)[0],
+                    minutes=a.randrange(60), seconds=a.randrange(60)
+                )
+                fecha = _utc(local)
+                total = 0
+                lineas = []
+                for producto_id in self._elegir_productos(a.choices(renglones, pesos_renglones)[0]):
+                    cantidad = a.choices((1, 2, 3, 6), (70, 18, 8, 4))[0]
+                    precio = self.precios[producto_id - 1]
+                    total += precio * cantidad
+                    detalle_id += 1
+                    lineas.append((producto_id, cantidad, precio))
+                    detalles.append({
+                        'id': detalle_id, 'venta_id': venta_id, 'producto_id': producto_id, 'cantidad': cantidad,
+                        'precio_unitario': _centavos(precio), 'subtotal': _centavos(precio * cantidad)
+                    })
+
+                suerte = a.random()
+                estado = 'cancelada' if suerte < 0.02 else 'devolucion' if suerte < 0.03 else 'completada'
+                billete = next(b for b in (5000, 10000, 20000, 50000, 100000, 10 ** 9) if b >= total)
+                efectivo = billete if a.random() < 0.8 else total
+                ventas.append({
+                    'id': venta_id,
+                    'folio': formatear_folio('VTA', venta_id),
+                    'cliente_id': a.randint(1, self.total_clientes) if a.random() < 0.25 else None,
+                    'total': _centavos(total),
+                    'efectivo': _centavos(efectivo),
+                    'cambio': _centavos(efectivo - total),
+                    'fecha_creacion': fecha,
+                    'estado': estado
+                })
+
+                if estado == 'devolucion':
+                    devolucion_id += 1
+                    producto_id, cantidad, precio = lineas[0]
+                    devoluciones.append({
+                        'id': devolucion_id, 'venta_id': venta_id, 'motivo': 'Producto en mal estado',
+                        'total_devolucion': _centavos(precio * cantidad),
+                        'fecha_creacion': fecha + timedelta(days=a.randint(0, 7))
+                    })
+                    detalles_devolucion.append({
+                        'devolucion_id': devolucion_id, 'producto_id': producto_id, 'cantidad': cantidad,
+                        'precio_unitario': _centavos(precio), 'subtotal': _centavos(precio * cantidad)
+                    })
+
+            _insertar_en_bloques(Venta.__table__, ventas)
+            _insertar_en_bloques(DetalleVenta.__table__, detalles)
+            _insertar_en_bloques(Devolucion.__table__, devoluciones)
+            _insertar_en_bloques(DetalleDevolucion.__table__, detalles_devolucion)
+            db.session.commit()
+
+        self.folios['VTA'] = self.total_ventas
+
+    # ---------- documentos corporativos ----------
+
+    def _lineas_documento(self, costo=False):
+        a = self.aleatorio
+        lineas = []
+        for producto_id in self._elegir_productos(a.randint(1, 8)):
+            precio = self.precios[producto_id - 1]
+            lineas.append((producto_id, a.choice((6, 12, 24, 48, 100)), int(precio * 0.8) if costo else precio))
+        return lineas
+
+    def _folio(self, serie):
+        self.folios[serie] = self.folios.get(serie, 0) + 1
+        return formatear_folio(serie, self.folios[serie])
+
+    @staticmethod
+    def _detalles(columna, documento_id, lineas, precio='precio_unitario'):
+        filas = []
+        for producto_id, cantidad, unitario in lineas:
+            fila = {
+                columna: documento_id, 'producto_id': producto_id, 'descripcion': f'Producto {producto_id}',
+                'cantidad': cantidad, precio: _centavos(unitario)
+            }
+            if precio == 'precio_unitario':
+                fila['importe'] = _centavos(unitario * cantidad)
+            else:
+                fila['unidad_medida'] = 'pieza'
+            filas.append(fila)
+        return filas
+
+    def _cadena(self, etapas):
+        """
+        Genera `total_documentos` cadenas. `etapas` es una lista de
+        (modelo, detalle, columna, serie, estado_si_avanza, estados_si_se_detiene, probabilidad_de_avanzar,
+        función que arma las columnas propias del documento).
+        """
+        a = self.aleatorio
+        documentos = {modelo: [] for modelo, *_ in etapas}
+        detalles = {detalle: [] for _, detalle, *_ in etapas}
+        ids = {modelo: 0 for modelo, *_ in etapas}
+
+        for _ in range(self.total_documentos):
+            fecha = _utc(self.ahora - timedelta(days=a.randint(0, DIAS_HISTORIA), minutes=a.randrange(600)))
+            lineas = self._lineas_documento(costo=etapas[0][0] is RequisicionCompra)
+            anterior = None
+            for indice, (modelo, detalle, columna, serie, avanza, detenido, probabilidad, columnas) in enumerate(etapas):
+                ids[modelo] += 1
+                documento_id = ids[modelo]
+                sigue = indice + 1 < len(etapas) and a.random() < probabilidad
+                total = _centavos(sum(cantidad * precio for _, cantidad, precio in lineas))
+                documentos[modelo].append({
+                    'id': documento_id, 'folio': self._folio(serie), 'fecha_creacion': fecha,
+                    'estado': avanza if sigue else a.choice(detenido),
+                    **columnas(anterior, total, fecha)
+                })
+                detalles[detalle].extend(self._detalles(
+                    columna, documento_id, lineas,
+                    'precio_estimado' if detalle is DetalleRequisicion else 'precio_unitario'
+                ))
+                if not sigue:
+                    break
+                anterior = documentos[modelo][-1]
+                fecha += timedelta(days=a.randint(1, 5))
+
+        for modelo, filas in documentos.items():
+            _insertar_en_bloques(modelo.__table__, filas)
+        for detalle, filas in detalles.items():
+            _insertar_en_bloques(detalle.__table__, filas)
+
+    def cadena_compras(self):
+        a = self.aleatorio
+        self._cadena([
+            (RequisicionCompra, DetalleRequisicion, 'requisicion_id', 'REQ', 'convertida_cotizacion', ['pendiente', 'rechazada'], 0.7,
+             lambda anterior, total, fecha: {
+                 'solicitante': f'{a.choice(NOMBRES)} {a.choice(APELLIDOS)}', 'departamento': a.choice(DEPARTAMENTOS),
+                 'justificacion': 'Reabastecimiento de inventario', 'total_estimado': total}),
+            (CotizacionCompra, DetalleCotizacionCompra, 'cotizacion_id', 'COT', 'convertida_orden', ['pendiente', 'rechazada'], 0.8,
+             lambda anterior, total, fecha: {
+                 'requisicion_id': anterior['id'], 'proveedor_id': a.randint(1, self.total_proveedores), 'validez': 30,
+                 'condiciones_pago': a.choice(CONDICIONES_PAGO), 'total': total}),
+            (OrdenCompra, DetalleOrdenCompra, 'orden_compra_id', 'OC', 'completada', ['pendiente', 'parcial', 'cancelada'], 0.7,
+             lambda anterior, total, fecha: {
+                 'cotizacion_id': anterior['id'], 'proveedor_id': anterior['proveedor_id'],
+                 'fecha_esperada_entrega': fecha + timedelta(days=7),
+                 'condiciones_pago': anterior['condiciones_pago'], 'total': total}),
+            (FacturaCompra, DetalleFacturaCompra, 'factura_id', 'FC', 'pagada', ['pendiente', 'pagada', 'cancelada'], 0,
+             lambda anterior, total, fecha: {
+                 'orden_compra_id': anterior['id'], 'proveedor_id': anterior['proveedor_id'],
+                 'fecha_factura': fecha, 'uuid': f'{a.getrandbits(128):032x}', 'total': total})
+        ])
+
+    def cadena_ventas(self):
+        a = self.aleatorio
+        self._cadena([
+            (CotizacionVenta, DetalleCotizacionVenta, 'cotizacion_id', 'COTV', 'aceptada', ['pendiente', 'rechazada'], 0.6,
+             lambda anterior, total, fecha: {
+                 'cliente_id': a.randint(1, self.total_clientes), 'validez': 15,
+                 'condiciones_pago': a.choice(CONDICIONES_PAGO), 'total': total}),
+            (Remision, DetalleRemision, 'remision_id', 'REM', 'entregada', ['pendiente', 'cancelada'], 0.8,
+             lambda anterior, total, fecha: {
+                 'cotizacion_id': anterior['id'], 'cliente_id': anterior['cliente_id'],
+                 'fecha_entrega': fecha + timedelta(days=2), 'total': total}),
+            (FacturaVenta, DetalleFacturaVenta, 'factura_id', 'FV', 'pagada', ['pendiente', 'pagada', 'cancelada'], 0,
+             lambda anterior, total, fecha: {
+                 'remision_id': anterior['id'], 'cliente_id': anterior['cliente_id'],
+                 'fecha_factura': fecha, 'uuid': f'{a.getrandbits(128):032x}', 'total': total})
+        ])
+
+    # ---------- estado de la aplicación ----------
+
+    def folios_y_configuracion(self):
+        """Los contadores siguen después del último folio generado, para que la aplicación no repita"""
+        db.session.execute(ContadorFolio.__table__.insert(), [
+            {'serie': serie, 'ultimo': ultimo} for serie, ultimo in self.folios.items()
+        ])
+        cache_configuracion.guardar({
+            'nombre_tienda': 'Abarrotes La Esperanza', 'rfc_tienda': 'ALE010101AB1',
+            'telefono_tienda': '5551234567', 'direccion_tienda': 'Av. Principal #100, Centro',
+            'moneda': 'MXN', 'formato_fecha': 'dd/mm/yyyy', 'zona_horaria': 'America/Mexico_City'
+        }, 'general')
+        cache_configuracion.guardar({
+            'modo_prueba_facturacion': True, 'rfc_emisor': 'ALE010101AB1',
+            'razon_social_emisor': 'Abarrotes La Esperanza SA de CV',
+            'regimen_fiscal_emisor': '601', 'codigo_postal_emisor': '06000'
+        }, 'facturacion', tipos={'modo_prueba_facturacion': 'boolean'})
+
+
+def generar_datos(escala='pequena', semilla=1, progreso=print, **ajustes):
+    """Llena la base de datos del contexto actual con una escala de ESCALAS (o sus ajustes)"""
+    parametros = dict(ESCALAS[escala], **ajustes)
+    GeneradorDatos(semilla=semilla, progreso=progreso, **parametros).generar()
+    return parametros
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Genera datos sintéticos para pruebas de rendimiento')
+    parser.add_argument('--escala', choices=sorted(ESCALAS), default='pequena')
+    parser.add_argument('--base', default='sqlite:///sintetico.db',
+                        help='URI de la base de datos destino (las rutas relativas van en instance/); debe estar vacía')
+    parser.add_argument('--semilla', type=int, default=1)
+    for campo in ESCALAS['pequena']:
+        parser.add_argument(f'--{campo}', type=int, help=f'Sustituye el número de {campo} de la escala')
+    argumentos = parser.parse_args()
+
+    app = crear_app_benchmark(argumentos.base)
+    ajustes = {campo: getattr(argumentos, campo) for campo in ESCALAS['pequena'] if getattr(argumentos, campo)}
+    with app.app_context():
+        if db.session.query(Venta.id).first() is not None:
+            parser.error('La base de datos destino ya tiene ventas')
+        inicio = time.perf_counter()
+        parametros = generar_datos(argumentos.escala, argumentos.semilla, **ajustes)
+        print(f"Escala {argumentos.escala} {parametros} en {time.perf_counter() - inicio:.1f} s")
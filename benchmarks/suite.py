@@ -0,0 +1,234 @@
+"""
+Benchmark de punta a punta: genera una escala de datos sintéticos, recorre con el
+cliente de pruebas de Flask los flujos principales (cobro en el POS, búsquedas,
+listados, importación y facturación) y reporta throughput y latencias p50/p95/p99
+de cada escenario, comparados contra la línea base guardada.
+
+    python -m benchmarks.suite                       # escala pequeña, compara con linea_base.json
+    python -m benchmarks.suite --guardar             # actualiza la línea base
+    python -m benchmarks.suite --base sqlite:////tmp/tienda_grande.db --escala grande
+
+Con --base se usa una base ya generada (la suite registra ventas e importa proveedores en ella).
+Sale con código 1 si algún escenario empeora más que la tolerancia.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+LINEA_BASE = os.path.join(os.path.dirname(__file__), 'linea_base.json')
+
+# Variación permitida contra la línea base antes de marcar una regresión
+TOLERANCIA = 0.25
+
+PALABRAS_BUSQUEDA = ['arroz', 'leche', 'refresco', 'jabón', 'atún', 'papas', 'café', 'cloro', 'pan', 'frijol']
+
+
+def percentil(ordenadas, q):
+    return ordenadas[max(0, math.ceil(q * len(ordenadas)) - 1)]
+
+
+class Escenarios:
+    """Cada método `escenario_*` ejecuta una operación completa y falla si la respuesta no es válida"""
+
+    def __init__(self, cliente, parametros, semilla=1):
+        self.cliente = cliente
+        self.productos = parametros['productos']
+        self.ventas = parametros['ventas']
+        self.aleatorio = random.Random(semilla)
+        self.lote_importacion = 0
+
+    def _get(self, url):
+        respuesta = self.cliente.get(url)
+        assert respuesta.status_code == 200, f'{url}: {respuesta.status_code}'
+        return respuesta
+
+    def _post(self, url, **kwargs):
+        respuesta = self.cliente.post(url, **kwargs)
+        assert respuesta.status_code in (200, 302), f'{url}: {respuesta.status_code}'
+        return respuesta
+
+    def _producto(self):
+        return self.aleatorio.randint(1, self.productos)
+
+    def escenario_pos_cobro(self):
+        self._post('/pos/limpiar-carrito')
+        agregados = 0
+        while agregados < 3:
+            if self._post('/pos/agregar-carrito', data={'producto_id': self._producto(), 'cantidad': 1}).json['success']:
+                agregados += 1
+        datos = self._post('/pos/procesar-venta', data={'efectivo': 100000}).json
+        assert datos['success'], datos.get('message')
+
+    def escenario_pos_codigo_barras(self):
+        codigo = f'750{self._producto() - 1:010d}'
+        assert self._post('/pos/buscar-producto', data={'codigo': codigo}).json['success']
+
+    def escenario_busqueda_texto(self):
+        self._get(f'/api/productos/buscar?q={self.aleatorio.choice(PALABRAS_BUSQUEDA)}')
+
+    def escenario_catalogo_pos(self):
+        self._get('/api/pos/catalogo')
+
+    def escenario_listado_productos(self):
+        # Primera página de una categoría y las dos siguientes con el cursor
+        url = f"/api/productos?categoria={self.aleatorio.choice(['Abarrotes', 'Bebidas', 'Limpieza'])}"
+        cursor = ''
+        for _ in range(3):
+            cursor = self._get(url + (f'&cursor={cursor}' if cursor else '')).json['siguiente_cursor']
+            if not cursor:
+                break
+
+    def escenario_api_clientes(self):
+        self._get('/api/clientes')
+
+    def escenario_api_proveedores(self):
+        self._get('/api/proveedores')
+
+    def escenario_resumen_ventas(self):
+        self._get('/api/ventas/resumen')
+
+    def escenario_importacion_proveedores(self):
+        self.lote_importacion += 1
+        archivo = io.StringIO()
+        archivo.write('nombre,contacto,telefono,email,direccion\n')
+        for i in range(200):
+            archivo.write(f'Importado {self.lote_importacion}-{i},Contacto,5550000000,p{i}@correo.com,Calle {i}\n')
+        self._post('/proveedores/importar', data={
+            'archivo': (io.BytesIO(archivo.getvalue().encode('utf-8')), 'proveedores.csv')
+        }, content_type='multipart/form-data')
+
+    def escenario_ticket(self):
+        self._get(f'/pos/imprimir-ticket/{self.aleatorio.randint(1, self.ventas)}')
+
+    def escenario_facturacion(self):
+        # Descarga del XML: genera, timbra y guarda el CFDI la primera vez que se pide cada venta
+        self._get(f'/descargar-factura/{self.aleatorio.randint(1, self.ventas)}')
+
+
+# Repeticiones de cada escenario (la primera vuelta de calentamiento no se mide)
+REPETICIONES = {
+    'pos_cobro': 300,
+    'pos_codigo_barras': 2000,
+    'busqueda_texto': 1000,
+    'catalogo_pos': 100,
+    'listado_productos': 300,
+    'api_clientes': 300,
+    'api_proveedores': 300,
+    'resumen_ventas': 500,
+    'importacion_proveedores': 30,
+    'ticket': 500,
+    'facturacion': 200
+}
+
+
+def medir(escenarios, nombre, repeticiones):
+    operacion = getattr(escenarios, f'escenario_{nombre}')
+    operacion()
+    latencias = []
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        antes = time.perf_counter()
+        operacion()
+        latencias.append((time.perf_counter() - antes) * 1000)
+    duracion = time.perf_counter() - inicio
+    latencias.sort()
+    return {
+        'ops_s': round(repeticiones / duracion, 1),
+        'p50_ms': round(percentil(latencias, 0.5), 3),
+        'p95_ms': round(percentil(latencias, 0.95), 3),
+        'p99_ms': round(percentil(latencias, 0.99), 3)
+    }
+
+
+def comparar(resultados, linea_base, tolerancia):
+    """Imprime la tabla y devuelve los escenarios que empeoraron más que la tolerancia"""
+    regresiones = []
+    print(f"{'Escenario':<24} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}   {'vs. línea base'}")
+    for nombre, medicion in resultados.items():
+        base = linea_base.get(nombre)
+        comparacion = ''
+        if base:
+            cambio_ops = medicion['ops_s'] / base['ops_s'] - 1
+            cambio_p95 = medicion['p95_ms'] / base['p95_ms'] - 1
+            comparacion = f'ops {cambio_ops:+.0%}, p95 {cambio_p95:+.0%}'
+            if cambio_ops < -tolerancia or cambio_p95 > tolerancia:
+                regresiones.append(nombre)
+                comparacion += '  << REGRESIÓN'
+        print(f"{nombre:<24} {medicion['ops_s']:>9.1f} {medicion['p50_ms']:>8.2f} "
+              f"{medicion['p95_ms']:>8.2f} {medicion['p99_ms']:>8.2f}   {comparacion}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de punta a punta contra una línea base')
+    parser.add_argument('--escala', default='pequena', help='Escala de benchmarks.datos_sinteticos')
+    parser.add_argument('--base', help='URI de una base ya generada con benchmarks.datos_sinteticos')
+    parser.add_argument('--escenarios', help='Lista separada por comas; por defecto todos')
+    parser.add_argument('--factor', type=float, default=1.0, help='Multiplica las repeticiones de cada escenario')
+    parser.add_argument('--linea-base', default=LINEA_BASE)
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA)
+    parser.add_argument('--guardar', action='store_true', help='Guarda los resultados como nueva línea base')
+    argumentos = parser.parse_args()
+
+    nombres = argumentos.escenarios.split(',') if argumentos.escenarios else list(REPETICIONES)
+    uri = argumentos.base or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'suite.db')}"
+    os.environ['DATABASE_URL'] = uri
+
+    from benchmarks.comun import crear_app_benchmark
+    from benchmarks.datos_sinteticos import generar_datos
+    from models import db, Producto, Venta
+
+    if argumentos.base:
+        with crear_app_benchmark(uri).app_context():
+            parametros = {
+                'productos': db.session.query(db.func.max(Producto.id)).scalar(),
+                'ventas': db.session.query(db.func.max(Venta.id)).scalar()
+            }
+    else:
+        print(f'Generando escala {argumentos.escala}...')
+        with crear_app_benchmark(uri).app_context():
+            parametros = generar_datos(argumentos.escala)
+
+    # La aplicación se importa ya con los datos, como al arrancar en producción
+    from app import app
+    cliente = app.test_client()
+    escenarios = Escenarios(cliente, parametros)
+
+    resultados = {}
+    for nombre in nombres:
+        resultados[nombre] = medir(escenarios, nombre, max(1, int(REPETICIONES[nombre] * argumentos.factor)))
+
+    clave = argumentos.base and 'personalizada' or argumentos.escala
+    guardadas = {}
+    if os.path.exists(argumentos.linea_base):
+        with open(argumentos.linea_base, encoding='utf-8') as archivo:
+            guardadas = json.load(archivo)
+    linea_base = guardadas.get(clave, {}).get('escenarios', {})
+
+    print(f'\nEscala: {clave}, Python {platform.python_version()}')
+    regresiones = comparar(resultados, linea_base, argumentos.tolerancia)
+
+    if argumentos.guardar:
+        guardadas[clave] = {
+            'fecha': time.strftime('%Y-%m-%d'),
+            'python': platform.python_version(),
+            'maquina': platform.machine(),
+            'escenarios': dict(linea_base, **resultados)
+        }
+        with open(argumentos.linea_base, 'w', encoding='utf-8') as archivo:
+            json.dump(guardadas, archivo, indent=2, ensure_ascii=False, sort_keys=True)
+        print(f'Línea base guardada en {argumentos.linea_base}')
+    elif regresiones:
+        print(f"Regresiones: {', '.join(regresiones)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+from app import app, db
+
+def migrate_indices():
+    """Crea en bases de datos existentes los índices declarados en models.py"""
+    with app.app_context():
+        creados = 0
+        for tabla in db.metadata.sorted_tables:
+            for indice in tabla.indexes:
+                try:
+                    indice.create(db.engine, checkfirst=True)
+                    creados += 1
+                except Exception as e:
+                    print(f"⚠️ Error al crear el índice {indice.name}: {str(e)}")
+        
+        # Actualizar estadísticas para que el planificador de SQLite elija bien los índices
+        with db.engine.begin() as conexion:
+            conexion.exec_driver_sql('ANALYZE')
+        
+        print(f"✅ {creados} índices verificados exitosamente")
+
+if __name__ == '__main__':
+    migrate_indices()
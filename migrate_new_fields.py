@@ -15,6 +15,36 @@ def migrate_new_fields():
         except Exception as e:
             print(f"⚠️ Error en migración de productos: {str(e)}")
             
+        try:
+            # Versión del catálogo para la sincronización incremental del POS
+            db.engine.execute('ALTER TABLE productos ADD COLUMN fecha_actualizacion DATETIME')
+            db.engine.execute('UPDATE productos SET fecha_actualizacion = COALESCE(fecha_creacion, CURRENT_TIMESTAMP)')
+            db.engine.execute('CREATE INDEX IF NOT EXISTS ix_productos_fecha_actualizacion ON productos (fecha_actualizacion)')
+            
+            print("✅ Versión de catálogo de productos migrada exitosamente")
+            
+        except Exception as e:
+            print(f"⚠️ Error en migración de versión de catálogo: {str(e)}")
+            
+        try:
+            # Número de cambio por producto; los triggers se crean al iniciar la aplicación
+            db.engine.execute('ALTER TABLE productos ADD COLUMN version_catalogo INTEGER NOT NULL DEFAULT 0')
+            db.engine.execute('CREATE INDEX IF NOT EXISTS ix_productos_version_catalogo ON productos (version_catalogo)')
+            
+            print("✅ Número de cambio del catálogo migrado exitosamente")
+            
+        except Exception as e:
+            print(f"⚠️ Error en migración del número de cambio del catálogo: {str(e)}")
+            
+        try:
+            # Tasa de IVA por producto para el cálculo de impuestos de facturas y tickets
+            db.engine.execute('ALTER TABLE productos ADD COLUMN tasa_iva_sat VARCHAR(8) DEFAULT "0.160000"')
+            
+            print("✅ Tasa de IVA de productos migrada exitosamente")
+            
+        except Exception as e:
+            print(f"⚠️ Error en migración de tasa de IVA: {str(e)}")
+            
         try:
             # Agregar campos faltantes a proveedores
             db.engine.execute('ALTER TABLE proveedores ADD COLUMN razon_social VARCHAR(200)')
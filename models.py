@@ -1,10 +1,33 @@
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from datetime import datetime
 from decimal import Decimal
-db = SQLAlchemy()
+
+
+class SesionEnrutada(Session):
+    """
+    Sesión que manda las lecturas al bind 'lectura' cuando está marcada con
+    info['solo_lectura'] (ver utils.base_datos_utils.solo_lectura). Los flush y
+    las sentencias de escritura siempre usan el motor principal.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('solo_lectura') and not self._flushing \
+                and not getattr(clause, 'is_dml', False):
+            motor = self._db.engines.get('lectura')
+            if motor is not None:
+                return motor
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': SesionEnrutada})
 
 class Cliente(db.Model):
     __tablename__ = 'clientes'
+    __table_args__ = (
+        db.Index('ix_clientes_nombre_id', 'nombre', 'id'),
+        db.Index('ix_clientes_tipo_nombre_id', 'tipo_cliente', 'nombre', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
@@ -27,6 +50,9 @@ class Cliente(db.Model):
 
 class Proveedor(db.Model):
     __tablename__ = 'proveedores'
+    __table_args__ = (
+        db.Index('ix_proveedores_nombre_id', 'nombre', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
@@ -49,6 +75,15 @@ class Proveedor(db.Model):
 
 class Producto(db.Model):
     __tablename__ = 'productos'
+    __table_args__ = (
+        db.Index('ix_productos_nombre_id', 'nombre', 'id'),
+        db.Index('ix_productos_categoria_nombre_id', 'categoria', 'nombre', 'id'),
+        db.Index('ix_productos_proveedor_id', 'proveedor_id'),
+        db.Index('ix_productos_activo_id', 'activo', 'id'),
+        # Índices parciales para los filtros de stock bajo y sin stock del listado y el dashboard
+        db.Index('ix_productos_bajo_stock', 'nombre', 'id', sqlite_where=db.text('stock <= stock_minimo')),
+        db.Index('ix_productos_sin_stock', 'nombre', 'id', sqlite_where=db.text('stock = 0')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     codigo = db.Column(db.String(50), unique=True, nullable=True)  # Cambiado de codigo_barras a codigo
@@ -66,10 +101,15 @@ class Producto(db.Model):
     unidad_medida_sat = db.Column(db.String(20), default='H87')  # H87 = Pieza
     clave_unidad_sat = db.Column(db.String(3), default='E48')  # E48 = Servicio
     objeto_impuesto_sat = db.Column(db.String(2), default='02')  # 02 = Sí causa IVA
+    tasa_iva_sat = db.Column(db.String(8), default='0.160000')  # TasaOCuota: 0.160000, 0.080000, 0.000000 o Exento
     
     proveedor_id = db.Column(db.Integer, db.ForeignKey('proveedores.id'), nullable=False)
     imagen_url = db.Column(db.String(200), nullable=True)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    # Número de cambio para sincronizar el catálogo del POS; lo asigna un trigger en cada
+    # INSERT/UPDATE (incluido el stock), dentro de la transacción que escribe
+    version_catalogo = db.Column(db.Integer, nullable=False, default=0, index=True)
     activo = db.Column(db.Boolean, default=True)
     
     def __repr__(self):
@@ -81,6 +121,11 @@ class Producto(db.Model):
 
 class Venta(db.Model):
     __tablename__ = 'ventas'
+    __table_args__ = (
+        db.Index('ix_ventas_estado_fecha', 'estado', 'fecha_creacion'),
+        db.Index('ix_ventas_fecha_creacion', 'fecha_creacion'),
+        db.Index('ix_ventas_cliente_id', 'cliente_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     folio = db.Column(db.String(20), unique=True)
@@ -99,6 +144,10 @@ class Venta(db.Model):
 
 class DetalleVenta(db.Model):
     __tablename__ = 'detalles_venta'
+    __table_args__ = (
+        db.Index('ix_detalles_venta_venta_id', 'venta_id'),
+        db.Index('ix_detalles_venta_producto_id', 'producto_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     venta_id = db.Column(db.Integer, db.ForeignKey('ventas.id'), nullable=False)
@@ -112,8 +161,85 @@ class DetalleVenta(db.Model):
     def __repr__(self):
         return f'<DetalleVenta {self.id}>'
 
+# Resúmenes de ventas materializados; se mantienen en procesar_venta y cancelar_venta
+class ResumenVentasDiario(db.Model):
+    __tablename__ = 'resumen_ventas_diario'
+    
+    fecha = db.Column(db.Date, primary_key=True)  # fecha local de la venta
+    hora = db.Column(db.Integer, primary_key=True)  # 0-23, hora local de la venta
+    total_ventas = db.Column(db.Integer, nullable=False, default=0)
+    total_ingresos = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ResumenVentasDiario {self.fecha} {self.hora}h>'
+
+class ResumenVentasProducto(db.Model):
+    __tablename__ = 'resumen_ventas_producto'
+    
+    fecha = db.Column(db.Date, primary_key=True)
+    producto_id = db.Column(db.Integer, db.ForeignKey('productos.id'), primary_key=True)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+    importe = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    producto = db.relationship('Producto')
+    
+    def __repr__(self):
+        return f'<ResumenVentasProducto {self.fecha} {self.producto_id}>'
+
+# Último número entregado por serie de folios (VTA, REQ, COT, ...); ver utils.folios_utils
+class ContadorFolio(db.Model):
+    __tablename__ = 'contadores_folio'
+    
+    serie = db.Column(db.String(10), primary_key=True)
+    ultimo = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ContadorFolio {self.serie} {self.ultimo}>'
+
+# Carritos del POS guardados en el servidor, una fila por producto en cada caja
+class CarritoItem(db.Model):
+    __tablename__ = 'carrito_items'
+    __table_args__ = (
+        db.UniqueConstraint('caja_id', 'producto_id', name='uq_carrito_items_caja_producto'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    caja_id = db.Column(db.String(32), nullable=False)
+    producto_id = db.Column(db.Integer, db.ForeignKey('productos.id'), nullable=False)
+    nombre = db.Column(db.String(100), nullable=False)
+    precio = db.Column(db.Float, nullable=False)
+    cantidad = db.Column(db.Integer, nullable=False, default=1)
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CarritoItem {self.caja_id} {self.producto_id}>'
+
+class DocumentoCFDI(db.Model):
+    __tablename__ = 'documentos_cfdi'
+    __table_args__ = (
+        db.UniqueConstraint('venta_id', 'huella', name='uq_documentos_cfdi_venta_huella'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    venta_id = db.Column(db.Integer, db.ForeignKey('ventas.id'), nullable=False)
+    huella = db.Column(db.String(64), nullable=False)  # sha256 de los datos usados en el XML
+    xml = db.Column(db.Text, nullable=False)
+    uuid = db.Column(db.String(36))
+    fecha_timbrado = db.Column(db.String(19))
+    no_certificado_sat = db.Column(db.String(20))
+    qr_url = db.Column(db.String(255))
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    venta = db.relationship('Venta')
+    
+    def __repr__(self):
+        return f'<DocumentoCFDI {self.venta_id} {self.huella[:8]}>'
+
 class Devolucion(db.Model):
     __tablename__ = 'devoluciones'
+    __table_args__ = (
+        db.Index('ix_devoluciones_venta_id', 'venta_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     venta_id = db.Column(db.Integer, db.ForeignKey('ventas.id'), nullable=False)
@@ -129,6 +255,10 @@ class Devolucion(db.Model):
 
 class DetalleDevolucion(db.Model):
     __tablename__ = 'detalles_devolucion'
+    __table_args__ = (
+        db.Index('ix_detalles_devolucion_devolucion_id', 'devolucion_id'),
+        db.Index('ix_detalles_devolucion_producto_id', 'producto_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     devolucion_id = db.Column(db.Integer, db.ForeignKey('devoluciones.id'), nullable=False)
@@ -147,6 +277,10 @@ class DetalleDevolucion(db.Model):
 # Modelos para módulo de Compras
 class RequisicionCompra(db.Model):
     __tablename__ = 'requisiciones_compra'
+    __table_args__ = (
+        db.Index('ix_requisiciones_compra_estado_fecha', 'estado', 'fecha_creacion'),
+        db.Index('ix_requisiciones_compra_fecha_creacion', 'fecha_creacion'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     folio = db.Column(db.String(20), unique=True)
@@ -164,6 +298,10 @@ class RequisicionCompra(db.Model):
 
 class DetalleRequisicion(db.Model):
     __tablename__ = 'detalles_requisicion'
+    __table_args__ = (
+        db.Index('ix_detalles_requisicion_requisicion_id', 'requisicion_id'),
+        db.Index('ix_detalles_requisicion_producto_id', 'producto_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     requisicion_id = db.Column(db.Integer, db.ForeignKey('requisiciones_compra.id'), nullable=False)
@@ -180,6 +318,12 @@ class DetalleRequisicion(db.Model):
 
 class CotizacionCompra(db.Model):
     __tablename__ = 'cotizaciones_compra'
+    __table_args__ = (
+        db.Index('ix_cotizaciones_compra_estado_fecha', 'estado', 'fecha_creacion'),
+        db.Index('ix_cotizaciones_compra_fecha_creacion', 'fecha_creacion'),
+        db.Index('ix_cotizaciones_compra_requisicion_id', 'requisicion_id'),
+        db.Index('ix_cotizaciones_compra_proveedor_id', 'proveedor_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     folio = db.Column(db.String(20), unique=True)
@@ -201,6 +345,10 @@ class CotizacionCompra(db.Model):
 
 class DetalleCotizacionCompra(db.Model):
     __tablename__ = 'detalles_cotizacion_compra'
+    __table_args__ = (
+        db.Index('ix_detalles_cotizacion_compra_cotizacion_id', 'cotizacion_id'),
+        db.Index('ix_detalles_cotizacion_compra_producto_id', 'producto_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     cotizacion_id = db.Column(db.Integer, db.ForeignKey('cotizaciones_compra.id'), nullable=False)
@@ -217,6 +365,12 @@ class DetalleCotizacionCompra(db.Model):
 
 class OrdenCompra(db.Model):
     __tablename__ = 'ordenes_compra'
+    __table_args__ = (
+        db.Index('ix_ordenes_compra_estado_fecha', 'estado', 'fecha_creacion'),
+        db.Index('ix_ordenes_compra_fecha_creacion', 'fecha_creacion'),
+        db.Index('ix_ordenes_compra_cotizacion_id', 'cotizacion_id'),
+        db.Index('ix_ordenes_compra_proveedor_id', 'proveedor_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     folio = db.Column(db.String(20), unique=True)
@@ -238,6 +392,10 @@ class OrdenCompra(db.Model):
 
 class DetalleOrdenCompra(db.Model):
     __tablename__ = 'detalles_orden_compra'
+    __table_args__ = (
+        db.Index('ix_detalles_orden_compra_orden_compra_id', 'orden_compra_id'),
+        db.Index('ix_detalles_orden_compra_producto_id', 'producto_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     orden_compra_id = db.Column(db.Integer, db.ForeignKey('ordenes_compra.id'), nullable=False)
@@ -254,6 +412,12 @@ class DetalleOrdenCompra(db.Model):
 
 class FacturaCompra(db.Model):
     __tablename__ = 'facturas_compra'
+    __table_args__ = (
+        db.Index('ix_facturas_compra_estado_fecha', 'estado', 'fecha_creacion'),
+        db.Index('ix_facturas_compra_fecha_creacion', 'fecha_creacion'),
+        db.Index('ix_facturas_compra_orden_compra_id', 'orden_compra_id'),
+        db.Index('ix_facturas_compra_proveedor_id', 'proveedor_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     folio = db.Column(db.String(20), unique=True)
@@ -274,6 +438,10 @@ class FacturaCompra(db.Model):
 
 class DetalleFacturaCompra(db.Model):
     __tablename__ = 'detalles_factura_compra'
+    __table_args__ = (
+        db.Index('ix_detalles_factura_compra_factura_id', 'factura_id'),
+        db.Index('ix_detalles_factura_compra_producto_id', 'producto_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     factura_id = db.Column(db.Integer, db.ForeignKey('facturas_compra.id'), nullable=False)
@@ -291,6 +459,11 @@ class DetalleFacturaCompra(db.Model):
 # Modelos para módulo de Ventas Corporativas
 class CotizacionVenta(db.Model):
     __tablename__ = 'cotizaciones_venta'
+    __table_args__ = (
+        db.Index('ix_cotizaciones_venta_estado_fecha', 'estado', 'fecha_creacion'),
+        db.Index('ix_cotizaciones_venta_fecha_creacion', 'fecha_creacion'),
+        db.Index('ix_cotizaciones_venta_cliente_id', 'cliente_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     folio = db.Column(db.String(20), unique=True)
@@ -310,6 +483,10 @@ class CotizacionVenta(db.Model):
 
 class DetalleCotizacionVenta(db.Model):
     __tablename__ = 'detalles_cotizacion_venta'
+    __table_args__ = (
+        db.Index('ix_detalles_cotizacion_venta_cotizacion_id', 'cotizacion_id'),
+        db.Index('ix_detalles_cotizacion_venta_producto_id', 'producto_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     cotizacion_id = db.Column(db.Integer, db.ForeignKey('cotizaciones_venta.id'), nullable=False)
@@ -326,6 +503,12 @@ class DetalleCotizacionVenta(db.Model):
 
 class Remision(db.Model):
     __tablename__ = 'remisiones'
+    __table_args__ = (
+        db.Index('ix_remisiones_estado_fecha', 'estado', 'fecha_creacion'),
+        db.Index('ix_remisiones_fecha_creacion', 'fecha_creacion'),
+        db.Index('ix_remisiones_cotizacion_id', 'cotizacion_id'),
+        db.Index('ix_remisiones_cliente_id', 'cliente_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     folio = db.Column(db.String(20), unique=True)
@@ -346,6 +529,10 @@ class Remision(db.Model):
 
 class DetalleRemision(db.Model):
     __tablename__ = 'detalles_remision'
+    __table_args__ = (
+        db.Index('ix_detalles_remision_remision_id', 'remision_id'),
+        db.Index('ix_detalles_remision_producto_id', 'producto_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     remision_id = db.Column(db.Integer, db.ForeignKey('remisiones.id'), nullable=False)
@@ -362,6 +549,12 @@ class DetalleRemision(db.Model):
 
 class FacturaVenta(db.Model):
     __tablename__ = 'facturas_venta'
+    __table_args__ = (
+        db.Index('ix_facturas_venta_estado_fecha', 'estado', 'fecha_creacion'),
+        db.Index('ix_facturas_venta_fecha_creacion', 'fecha_creacion'),
+        db.Index('ix_facturas_venta_remision_id', 'remision_id'),
+        db.Index('ix_facturas_venta_cliente_id', 'cliente_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     folio = db.Column(db.String(20), unique=True)
@@ -382,6 +575,10 @@ class FacturaVenta(db.Model):
 
 class DetalleFacturaVenta(db.Model):
     __tablename__ = 'detalles_factura_venta'
+    __table_args__ = (
+        db.Index('ix_detalles_factura_venta_factura_id', 'factura_id'),
+        db.Index('ix_detalles_factura_venta_producto_id', 'producto_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     factura_id = db.Column(db.Integer, db.ForeignKey('facturas_venta.id'), nullable=False)
@@ -396,9 +593,30 @@ class DetalleFacturaVenta(db.Model):
     def __repr__(self):
         return f'<DetalleFacturaVenta {self.id}>'
 
+# Bitácora de cambios de estado de los documentos (ver utils.corporativo_utils.transicionar_documentos)
+class HistorialEstado(db.Model):
+    __tablename__ = 'historial_estados'
+    __table_args__ = (
+        db.Index('ix_historial_estados_documento', 'tipo_documento', 'documento_id', 'fecha'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo_documento = db.Column(db.String(30), nullable=False)  # requisicion, orden_compra, remision...
+    documento_id = db.Column(db.Integer, nullable=False)
+    estado_anterior = db.Column(db.String(30))
+    estado_nuevo = db.Column(db.String(30), nullable=False)
+    comentario = db.Column(db.Text)
+    fecha = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<HistorialEstado {self.tipo_documento} {self.documento_id}: {self.estado_nuevo}>'
+
 # Modelo para configuración del sistema
 class ConfiguracionSistema(db.Model):
     __tablename__ = 'configuracion_sistema'
+    __table_args__ = (
+        db.Index('ix_configuracion_sistema_categoria', 'categoria'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     clave = db.Column(db.String(50), unique=True, nullable=False)
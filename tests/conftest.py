@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# app.py lee la base de datos y el conteo de consultas al importarse; se fijan antes
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pruebas.db')}"
+os.environ['CONTAR_CONSULTAS'] = '1'
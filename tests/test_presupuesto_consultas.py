@@ -0,0 +1,64 @@
+"""
+Presupuesto de consultas de las vistas de documentos: cada ruta se pide con documentos
+de pocos y de muchos renglones; el conteo no debe pasar de PRESUPUESTO_CONSULTAS ni
+crecer con los renglones.
+"""
+import pytest
+from app import app
+from benchmarks.comun import sembrar_datos
+from models import db, Venta
+from utils.configuracion_utils import cache_configuracion
+from utils.consultas_utils import PRESUPUESTO_CONSULTAS, ContadorConsultas
+
+RENGLONES = (3, 60)
+
+RUTAS = {
+    'imprimir_ticket': '/pos/imprimir-ticket/1',
+    'descargar_factura': '/descargar-factura/1'
+}
+
+
+def _consultas_sin_opciones():
+    """Lo que cuesta recorrer una venta con la carga perezosa por defecto"""
+    with app.app_context(), ContadorConsultas() as contador:
+        venta = db.session.get(Venta, 1)
+        [(detalle.producto.nombre, venta.cliente) for detalle in venta.detalles]
+    return contador.total
+
+
+@pytest.fixture(scope='module')
+def conteos():
+    """Consultas de cada ruta y de la carga perezosa, por número de renglones"""
+    cliente = app.test_client()
+    resultado = {}
+    for renglones in RENGLONES:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            sembrar_datos(productos=500, clientes=20, ventas=4, documentos=20, lineas=renglones)
+            # La primera carga de la configuración no se cuenta como parte de ninguna ruta
+            cache_configuracion.cargar()
+        resultado.setdefault('carga_perezosa', []).append(_consultas_sin_opciones())
+        for endpoint, url in RUTAS.items():
+            respuesta = cliente.get(url)
+            # Una página que falla no muestra el documento: su conteo no probaría nada
+            assert respuesta.status_code == 200, (endpoint, respuesta.status_code)
+            resultado.setdefault(endpoint, []).append(int(respuesta.headers['X-Consultas']))
+    return resultado
+
+
+def test_todas_las_vistas_tienen_presupuesto():
+    assert set(RUTAS) == set(PRESUPUESTO_CONSULTAS)
+
+
+def test_los_datos_tienen_n_renglones(conteos):
+    # Sin opciones de carga cada renglón cuesta consultas: los datos sí prueban el N+1
+    pocos, muchos = conteos['carga_perezosa']
+    assert muchos > pocos
+
+
+@pytest.mark.parametrize('endpoint', sorted(RUTAS))
+def test_presupuesto_de_consultas(conteos, endpoint):
+    mediciones = conteos[endpoint]
+    assert max(mediciones) <= PRESUPUESTO_CONSULTAS[endpoint], mediciones
+    assert len(set(mediciones)) == 1, f'el conteo crece con los renglones: {mediciones}'
@@ -0,0 +1,197 @@
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, time, timedelta, timezone
+import pandas as pd
+from sqlalchemy import text
+from models import db
+from utils.pos_utils import obtener_version_catalogo
+from utils.resumen_ventas_utils import obtener_resumen_rango
+
+# Filas por bloque al leer de la base de datos; la memoria depende de este valor, no del rango
+TAMANO_BLOQUE_ANALITICA = 200000
+
+# Rangos de fechas distintos que se conservan en la cache
+MAXIMO_ANALISIS_EN_CACHE = 32
+
+DIAS_SEMANA = ['Domingo', 'Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado']
+
+SQL_DETALLES = """
+    SELECT d.producto_id, d.cantidad, d.subtotal
+    FROM detalles_venta d
+    JOIN ventas v ON v.id = d.venta_id
+    WHERE v.estado = 'completada' AND v.fecha_creacion >= :inicio AND v.fecha_creacion < :fin
+"""
+TIPOS_DETALLES = {'producto_id': 'int32', 'cantidad': 'int32', 'subtotal': 'float64'}
+
+# Día de la semana y hora locales, con la misma conversión que el resumen de ventas
+SQL_VENTAS = """
+    SELECT cliente_id, total,
+           CAST(strftime('%w', fecha_creacion, 'localtime') AS INTEGER) AS dia_semana,
+           CAST(strftime('%H', fecha_creacion, 'localtime') AS INTEGER) AS hora
+    FROM ventas
+    WHERE estado = 'completada' AND fecha_creacion >= :inicio AND fecha_creacion < :fin
+"""
+TIPOS_VENTAS = {'cliente_id': 'Int32', 'total': 'float64', 'dia_semana': 'int8', 'hora': 'int8'}
+
+SQL_PRODUCTOS = "SELECT id AS producto_id, nombre, categoria, precio_compra, precio_venta FROM productos"
+SQL_CLIENTES = "SELECT id AS cliente_id, nombre, apellido FROM clientes"
+
+COLUMNAS_PRODUCTOS = {
+    'producto_id': 'int32', 'nombre': 'object', 'categoria': 'category', 'cantidad': 'int64',
+    'importe': 'float64', 'precio_compra': 'float64', 'precio_venta': 'float64',
+    'margen_unitario': 'float64', 'margen': 'float64', 'margen_pct': 'float64'
+}
+COLUMNAS_CLIENTES = {'cliente_id': 'int32', 'nombre': 'object', 'apellido': 'object', 'ventas': 'int64', 'total': 'float64'}
+
+AnalisisVentas = namedtuple('AnalisisVentas', [
+    'productos', 'mapa_calor', 'clientes', 'total_ventas', 'total_ingresos', 'filas_leidas'
+])
+
+
+def _limite_utc(fecha):
+    """Inicio del día local `fecha` en UTC, en el formato de texto con que SQLite guarda fecha_creacion"""
+    local = datetime.combine(fecha, time.min).astimezone()
+    return local.astimezone(timezone.utc).replace(tzinfo=None).isoformat(' ')
+
+
+def _sumar(acumulado, parcial):
+    """Suma dos agregados indexados por la misma llave; los índices ausentes cuentan como 0"""
+    return parcial if acumulado is None else acumulado.add(parcial, fill_value=0)
+
+
+def _vacio(tipos):
+    """DataFrame sin filas con las columnas ya tipadas, para que nlargest y los joins funcionen igual"""
+    return pd.DataFrame({columna: pd.Series(dtype=tipo) for columna, tipo in tipos.items()})
+
+
+def _leer_en_bloques(conexion, sql, parametros, tipos):
+    return pd.read_sql_query(text(sql), conexion, params=parametros, chunksize=TAMANO_BLOQUE_ANALITICA, dtype=tipos)
+
+
+def calcular_analisis_ventas(fecha_inicio, fecha_fin):
+    """
+    Lee ventas y detalles del rango (inclusive) por bloques y agrega cada bloque con
+    group-bys de pandas; solo los agregados (uno por producto, cliente u hora)
+    permanecen en memoria entre bloques.
+    """
+    conexion = db.session.connection()
+    parametros = {'inicio': _limite_utc(fecha_inicio), 'fin': _limite_utc(fecha_fin + timedelta(days=1))}
+    filas_leidas = 0
+
+    por_producto = None
+    for bloque in _leer_en_bloques(conexion, SQL_DETALLES, parametros, TIPOS_DETALLES):
+        filas_leidas += len(bloque)
+        por_producto = _sumar(por_producto, bloque.groupby('producto_id', sort=False).agg(
+            cantidad=('cantidad', 'sum'), importe=('subtotal', 'sum')
+        ))
+
+    por_hora = por_cliente = None
+    for bloque in _leer_en_bloques(conexion, SQL_VENTAS, parametros, TIPOS_VENTAS):
+        filas_leidas += len(bloque)
+        por_hora = _sumar(por_hora, bloque.groupby(['dia_semana', 'hora'], sort=False).agg(
+            ventas=('total', 'size'), ingresos=('total', 'sum')
+        ))
+        por_cliente = _sumar(por_cliente, bloque.dropna(subset=['cliente_id']).groupby('cliente_id', sort=False).agg(
+            ventas=('total', 'size'), total=('total', 'sum')
+        ))
+
+    return AnalisisVentas(
+        productos=_margenes(conexion, por_producto),
+        mapa_calor=_mapa_calor(por_hora),
+        clientes=_clientes(conexion, por_cliente),
+        total_ventas=int(por_hora['ventas'].sum()) if por_hora is not None else 0,
+        total_ingresos=float(por_hora['ingresos'].sum()) if por_hora is not None else 0.0,
+        filas_leidas=filas_leidas
+    )
+
+
+def _margenes(conexion, por_producto):
+    """Une los agregados con el catálogo y calcula el margen unitario y el realizado"""
+    if por_producto is None:
+        return _vacio(COLUMNAS_PRODUCTOS)
+
+    catalogo = pd.read_sql_query(text(SQL_PRODUCTOS), conexion, dtype={
+        'producto_id': 'int32', 'precio_compra': 'float64', 'precio_venta': 'float64'
+    })
+    catalogo['categoria'] = catalogo['categoria'].astype('category')
+    productos = por_producto.astype({'cantidad': 'int64'}).join(catalogo.set_index('producto_id'), how='left')
+    productos['margen_unitario'] = productos['precio_venta'] - productos['precio_compra']
+    productos['margen'] = productos['importe'] - productos['cantidad'] * productos['precio_compra']
+    productos['margen_pct'] = (productos['margen'] / productos['importe'].where(productos['importe'] != 0)).fillna(0)
+    return productos.reset_index()[list(COLUMNAS_PRODUCTOS)]
+
+
+def _mapa_calor(por_hora):
+    """Matriz día de la semana x hora (0-23) con número de ventas e ingresos"""
+    indice = pd.MultiIndex.from_product([range(7), range(24)], names=['dia_semana', 'hora'])
+    if por_hora is None:
+        return pd.DataFrame({'ventas': 0, 'ingresos': 0.0}, index=indice)
+    return por_hora.reindex(indice, fill_value=0).astype({'ventas': 'int64'})
+
+
+def _clientes(conexion, por_cliente):
+    if por_cliente is None or por_cliente.empty:
+        return _vacio(COLUMNAS_CLIENTES)
+    nombres = pd.read_sql_query(text(SQL_CLIENTES), conexion, dtype={'cliente_id': 'int32'}).set_index('cliente_id')
+    clientes = por_cliente.astype({'ventas': 'int64'})
+    clientes.index = clientes.index.astype('int32')
+    return clientes.join(nombres, how='left').reset_index()[list(COLUMNAS_CLIENTES)]
+
+
+def top_productos(analisis, limite=20, por='importe'):
+    """Productos ordenados por 'importe', 'cantidad' o 'margen'"""
+    return analisis.productos.nlargest(limite, por)
+
+
+def top_clientes(analisis, limite=20):
+    return analisis.clientes.nlargest(limite, 'total')
+
+
+def matriz_mapa_calor(analisis, valor='ventas'):
+    """DataFrame de 7 filas (días) x 24 columnas (horas) con 'ventas' o 'ingresos'"""
+    matriz = analisis.mapa_calor[valor].unstack('hora')
+    matriz.index = DIAS_SEMANA
+    return matriz
+
+
+class CacheAnalitica:
+    """
+    Análisis por rango de fechas. Cada entrada guarda la huella con que se calculó
+    (totales del resumen de ventas del rango y versión del catálogo); si cambia,
+    el rango se recalcula.
+    """
+
+    def __init__(self, maximo=MAXIMO_ANALISIS_EN_CACHE):
+        self._lock = threading.Lock()
+        self._analisis = OrderedDict()
+        self.maximo = maximo
+
+    @staticmethod
+    def _huella(fecha_inicio, fecha_fin):
+        resumen = obtener_resumen_rango(fecha_inicio, fecha_fin)
+        version, _ = obtener_version_catalogo()
+        return int(resumen.total_ventas or 0), float(resumen.total_ingresos or 0), version
+
+    def obtener(self, fecha_inicio, fecha_fin):
+        clave = (fecha_inicio, fecha_fin)
+        huella = self._huella(fecha_inicio, fecha_fin)
+        with self._lock:
+            guardado = self._analisis.get(clave)
+            if guardado and guardado[0] == huella:
+                self._analisis.move_to_end(clave)
+                return guardado[1]
+
+        analisis = calcular_analisis_ventas(fecha_inicio, fecha_fin)
+        with self._lock:
+            self._analisis[clave] = (huella, analisis)
+            self._analisis.move_to_end(clave)
+            while len(self._analisis) > self.maximo:
+                self._analisis.popitem(last=False)
+        return analisis
+
+    def limpiar(self):
+        with self._lock:
+            self._analisis.clear()
+
+
+cache_analitica = CacheAnalitica()
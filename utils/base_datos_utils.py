@@ -0,0 +1,95 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from models import db
+
+# Nombre del bind de Flask-SQLAlchemy que agrupa las conexiones de solo lectura
+BIND_LECTURA = 'lectura'
+
+# Pragmas que se aplican a cada conexión nueva. journal_mode=WAL permite que los
+# reportes lean mientras una caja escribe; synchronous=NORMAL es seguro con WAL y
+# evita un fsync por cada venta.
+PRAGMAS_PRODUCCION = {
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,      # 64 MB (en KiB cuando es negativo)
+    'mmap_size': 268435456,    # 256 MB
+    'temp_store': 'MEMORY',
+    'busy_timeout': 15000      # milisegundos esperando el candado de escritura
+}
+
+OPCIONES_POOL_ESCRITURA = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_timeout': 30
+}
+
+OPCIONES_POOL_LECTURA = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30
+}
+
+
+def es_sqlite_en_archivo(uri):
+    """True para SQLite sobre archivo; las bases en memoria no admiten WAL ni varias conexiones"""
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def _aplicar_pragmas(pragmas):
+    def al_conectar(conexion_dbapi, registro_conexion):
+        cursor = conexion_dbapi.cursor()
+        for nombre, valor in pragmas.items():
+            cursor.execute(f'PRAGMA {nombre} = {valor}')
+        cursor.close()
+    return al_conectar
+
+
+def configurar_base_datos(app):
+    """
+    Perfil de producción para SQLite: opciones de pool y un bind de solo lectura
+    sobre la misma base de datos. Se llama antes de db.init_app(app); después de
+    init_app hay que llamar a registrar_pragmas(app). Otros motores no se modifican.
+    """
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if not es_sqlite_en_archivo(uri):
+        return False
+
+    conexion = {'connect_args': {'timeout': PRAGMAS_PRODUCCION['busy_timeout'] / 1000}}
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {}).update(OPCIONES_POOL_ESCRITURA, **conexion)
+    app.config.setdefault('SQLALCHEMY_BINDS', {})[BIND_LECTURA] = dict(
+        OPCIONES_POOL_LECTURA, url=uri, **conexion
+    )
+    return True
+
+
+def registrar_pragmas(app):
+    """Aplica los pragmas en cada conexión nueva; las de lectura además quedan en query_only"""
+    with app.app_context():
+        motores = db.engines
+        if BIND_LECTURA not in motores:
+            return
+
+        escritura = dict(PRAGMAS_PRODUCCION, journal_mode='WAL')
+        event.listen(motores[None], 'connect', _aplicar_pragmas(escritura))
+        event.listen(motores[BIND_LECTURA], 'connect', _aplicar_pragmas(dict(PRAGMAS_PRODUCCION, query_only='ON')))
+
+        # journal_mode=WAL queda guardado en el archivo; se fija ahora para que las
+        # conexiones de lectura ya lo encuentren activo
+        with motores[None].connect() as conexion:
+            conexion.exec_driver_sql('SELECT 1')
+
+
+@contextmanager
+def solo_lectura():
+    """
+    Envía las consultas de la sesión actual a las conexiones de solo lectura.
+    Se usa como bloque `with` o como decorador de rutas de reportes y listados.
+    """
+    sesion = db.session()
+    anterior = sesion.info.get('solo_lectura', False)
+    sesion.info['solo_lectura'] = True
+    try:
+        yield sesion
+    finally:
+        sesion.info['solo_lectura'] = anterior
@@ -0,0 +1,111 @@
+import re
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from models import Producto, db
+
+# Índice FTS5 de contenido externo: guarda solo los términos, los datos se leen de `productos`.
+# unicode61 con remove_diacritics hace que "azucar" encuentre "azúcar".
+SQL_CREAR_INDICE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS productos_fts USING fts5(
+        nombre, codigo, codigo_barras, descripcion,
+        content='productos', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_insertar AFTER INSERT ON productos BEGIN
+        INSERT INTO productos_fts(rowid, nombre, codigo, codigo_barras, descripcion)
+        VALUES (new.id, new.nombre, new.codigo, new.codigo_barras, new.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_eliminar AFTER DELETE ON productos BEGIN
+        INSERT INTO productos_fts(productos_fts, rowid, nombre, codigo, codigo_barras, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.codigo, old.codigo_barras, old.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_actualizar
+    AFTER UPDATE OF nombre, codigo, codigo_barras, descripcion ON productos BEGIN
+        INSERT INTO productos_fts(productos_fts, rowid, nombre, codigo, codigo_barras, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.codigo, old.codigo_barras, old.descripcion);
+        INSERT INTO productos_fts(rowid, nombre, codigo, codigo_barras, descripcion)
+        VALUES (new.id, new.nombre, new.codigo, new.codigo_barras, new.descripcion);
+    END
+    """
+]
+
+# Pesos de bm25 por columna: nombre, codigo, codigo_barras, descripcion
+SQL_BUSCAR = """
+    SELECT p.id, p.nombre, p.codigo, p.codigo_barras, p.precio_venta, p.stock
+    FROM productos_fts
+    JOIN productos p ON p.id = productos_fts.rowid
+    WHERE productos_fts MATCH :consulta
+    ORDER BY bm25(productos_fts, 10.0, 8.0, 8.0, 1.0)
+    LIMIT :limite
+"""
+
+_estado = {'disponible': False}
+
+
+def inicializar_indice_busqueda():
+    """
+    Crea el índice FTS5 y los triggers que lo sincronizan con `productos`.
+    Si el índice es nuevo se llena con los productos existentes. Sin FTS5
+    (u otro motor distinto a SQLite) la búsqueda cae en ILIKE.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        _estado['disponible'] = False
+        return False
+
+    try:
+        existia = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'productos_fts'"
+        )).first() is not None
+
+        for sql in SQL_CREAR_INDICE:
+            db.session.execute(text(sql))
+        if not existia:
+            db.session.execute(text("INSERT INTO productos_fts(productos_fts) VALUES ('rebuild')"))
+        db.session.commit()
+        _estado['disponible'] = True
+    except OperationalError:
+        db.session.rollback()
+        _estado['disponible'] = False
+
+    return _estado['disponible']
+
+
+def reconstruir_indice_busqueda():
+    """Vuelve a generar el índice completo a partir de la tabla de productos"""
+    if _estado['disponible']:
+        db.session.execute(text("INSERT INTO productos_fts(productos_fts) VALUES ('rebuild')"))
+        db.session.commit()
+
+
+def construir_consulta_fts(termino):
+    """Convierte el texto capturado en una consulta FTS5 de prefijos: 'azu 1k' -> '"azu"* "1k"*'"""
+    tokens = re.findall(r'\w+', termino or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def buscar_productos_texto(termino, limite=10):
+    """Busca productos por nombre, código, código de barras o descripción, ordenados por relevancia"""
+    consulta = construir_consulta_fts(termino)
+    if not consulta:
+        return []
+
+    if _estado['disponible']:
+        return db.session.execute(text(SQL_BUSCAR), {'consulta': consulta, 'limite': limite}).all()
+
+    return db.session.query(
+        Producto.id, Producto.nombre, Producto.codigo, Producto.codigo_barras,
+        Producto.precio_venta, Producto.stock
+    ).filter(
+        (Producto.nombre.ilike(f'%{termino}%')) |
+        (Producto.codigo.ilike(f'%{termino}%')) |
+        (Producto.codigo_barras.ilike(f'%{termino}%')) |
+        (Producto.descripcion.ilike(f'%{termino}%'))
+    ).limit(limite).all()
@@ -0,0 +1,157 @@
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from models import db, CarritoItem
+
+# Backend por defecto; 'memoria' es más rápido pero solo sirve con un único proceso
+BACKEND_CARRITO_DEFECTO = 'sqlite'
+
+# Un carrito sin cambios en estas horas se considera abandonado y se borra
+HORAS_CARRITO_ABANDONADO = 12
+
+
+def _item(producto_id, nombre, precio, cantidad):
+    """Renglón del carrito con la forma que esperan el POS y procesar_venta"""
+    return {
+        'producto_id': producto_id,
+        'nombre': nombre,
+        'precio': precio,
+        'cantidad': cantidad,
+        'subtotal': round(precio * cantidad, 2)
+    }
+
+
+class CarritoMemoria:
+    """Carritos en un diccionario del proceso, por caja y producto"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._carritos = {}
+        self._actividad = {}
+
+    def obtener(self, caja_id):
+        with self._lock:
+            return [dict(item) for item in self._carritos.get(caja_id, {}).values()]
+
+    def agregar(self, caja_id, producto_id, nombre, precio, cantidad):
+        with self._lock:
+            carrito = self._carritos.setdefault(caja_id, {})
+            self._actividad[caja_id] = datetime.utcnow()
+            anterior = carrito.get(producto_id)
+            total = cantidad + (anterior['cantidad'] if anterior else 0)
+            item = carrito[producto_id] = _item(producto_id, nombre, precio, total)
+            return dict(item)
+
+    def cantidad(self, caja_id, producto_id):
+        with self._lock:
+            item = self._carritos.get(caja_id, {}).get(producto_id)
+            return item['cantidad'] if item else 0
+
+    def actualizar(self, caja_id, producto_id, cantidad):
+        with self._lock:
+            carrito = self._carritos.get(caja_id, {})
+            item = carrito.get(producto_id)
+            if item is None:
+                return None
+            self._actividad[caja_id] = datetime.utcnow()
+            if cantidad <= 0:
+                del carrito[producto_id]
+                return None
+            item = carrito[producto_id] = _item(producto_id, item['nombre'], item['precio'], cantidad)
+            return dict(item)
+
+    def limpiar(self, caja_id):
+        with self._lock:
+            self._carritos.pop(caja_id, None)
+            self._actividad.pop(caja_id, None)
+
+    def depurar(self, limite):
+        with self._lock:
+            abandonadas = [caja_id for caja_id, fecha in self._actividad.items() if fecha < limite]
+            for caja_id in abandonadas:
+                self._carritos.pop(caja_id, None)
+                del self._actividad[caja_id]
+        return len(abandonadas)
+
+
+class CarritoSQLite:
+    """Carritos en la tabla carrito_items; los comparten todos los procesos de la aplicación"""
+
+    def obtener(self, caja_id):
+        return [
+            _item(fila.producto_id, fila.nombre, fila.precio, fila.cantidad)
+            for fila in db.session.query(
+                CarritoItem.producto_id, CarritoItem.nombre, CarritoItem.precio, CarritoItem.cantidad
+            ).filter(CarritoItem.caja_id == caja_id).order_by(CarritoItem.id)
+        ]
+
+    def agregar(self, caja_id, producto_id, nombre, precio, cantidad):
+        sentencia = insert(CarritoItem).values(
+            caja_id=caja_id, producto_id=producto_id, nombre=nombre, precio=precio,
+            cantidad=cantidad, fecha_actualizacion=datetime.utcnow()
+        )
+        sentencia = sentencia.on_conflict_do_update(
+            index_elements=['caja_id', 'producto_id'],
+            set_={
+                'cantidad': CarritoItem.cantidad + sentencia.excluded.cantidad,
+                'precio': sentencia.excluded.precio,
+                'fecha_actualizacion': sentencia.excluded.fecha_actualizacion
+            }
+        ).returning(CarritoItem.cantidad)
+        total = db.session.execute(sentencia).scalar_one()
+        db.session.commit()
+        return _item(producto_id, nombre, precio, total)
+
+    def cantidad(self, caja_id, producto_id):
+        return db.session.query(CarritoItem.cantidad).filter_by(
+            caja_id=caja_id, producto_id=producto_id
+        ).scalar() or 0
+
+    def actualizar(self, caja_id, producto_id, cantidad):
+        tabla = CarritoItem.__table__
+        condicion = (tabla.c.caja_id == caja_id) & (tabla.c.producto_id == producto_id)
+        if cantidad <= 0:
+            db.session.execute(tabla.delete().where(condicion))
+            db.session.commit()
+            return None
+
+        fila = db.session.execute(
+            tabla.update().where(condicion).values(
+                cantidad=cantidad, fecha_actualizacion=datetime.utcnow()
+            ).returning(tabla.c.nombre, tabla.c.precio)
+        ).first()
+        db.session.commit()
+        return _item(producto_id, fila.nombre, fila.precio, cantidad) if fila else None
+
+    def limpiar(self, caja_id):
+        db.session.query(CarritoItem).filter(CarritoItem.caja_id == caja_id).delete()
+        db.session.commit()
+
+    def depurar(self, limite):
+        """Borra los carritos completos cuyo último cambio es anterior a `limite`; devuelve cuántos"""
+        tabla = CarritoItem.__table__
+        abandonadas = select(tabla.c.caja_id).group_by(tabla.c.caja_id) \
+            .having(func.max(tabla.c.fecha_actualizacion) < limite)
+        cajas = db.session.execute(
+            tabla.delete().where(tabla.c.caja_id.in_(abandonadas)).returning(tabla.c.caja_id)
+        ).scalars().all()
+        db.session.commit()
+        return len(set(cajas))
+
+
+_backends = {
+    'memoria': CarritoMemoria(),
+    'sqlite': CarritoSQLite()
+}
+
+
+def almacen_carrito():
+    """Backend configurado en CARRITO_BACKEND ('sqlite' o 'memoria')"""
+    return _backends[current_app.config.get('CARRITO_BACKEND', BACKEND_CARRITO_DEFECTO)]
+
+
+def depurar_carritos(horas=HORAS_CARRITO_ABANDONADO):
+    """Borra los carritos abandonados del backend configurado (requiere contexto de aplicación)"""
+    return almacen_carrito().depurar(datetime.utcnow() - timedelta(hours=horas))
@@ -0,0 +1,71 @@
+import hashlib
+import json
+from sqlalchemy.exc import IntegrityError
+from models import db, DocumentoCFDI, DetalleVenta, Producto
+from facturacion_utils import generar_xml_cfdi, generar_qr_cfdi, generar_timbre_fiscal
+
+# Se incrementa cuando cambia la forma del XML, para no servir documentos con la forma anterior
+VERSION_PLANTILLA_CFDI = 3
+
+
+def huella_cfdi(folio, total, cliente, lineas, emisor_info):
+    """
+    sha256 de todos los datos que terminan en el XML de una venta. `lineas` son tuplas
+    (cantidad, precio_unitario, subtotal, codigo_barras, nombre, objeto_impuesto_sat,
+    tasa_iva_sat) en el orden de los detalles.
+    """
+    datos = [
+        VERSION_PLANTILLA_CFDI,
+        sorted(emisor_info.items()),
+        [folio, str(total)],
+        [cliente.rfc, cliente.razon_social, cliente.nombre, cliente.apellido,
+         cliente.codigo_postal, cliente.regimen_fiscal, cliente.uso_cfdi] if cliente else None,
+        [[cantidad, str(precio), str(subtotal), codigo_barras, nombre, objeto_impuesto, tasa_iva]
+         for cantidad, precio, subtotal, codigo_barras, nombre, objeto_impuesto, tasa_iva in lineas]
+    ]
+    return hashlib.sha256(json.dumps(datos, default=str).encode('utf-8')).hexdigest()
+
+
+def calcular_huella_cfdi(venta, cliente, emisor_info):
+    """
+    Huella de la venta con sus datos actuales. Si cambia la venta, el cliente,
+    sus productos o el emisor, cambia la huella y se genera un CFDI nuevo.
+    """
+    lineas = db.session.query(
+        DetalleVenta.cantidad, DetalleVenta.precio_unitario, DetalleVenta.subtotal,
+        Producto.codigo_barras, Producto.nombre, Producto.objeto_impuesto_sat, Producto.tasa_iva_sat
+    ).join(Producto, Producto.id == DetalleVenta.producto_id).filter(
+        DetalleVenta.venta_id == venta.id
+    ).order_by(DetalleVenta.id).all()
+    return huella_cfdi(venta.folio, venta.total, cliente, lineas, emisor_info)
+
+
+def obtener_cfdi_venta(venta, cliente, emisor_info):
+    """
+    Devuelve el DocumentoCFDI de la venta para sus datos actuales. Solo la primera
+    vez se arma el XML y se timbra; después se sirve lo guardado.
+    """
+    huella = calcular_huella_cfdi(venta, cliente, emisor_info)
+    documento = DocumentoCFDI.query.filter_by(venta_id=venta.id, huella=huella).first()
+    if documento:
+        return documento
+
+    xml_cfdi = generar_xml_cfdi(venta, cliente, emisor_info)
+    timbre = generar_timbre_fiscal(xml_cfdi)
+    documento = DocumentoCFDI(
+        venta_id=venta.id,
+        huella=huella,
+        xml=xml_cfdi,
+        qr_url=generar_qr_cfdi(xml_cfdi, emisor_info),
+        uuid=timbre['uuid'],
+        fecha_timbrado=timbre['fecha_timbrado'],
+        no_certificado_sat=timbre['no_certificado_sat']
+    )
+    db.session.add(documento)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Otra petición guardó el mismo documento primero; se usa el suyo
+        db.session.rollback()
+        documento = DocumentoCFDI.query.filter_by(venta_id=venta.id, huella=huella).one()
+    return documento
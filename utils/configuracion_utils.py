@@ -0,0 +1,160 @@
+import json
+import threading
+import time
+from sqlalchemy import cast, Integer
+from sqlalchemy.dialects.sqlite import insert
+from models import db, ConfiguracionSistema
+
+# Fila que cuenta los cambios de configuración; cada proceso la compara con la versión que cargó
+CLAVE_VERSION = 'version_configuracion'
+
+# Segundos entre verificaciones de la versión; es lo más que otro proceso tarda en ver un cambio
+INTERVALO_VERIFICACION = 5
+
+# Datos fiscales del emisor mientras no se capturen en Configuración > Facturación
+EMISOR_CFDI_DEFECTO = {
+    'rfc': 'ABC123456789',
+    'razon_social': 'Mi Tienda de Abarrotes SA de CV',
+    'regimen_fiscal': '601',
+    'codigo_postal': '01000'
+}
+
+
+def decodificar_valor(valor, tipo):
+    """Convierte el texto guardado al tipo declarado (string, integer, boolean, json)"""
+    if valor is None:
+        return None
+    try:
+        if tipo == 'integer':
+            return int(valor)
+        if tipo == 'boolean':
+            return str(valor).strip().lower() in ('true', '1', 'on', 'si', 'sí')
+        if tipo == 'json':
+            return json.loads(valor)
+    except (TypeError, ValueError):
+        pass
+    return valor
+
+
+def codificar_valor(valor, tipo):
+    """Inverso de decodificar_valor: el texto que se guarda en la columna valor"""
+    if valor is None:
+        return None
+    if tipo == 'boolean':
+        if isinstance(valor, str):
+            valor = decodificar_valor(valor, 'boolean')
+        return 'true' if valor else 'false'
+    if tipo == 'json':
+        return valor if isinstance(valor, str) else json.dumps(valor)
+    return str(valor)
+
+
+class CacheConfiguracion:
+    """
+    Copia en memoria de toda la tabla configuracion_sistema, con los valores ya
+    convertidos a su tipo. Se recarga cuando otro proceso incrementa la versión.
+    """
+
+    def __init__(self, intervalo=INTERVALO_VERIFICACION):
+        self._lock = threading.Lock()
+        self._valores = {}
+        self._categorias = {}
+        self._version = None
+        self._cargado = False
+        self._siguiente_verificacion = 0
+        self.intervalo = intervalo
+
+    def _leer_version(self):
+        return db.session.query(ConfiguracionSistema.valor).filter_by(clave=CLAVE_VERSION).scalar()
+
+    def cargar(self):
+        """Lee todas las filas de configuración (requiere contexto de aplicación)"""
+        valores = {}
+        categorias = {}
+        version = None
+        for clave, valor, tipo, categoria in db.session.query(
+            ConfiguracionSistema.clave, ConfiguracionSistema.valor,
+            ConfiguracionSistema.tipo, ConfiguracionSistema.categoria
+        ):
+            if clave == CLAVE_VERSION:
+                version = valor
+                continue
+            valores[clave] = decodificar_valor(valor, tipo)
+            categorias.setdefault(categoria, []).append(clave)
+
+        with self._lock:
+            self._valores = valores
+            self._categorias = categorias
+            self._version = version
+            self._cargado = True
+            self._siguiente_verificacion = time.monotonic() + self.intervalo
+
+    def _vigente(self):
+        """Recarga si nunca se cargó o si la versión en la base de datos cambió"""
+        if not self._cargado:
+            self.cargar()
+            return
+        if time.monotonic() < self._siguiente_verificacion:
+            return
+        if self._leer_version() != self._version:
+            self.cargar()
+        else:
+            self._siguiente_verificacion = time.monotonic() + self.intervalo
+
+    def obtener(self, clave, defecto=None):
+        self._vigente()
+        valor = self._valores.get(clave)
+        return defecto if valor in (None, '') else valor
+
+    def categoria(self, nombre):
+        """Diccionario {clave: valor} de una categoría (general, facturacion, apariencia...)"""
+        self._vigente()
+        with self._lock:
+            return {clave: self._valores[clave] for clave in self._categorias.get(nombre, [])}
+
+    def todas(self):
+        self._vigente()
+        with self._lock:
+            return dict(self._valores)
+
+    def guardar(self, valores, categoria, tipos=None):
+        """
+        Guarda varias claves con un solo upsert, incrementa la versión en la misma
+        transacción y recarga la copia local. `tipos` indica el tipo de cada clave
+        (string por defecto).
+        """
+        tipos = tipos or {}
+        sentencia = insert(ConfiguracionSistema)
+        db.session.execute(sentencia.on_conflict_do_update(
+            index_elements=['clave'],
+            set_={'valor': sentencia.excluded.valor}
+        ), [{
+            'clave': clave,
+            'valor': codificar_valor(valor, tipos.get(clave, 'string')),
+            'tipo': tipos.get(clave, 'string'),
+            'descripcion': f'Configuración de {clave}',
+            'categoria': categoria
+        } for clave, valor in valores.items()])
+
+        version = insert(ConfiguracionSistema).values(
+            clave=CLAVE_VERSION, valor='1', tipo='integer',
+            descripcion='Versión de la configuración', categoria='sistema'
+        )
+        db.session.execute(version.on_conflict_do_update(
+            index_elements=['clave'],
+            set_={'valor': cast(cast(ConfiguracionSistema.valor, Integer) + 1, db.String)}
+        ))
+        db.session.commit()
+        self.cargar()
+
+    def emisor_cfdi(self):
+        """Datos fiscales del emisor para los CFDI; los campos vacíos toman el valor por defecto"""
+        return {
+            'rfc': self.obtener('rfc_emisor', EMISOR_CFDI_DEFECTO['rfc']),
+            'razon_social': self.obtener('razon_social_emisor', EMISOR_CFDI_DEFECTO['razon_social']),
+            'regimen_fiscal': self.obtener('regimen_fiscal_emisor', EMISOR_CFDI_DEFECTO['regimen_fiscal']),
+            'codigo_postal': self.obtener('codigo_postal_emisor', EMISOR_CFDI_DEFECTO['codigo_postal'])
+        }
+
+
+cache_configuracion = CacheConfiguracion()
@@ -0,0 +1,122 @@
+import threading
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, selectinload
+from models import (
+    db, Venta, Devolucion, RequisicionCompra, CotizacionCompra, OrdenCompra, FacturaCompra,
+    CotizacionVenta, Remision, FacturaVenta
+)
+
+# Relaciones muchos-a-uno de cada documento que sus vistas muestran (se cargan con JOIN)
+PADRES_DOCUMENTO = {
+    Venta: ('cliente',),
+    Devolucion: ('venta',),
+    RequisicionCompra: (),
+    CotizacionCompra: ('proveedor', 'requisicion'),
+    OrdenCompra: ('proveedor', 'cotizacion'),
+    FacturaCompra: ('proveedor', 'orden_compra'),
+    CotizacionVenta: ('cliente',),
+    Remision: ('cliente', 'cotizacion'),
+    FacturaVenta: ('cliente', 'remision')
+}
+
+# Consultas máximas por endpoint; no deben crecer con el número de renglones del documento.
+# Incluyen una de margen para la verificación periódica de la versión de la configuración.
+PRESUPUESTO_CONSULTAS = {
+    'imprimir_ticket': 3,
+    'descargar_factura': 9
+}
+
+
+def opciones_documento(modelo, detalles=True):
+    """
+    Opciones de carga para un documento: sus padres con joinedload y, si se piden,
+    los detalles con selectinload junto con el producto de cada renglón.
+    """
+    opciones = [joinedload(getattr(modelo, padre)) for padre in PADRES_DOCUMENTO[modelo]]
+    if detalles:
+        detalle = modelo.detalles.property.mapper.class_
+        opciones.append(selectinload(modelo.detalles).joinedload(detalle.producto))
+    return opciones
+
+
+_activos = threading.local()
+
+
+def _contadores_activos():
+    if not hasattr(_activos, 'pila'):
+        _activos.pila = []
+    return _activos.pila
+
+
+class ContadorConsultas:
+    """
+    Cuenta las sentencias SQL que ejecuta el hilo actual mientras el bloque `with`
+    está abierto. Se pueden anidar; cada contador ve todas las sentencias de su bloque.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.sentencias = []
+
+    def registrar(self, sentencia):
+        self.total += 1
+        self.sentencias.append(sentencia)
+
+    def __enter__(self):
+        _contadores_activos().append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _contadores_activos().remove(self)
+        return False
+
+
+def _al_ejecutar(conexion, cursor, sentencia, parametros, contexto, executemany):
+    for contador in _contadores_activos():
+        contador.registrar(sentencia)
+
+
+def instalar_contador_consultas(motor):
+    """Engancha el conteo a un motor; instalarlo dos veces no cuenta doble"""
+    if not event.contains(motor, 'before_cursor_execute', _al_ejecutar):
+        event.listen(motor, 'before_cursor_execute', _al_ejecutar)
+
+
+def registrar_contador_consultas(app):
+    """
+    Con CONTAR_CONSULTAS activo, cuenta las consultas de cada petición, las devuelve
+    en la cabecera X-Consultas y avisa en el log si el endpoint pasa su presupuesto.
+    """
+    if not app.config.get('CONTAR_CONSULTAS'):
+        return
+
+    with app.app_context():
+        for motor in db.engines.values():
+            instalar_contador_consultas(motor)
+
+    @app.before_request
+    def _iniciar_conteo():
+        g.contador_consultas = ContadorConsultas().__enter__()
+
+    @app.after_request
+    def _reportar_conteo(respuesta):
+        contador = g.get('contador_consultas')
+        if contador is None:
+            return respuesta
+        respuesta.headers['X-Consultas'] = str(contador.total)
+
+        presupuesto = PRESUPUESTO_CONSULTAS.get(request.endpoint)
+        if presupuesto is not None and contador.total > presupuesto:
+            app.logger.warning(
+                'La ruta %s ejecutó %d consultas (presupuesto: %d)',
+                request.endpoint, contador.total, presupuesto
+            )
+        return respuesta
+
+    @app.teardown_request
+    def _terminar_conteo(exc):
+        # También se ejecuta si la vista falló, para no dejar el contador activo en el hilo
+        contador = g.pop('contador_consultas', None)
+        if contador is not None:
+            contador.__exit__(None, None, None)
@@ -1,51 +1,303 @@
-import random
-import string
+from collections import namedtuple
 from datetime import datetime
+from sqlalchemy import DateTime, Text, bindparam, case, func, insert, literal, select
+from models import (
+    db, Producto, Venta, HistorialEstado, RequisicionCompra, CotizacionCompra, OrdenCompra, FacturaCompra,
+    CotizacionVenta, Remision, FacturaVenta
+)
+from utils.folios_utils import asignador_folios
+
+# Documentos que se convierten o cambian de estado juntos por sentencia; acota el tamaño de los IN (...)
+TAMANO_BLOQUE_DOCUMENTOS = 500
+
+TIPOS_DOCUMENTO = {
+    'requisicion': RequisicionCompra,
+    'cotizacion_compra': CotizacionCompra,
+    'orden_compra': OrdenCompra,
+    'factura_compra': FacturaCompra,
+    'cotizacion_venta': CotizacionVenta,
+    'remision': Remision,
+    'factura_venta': FacturaVenta
+}
+
+# Estados de cada documento y a cuáles puede pasar; se compila una vez al importar
+FLUJOS_ESTADO = {
+    'venta': {
+        'completada': ['cancelada', 'devolucion'],
+        'cancelada': [],
+        'devolucion': []
+    },
+    'requisicion': {
+        'pendiente': ['aprobada', 'rechazada'],
+        'aprobada': ['convertida_cotizacion'],
+        'rechazada': []
+    },
+    'cotizacion_compra': {
+        'pendiente': ['aceptada', 'rechazada'],
+        'aceptada': ['convertida_orden'],
+        'rechazada': []
+    },
+    'orden_compra': {
+        'pendiente': ['parcial', 'completada', 'cancelada'],
+        'parcial': ['completada', 'cancelada'],
+        'completada': [],
+        'cancelada': []
+    },
+    'factura_compra': {
+        'pendiente': ['pagada', 'cancelada'],
+        'pagada': [],
+        'cancelada': []
+    },
+    'cotizacion_venta': {
+        'pendiente': ['aceptada', 'rechazada'],
+        'aceptada': [],
+        'rechazada': []
+    },
+    'remision': {
+        'pendiente': ['entregada', 'cancelada'],
+        'entregada': [],
+        'cancelada': []
+    },
+    'factura_venta': {
+        'pendiente': ['pagada', 'cancelada'],
+        'pagada': [],
+        'cancelada': []
+    }
+}
+
+MODELOS_CON_ESTADO = dict(TIPOS_DOCUMENTO, venta=Venta)
+
+
+def _compilar_flujos(flujos):
+    """Estado -> siguientes y, al revés, estado destino -> estados desde los que se llega"""
+    siguientes, origenes = {}, {}
+    for tipo, flujo in flujos.items():
+        siguientes[tipo] = {estado: tuple(destinos) for estado, destinos in flujo.items()}
+        for estado, destinos in flujo.items():
+            for destino in destinos:
+                origenes.setdefault(tipo, {}).setdefault(destino, []).append(estado)
+    return siguientes, {tipo: {destino: tuple(desde) for destino, desde in por_destino.items()}
+                        for tipo, por_destino in origenes.items()}
+
+_SIGUIENTES, _ORIGENES = _compilar_flujos(FLUJOS_ESTADO)
+
+# liga: columna del destino que apunta al origen; campos: columnas del encabezado que se
+# copian tal cual; estado_convertido: estado al que pasa el origen al convertirse (None si
+# no cambia); estados: estados del origen que permiten la conversión
+Conversion = namedtuple('Conversion', [
+    'tipo_origen', 'tipo_destino', 'origen', 'destino', 'liga', 'serie', 'estados', 'campos', 'estado_convertido'
+])
+
+
+def _conversion(tipo_origen, tipo_destino, liga, serie, campos=(), estado_convertido=None, estados=()):
+    """
+    Los estados que permiten la conversión salen de FLUJOS_ESTADO: los que llevan a
+    `estado_convertido`. Si el origen no cambia de estado se declaran y deben existir en su flujo.
+    """
+    if estado_convertido is not None:
+        estados = _ORIGENES[tipo_origen][estado_convertido]
+    elif not set(estados) <= set(_SIGUIENTES[tipo_origen]):
+        raise ValueError(f'Estados de {tipo_origen} fuera de su flujo: {estados}')
+    return Conversion(
+        tipo_origen, tipo_destino, TIPOS_DOCUMENTO[tipo_origen], TIPOS_DOCUMENTO[tipo_destino],
+        liga, serie, tuple(estados), tuple(campos), estado_convertido
+    )
+
+CONVERSIONES = {(conversion.tipo_origen, conversion.tipo_destino): conversion for conversion in (
+    _conversion('requisicion', 'cotizacion_compra', 'requisicion_id', 'COT',
+                estado_convertido='convertida_cotizacion'),
+    _conversion('cotizacion_compra', 'orden_compra', 'cotizacion_id', 'OC',
+                ('proveedor_id', 'condiciones_pago', 'observaciones'), estado_convertido='convertida_orden'),
+    _conversion('orden_compra', 'factura_compra', 'orden_compra_id', 'FACC', ('proveedor_id',),
+                estados=('parcial', 'completada')),
+    _conversion('cotizacion_venta', 'remision', 'cotizacion_id', 'REM', ('cliente_id', 'observaciones'),
+                estados=('aceptada',)),
+    _conversion('remision', 'factura_venta', 'remision_id', 'FAC', ('cliente_id',), estados=('entregada',))
+)}
+
+# Cambios que además mueven stock, resúmenes o crean documentos; se hacen con su operación
+# (cancelar_venta, devoluciones, convertir_documentos)
+TRANSICIONES_CON_EFECTOS = {('venta', 'cancelada'), ('venta', 'devolucion')} | {
+    (conversion.tipo_origen, conversion.estado_convertido)
+    for conversion in CONVERSIONES.values() if conversion.estado_convertido
+}
+
+DocumentoConvertido = namedtuple('DocumentoConvertido', ['origen_id', 'destino_id', 'folio'])
+
 
 def generar_folio(prefix):
-    """Genera un folio único con prefijo y fecha"""
-    fecha = datetime.now().strftime('%y%m%d')
-    random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-    return f"{prefix}-{fecha}-{random_str}"
+    """Genera el siguiente folio de la serie `prefix` (REQ, COT, COTV, OC, FACC, REM, FAC...)"""
+    return asignador_folios.siguiente(prefix)
+
+def tipo_de_documento(documento):
+    for tipo, modelo in TIPOS_DOCUMENTO.items():
+        if isinstance(documento, modelo):
+            return tipo
+    raise ValueError(f'{type(documento).__name__} no es un documento convertible')
+
+def _tabla_detalle(modelo):
+    """Tabla de renglones del documento y su columna que apunta al encabezado"""
+    relacion = modelo.detalles.property
+    return relacion.mapper.local_table, next(iter(relacion.remote_side))
+
+def _proveedor_unico(detalle, columna_padre, tabla_origen):
+    # Las requisiciones no guardan proveedor; se toma el de los productos si todos son del mismo
+    return select(
+        case((func.count(Producto.proveedor_id.distinct()) == 1, func.max(Producto.proveedor_id)), else_=None)
+    ).select_from(detalle.join(Producto.__table__, detalle.c.producto_id == Producto.id)) \
+        .where(columna_padre == tabla_origen.c.id).scalar_subquery()
+
+def convertir_documentos(tipo_origen, tipo_destino, ids, datos_adicionales=None, omitir_convertidos=True):
+    """
+    Convierte varios documentos en la transacción actual (no hace commit): inserta
+    los encabezados en bloque, copia los renglones con INSERT ... SELECT y calcula
+    los totales con un UPDATE. Si la conversión tiene estado_convertido, el origen
+    pasa a ese estado (con su bitácora) en la misma transacción. Los documentos que
+    no están en un estado convertible (o que ya tienen un documento destino, con
+    omitir_convertidos) se omiten.
+    Devuelve una lista de DocumentoConvertido ordenada por id de origen.
+    """
+    conversion = CONVERSIONES.get((tipo_origen, tipo_destino))
+    if conversion is None:
+        raise ValueError(f'No se puede convertir {tipo_origen} en {tipo_destino}')
+
+    ids = list(dict.fromkeys(int(documento_id) for documento_id in ids))
+    convertidos = []
+    for inicio in range(0, len(ids), TAMANO_BLOQUE_DOCUMENTOS):
+        convertidos.extend(_convertir_bloque(
+            conversion, ids[inicio:inicio + TAMANO_BLOQUE_DOCUMENTOS], datos_adicionales or {}, omitir_convertidos
+        ))
+    return convertidos
+
+def _convertir_bloque(conversion, ids, datos_adicionales, omitir_convertidos):
+    origen = conversion.origen.__table__
+    destino = conversion.destino.__table__
+    liga = destino.c[conversion.liga]
+    detalle_origen, padre_origen = _tabla_detalle(conversion.origen)
+    detalle_destino, padre_destino = _tabla_detalle(conversion.destino)
+
+    # Encabezados del origen que se pueden convertir, con los campos que se copian
+    columnas = [origen.c.id] + [origen.c[campo] for campo in conversion.campos]
+    if 'proveedor_id' in destino.c and 'proveedor_id' not in conversion.campos:
+        columnas.append(_proveedor_unico(detalle_origen, padre_origen, origen).label('proveedor_id'))
+    if conversion.estado_convertido:
+        # El UPDATE condicionado del origen reclama los documentos: uno que otra petición ya
+        # convirtió no está en un estado convertible y no regresa
+        ids = _transicionar(
+            conversion.tipo_origen, ids, conversion.estado_convertido, conversion.estados,
+            f'Convertido en {conversion.tipo_destino}'
+        )
+        if not ids:
+            return []
+        consulta = select(*columnas).where(origen.c.id.in_(ids))
+    else:
+        consulta = select(*columnas).where(origen.c.id.in_(ids), origen.c.estado.in_(conversion.estados))
+    if omitir_convertidos:
+        consulta = consulta.where(~select(destino.c.id).where(liga == origen.c.id).exists())
+    encabezados = db.session.execute(consulta.order_by(origen.c.id)).mappings().all()
+    if not encabezados:
+        return []
+
+    ahora = datetime.utcnow()
+    folios = asignador_folios.reservar(conversion.serie, len(encabezados))
+    filas = []
+    for folio, encabezado in zip(folios, encabezados):
+        fila = {campo: valor for campo, valor in encabezado.items() if campo != 'id'}
+        fila.update(datos_adicionales)
+        fila.update({
+            conversion.liga: encabezado['id'],
+            'folio': folio,
+            'fecha_creacion': ahora,
+            'estado': 'pendiente',
+            'total': 0.0
+        })
+        filas.append(fila)
+    nuevos = db.session.execute(
+        insert(destino).returning(liga, destino.c.id, destino.c.folio, sort_by_parameter_order=True), filas
+    ).all()
+    nuevos_ids = [destino_id for _, destino_id, _ in nuevos]
+
+    # Renglones: una sola sentencia copia los de todos los documentos del bloque
+    precio = func.coalesce(
+        detalle_origen.c.get('precio_unitario', detalle_origen.c.get('precio_estimado')), 0.0
+    )
+    db.session.execute(insert(detalle_destino).from_select(
+        [padre_destino.name, 'producto_id', 'descripcion', 'cantidad', 'precio_unitario', 'importe'],
+        select(
+            destino.c.id, detalle_origen.c.producto_id, detalle_origen.c.descripcion,
+            detalle_origen.c.cantidad, precio, detalle_origen.c.cantidad * precio
+        ).join_from(detalle_origen, destino, liga == padre_origen)
+        .where(destino.c.id.in_(bindparam('nuevos', expanding=True)))
+        .order_by(detalle_origen.c.id)
+    ), {'nuevos': nuevos_ids})
+
+    db.session.execute(destino.update().where(destino.c.id.in_(nuevos_ids)).values(
+        total=select(func.coalesce(func.sum(detalle_destino.c.importe), 0.0))
+        .where(padre_destino == destino.c.id).scalar_subquery()
+    ))
+    return [DocumentoConvertido(origen_id, destino_id, folio) for origen_id, destino_id, folio in nuevos]
 
 def convertir_documento(documento_actual, nuevo_tipo, datos_adicionales=None):
     """
-    Convierte un documento a otro tipo en el flujo secuencial
+    Convierte un documento al siguiente tipo del flujo y devuelve el documento
+    nuevo, o None si su estado no lo permite o ya se había convertido. No hace commit.
     """
-    # Esta función se implementará según el tipo de conversión
-    pass
+    convertidos = convertir_documentos(
+        tipo_de_documento(documento_actual), nuevo_tipo, [documento_actual.id], datos_adicionales
+    )
+    if not convertidos:
+        return None
+    return db.session.get(TIPOS_DOCUMENTO[nuevo_tipo], convertidos[0].destino_id)
 
 def obtener_estados_siguientes(tipo_documento, estado_actual):
     """
     Devuelve los estados posibles a los que puede avanzar un documento
     """
-    flujos = {
-        'requisicion': {
-            'pendiente': ['aprobada', 'rechazada'],
-            'aprobada': ['convertida_cotizacion'],
-            'rechazada': []
-        },
-        'cotizacion_compra': {
-            'pendiente': ['aceptada', 'rechazada'],
-            'aceptada': ['convertida_orden'],
-            'rechazada': []
-        },
-        # ... más flujos
-    }
-    
-    return flujos.get(tipo_documento, {}).get(estado_actual, [])
+    return list(_SIGUIENTES.get(tipo_documento, {}).get(estado_actual, ()))
+
+def transicionar_documentos(tipo_documento, ids, estado_nuevo, comentario=None):
+    """
+    Cambia a `estado_nuevo` los documentos de la lista que están en un estado desde el
+    que se permite la transición, en la transacción actual (no hace commit). Por bloque,
+    un INSERT ... SELECT registra la bitácora con el estado anterior y un UPDATE
+    condicionado al mismo estado hace el cambio. Devuelve los ids que cambiaron.
+    """
+    if tipo_documento not in MODELOS_CON_ESTADO:
+        raise ValueError(f'Tipo de documento desconocido: {tipo_documento}')
+    if (tipo_documento, estado_nuevo) in TRANSICIONES_CON_EFECTOS:
+        raise ValueError(f'{tipo_documento} -> {estado_nuevo} se hace con su propia operación')
+    desde = _ORIGENES[tipo_documento].get(estado_nuevo)
+    if not desde:
+        raise ValueError(f'Ningún {tipo_documento} puede pasar a {estado_nuevo}')
+    return _transicionar(tipo_documento, ids, estado_nuevo, desde, comentario)
+
+def _transicionar(tipo_documento, ids, estado_nuevo, desde, comentario):
+    tabla = MODELOS_CON_ESTADO[tipo_documento].__table__
+    historial = HistorialEstado.__table__
+    ids = list(dict.fromkeys(int(documento_id) for documento_id in ids))
+    ahora = datetime.utcnow()
+    cambiados = []
+    for inicio in range(0, len(ids), TAMANO_BLOQUE_DOCUMENTOS):
+        bloque = ids[inicio:inicio + TAMANO_BLOQUE_DOCUMENTOS]
+        condicion = (tabla.c.id.in_(bloque), tabla.c.estado.in_(desde))
+
+        # La bitácora va primero: en SQLite la escritura toma el candado de la base, así que
+        # ningún otro proceso puede cambiar los estados entre el INSERT y el UPDATE
+        db.session.execute(insert(historial).from_select(
+            ['tipo_documento', 'documento_id', 'estado_anterior', 'estado_nuevo', 'comentario', 'fecha'],
+            select(
+                literal(tipo_documento), tabla.c.id, tabla.c.estado, literal(estado_nuevo),
+                literal(comentario, type_=Text), literal(ahora, type_=DateTime)
+            ).where(*condicion)
+        ))
+        cambiados.extend(db.session.execute(
+            tabla.update().where(*condicion).values(estado=estado_nuevo).returning(tabla.c.id)
+        ).scalars())
+    return sorted(cambiados)
 
 def validar_conversion(tipo_origen, tipo_destino, estado_actual):
     """
     Valida si un documento puede convertirse a otro tipo
     """
-    conversiones_permitidas = {
-        'requisicion': ['cotizacion_compra'],
-        'cotizacion_compra': ['orden_compra'],
-        'orden_compra': ['factura_compra'],
-        'cotizacion_venta': ['remision'],
-        'remision': ['factura_venta']
-    }
-    
-    return (tipo_destino in conversiones_permitidas.get(tipo_origen, []) and 
-            estado_actual in ['aprobada', 'aceptada', 'entregada'])
\ No newline at end of file
+    conversion = CONVERSIONES.get((tipo_origen, tipo_destino))
+    return conversion is not None and estado_actual in conversion.estados
\ No newline at end of file
@@ -0,0 +1,148 @@
+import csv
+import io
+import tempfile
+from datetime import datetime, time, timedelta, timezone
+from openpyxl import Workbook
+from sqlalchemy import select
+from models import (
+    db, Producto, Cliente, Proveedor, Venta, RequisicionCompra, CotizacionCompra, OrdenCompra,
+    FacturaCompra, CotizacionVenta, Remision, FacturaVenta
+)
+from utils.base_datos_utils import BIND_LECTURA
+
+# Filas que se piden al cursor en cada vuelta; la memoria del export depende de este valor
+FILAS_POR_BLOQUE = 5000
+
+# Excel admite 1,048,576 filas por hoja; al llenarse una hoja se continúa en la siguiente
+FILAS_POR_HOJA = 1048575
+
+# Tamaño de los pedazos en que se envía el archivo XLSX ya generado
+TAMANO_PEDAZO = 64 * 1024
+
+# Listados exportables; los documentos también exportan sus renglones con ?detalles=1
+EXPORTACIONES = {
+    'productos': Producto,
+    'clientes': Cliente,
+    'proveedores': Proveedor,
+    'ventas': Venta,
+    'requisiciones': RequisicionCompra,
+    'cotizaciones_compra': CotizacionCompra,
+    'ordenes_compra': OrdenCompra,
+    'facturas_compra': FacturaCompra,
+    'cotizaciones_venta': CotizacionVenta,
+    'remisiones': Remision,
+    'facturas_venta': FacturaVenta
+}
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+
+def _inicio_del_dia_utc(fecha):
+    # Las fechas se guardan en UTC; los filtros son días locales
+    return datetime.combine(fecha, time()).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _columna_fecha(modelo):
+    tabla = modelo.__table__
+    return tabla.c.get('fecha_creacion', tabla.c.get('fecha_registro'))
+
+
+def consulta_exportacion(tipo, detalles=False, estado=None, desde=None, hasta=None):
+    """
+    SELECT de las columnas de la tabla en orden de id. Con detalles=True devuelve los
+    renglones del documento precedidos por su folio. Los filtros se aplican al encabezado.
+    """
+    modelo = EXPORTACIONES[tipo]
+    tabla = modelo.__table__
+
+    if detalles:
+        if not hasattr(modelo, 'detalles'):
+            raise ValueError(f'El listado {tipo} no tiene renglones')
+        detalle = modelo.detalles.property.mapper.local_table
+        consulta = select(tabla.c.folio.label('folio_documento'), *detalle.c) \
+            .join_from(detalle, tabla).order_by(detalle.c.id)
+    else:
+        consulta = select(*tabla.c).order_by(tabla.c.id)
+
+    if estado and 'estado' in tabla.c:
+        consulta = consulta.where(tabla.c.estado == estado)
+    fecha = _columna_fecha(modelo)
+    if desde and fecha is not None:
+        consulta = consulta.where(fecha >= _inicio_del_dia_utc(desde))
+    if hasta and fecha is not None:
+        consulta = consulta.where(fecha < _inicio_del_dia_utc(hasta + timedelta(days=1)))
+    return consulta
+
+
+def _bloques(motor, consulta):
+    """Encabezados y luego listas de filas leídas del cursor, sin cargar el resultado completo"""
+    with motor.connect() as conexion:
+        resultado = conexion.execution_options(stream_results=True, yield_per=FILAS_POR_BLOQUE).execute(consulta)
+        yield list(resultado.keys())
+        for filas in resultado.partitions():
+            yield filas
+
+
+def generar_csv(motor, consulta):
+    """Genera el CSV por bloques; el primer pedazo (BOM y encabezados) sale antes de leer filas"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    bloques = _bloques(motor, consulta)
+
+    buffer.write('\ufeff')  # para que Excel abra el archivo como UTF-8
+    escritor.writerow(next(bloques))
+    yield buffer.getvalue().encode('utf-8')
+    for filas in bloques:
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerows(filas)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def generar_xlsx(motor, consulta, titulo):
+    """
+    Escribe las filas en un libro write-only de openpyxl (las hojas se van guardando en
+    archivos temporales) y envía el XLSX por pedazos. Un XLSX es un zip con el índice al
+    final, así que el primer byte sale cuando terminan de escribirse las filas.
+    """
+    libro = Workbook(write_only=True)
+    bloques = _bloques(motor, consulta)
+    encabezados = next(bloques)
+
+    hoja = None
+    filas_hoja = FILAS_POR_HOJA
+    for filas in bloques:
+        for fila in filas:
+            if filas_hoja >= FILAS_POR_HOJA:
+                numero = len(libro.worksheets) + 1
+                hoja = libro.create_sheet(titulo[:31] if numero == 1 else f'{titulo[:25]} {numero}')
+                hoja.append(encabezados)
+                filas_hoja = 0
+            hoja.append(tuple(fila))
+            filas_hoja += 1
+    if hoja is None:
+        libro.create_sheet(titulo[:31]).append(encabezados)
+
+    with tempfile.TemporaryFile() as archivo:
+        libro.save(archivo)
+        archivo.seek(0)
+        while True:
+            pedazo = archivo.read(TAMANO_PEDAZO)
+            if not pedazo:
+                break
+            yield pedazo
+
+
+def exportar(tipo, formato, **filtros):
+    """
+    Devuelve el generador del archivo para Response. Lee de las conexiones de solo
+    lectura cuando existen, con una conexión propia que se cierra al terminar de enviar.
+    """
+    consulta = consulta_exportacion(tipo, **filtros)
+    motor = db.engines.get(BIND_LECTURA, db.engine)
+    if formato == 'csv':
+        return generar_csv(motor, consulta)
+    return generar_xlsx(motor, consulta, tipo)
@@ -0,0 +1,239 @@
+import os
+import threading
+import uuid
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta, timezone
+from models import db, Venta, Cliente, DetalleVenta, Producto, DocumentoCFDI
+from facturacion_utils import generar_xml_cfdi, generar_qr_cfdi, generar_timbre_fiscal
+from utils.cfdi_utils import huella_cfdi
+
+# Ventas que se leen, timbran y guardan juntas; acota la memoria y el tamaño de los IN (...)
+TAMANO_BLOQUE_LOTE = 500
+
+# Ventas que recibe cada proceso por envío
+VENTAS_POR_ENVIO = 25
+
+# Los lotes terminados se conservan (con su ZIP) este tiempo para consultarlos y descargarlos
+VIGENCIA_LOTE_TERMINADO = timedelta(hours=24)
+
+# Lotes terminados que se conservan como máximo; al pasar el límite se descartan los más viejos
+MAXIMO_LOTES_TERMINADOS = 50
+
+# Copias ligeras de los modelos con los atributos que usa generar_xml_cfdi; a diferencia de
+# los objetos del ORM se pueden enviar a otros procesos
+VentaLote = namedtuple('VentaLote', ['id', 'folio', 'total', 'detalles'])
+DetalleLote = namedtuple('DetalleLote', ['cantidad', 'precio_unitario', 'subtotal', 'producto'])
+ProductoLote = namedtuple('ProductoLote', ['codigo_barras', 'nombre', 'objeto_impuesto_sat', 'tasa_iva_sat'])
+ClienteLote = namedtuple('ClienteLote', [
+    'rfc', 'razon_social', 'nombre', 'apellido', 'codigo_postal', 'regimen_fiscal', 'uso_cfdi'
+])
+
+
+class LoteFacturacion:
+    """Estado y progreso de un trabajo de facturación masiva"""
+
+    def __init__(self, venta_ids, emisor_info, directorio):
+        self.id = uuid.uuid4().hex
+        self.venta_ids = venta_ids
+        self.emisor_info = emisor_info
+        self.archivo = os.path.join(directorio, f'facturas_{self.id}.zip')
+        self.estado = 'pendiente'  # pendiente, procesando, terminado, error
+        self.total = len(venta_ids)
+        self.procesadas = 0
+        self.generadas = 0
+        self.reutilizadas = 0
+        self.mensaje = None
+        self.fecha_inicio = datetime.now()
+        self.fecha_fin = None
+
+    def progreso(self):
+        return {
+            'id': self.id,
+            'estado': self.estado,
+            'total': self.total,
+            'procesadas': self.procesadas,
+            'generadas': self.generadas,
+            'reutilizadas': self.reutilizadas,
+            'porcentaje': round(self.procesadas * 100 / self.total, 1) if self.total else 100.0,
+            'mensaje': self.mensaje,
+            'fecha_inicio': self.fecha_inicio.isoformat(),
+            'fecha_fin': self.fecha_fin.isoformat() if self.fecha_fin else None
+        }
+
+
+_lotes = {}
+_lock_lotes = threading.Lock()
+
+
+def obtener_lote(lote_id):
+    with _lock_lotes:
+        return _lotes.get(lote_id)
+
+
+def _depurar_lotes(ahora=None):
+    """
+    Descarta los lotes terminados que pasaron su vigencia o que exceden el máximo (los
+    más viejos primero) y borra sus ZIP. Los lotes en proceso no se tocan. Se llama con
+    _lock_lotes tomado.
+    """
+    ahora = ahora or datetime.now()
+    terminados = sorted(
+        (lote for lote in _lotes.values() if lote.fecha_fin is not None), key=lambda lote: lote.fecha_fin
+    )
+    vencidos = [lote for lote in terminados if ahora - lote.fecha_fin > VIGENCIA_LOTE_TERMINADO]
+    vigentes = terminados[len(vencidos):]
+    sobrantes = vigentes[:max(0, len(vigentes) - MAXIMO_LOTES_TERMINADOS)]
+
+    for lote in vencidos + sobrantes:
+        del _lotes[lote.id]
+        try:
+            os.remove(lote.archivo)
+        except FileNotFoundError:
+            pass
+
+
+def seleccionar_ventas_para_facturar(fecha_inicio=None, fecha_fin=None, venta_ids=None):
+    """
+    Ids de las ventas completadas a facturar: las de la lista, o las del rango de
+    fechas locales (inclusive).
+    """
+    query = db.session.query(Venta.id).filter(Venta.estado == 'completada')
+    if venta_ids:
+        query = query.filter(Venta.id.in_(venta_ids))
+    if fecha_inicio:
+        query = query.filter(Venta.fecha_creacion >= _inicio_del_dia_utc(fecha_inicio))
+    if fecha_fin:
+        query = query.filter(Venta.fecha_creacion < _inicio_del_dia_utc(fecha_fin + timedelta(days=1)))
+    return [venta_id for venta_id, in query.order_by(Venta.id)]
+
+
+def _inicio_del_dia_utc(fecha):
+    """Inicio del día local `fecha` en UTC sin zona, como se guarda fecha_creacion"""
+    local = datetime.combine(fecha, time.min).astimezone()
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _precargar_ventas(venta_ids):
+    """Ventas, clientes, detalles y productos de un bloque en dos consultas"""
+    filas = db.session.query(
+        Venta.id, Venta.folio, Venta.total, Venta.cliente_id,
+        Cliente.rfc, Cliente.razon_social, Cliente.nombre, Cliente.apellido,
+        Cliente.codigo_postal, Cliente.regimen_fiscal, Cliente.uso_cfdi
+    ).outerjoin(Cliente, Cliente.id == Venta.cliente_id).filter(
+        Venta.id.in_(venta_ids)
+    ).order_by(Venta.id).all()
+
+    detalles = {}
+    for fila in db.session.query(
+        DetalleVenta.venta_id, DetalleVenta.cantidad, DetalleVenta.precio_unitario,
+        DetalleVenta.subtotal, Producto.codigo_barras, Producto.nombre,
+        Producto.objeto_impuesto_sat, Producto.tasa_iva_sat
+    ).join(Producto, Producto.id == DetalleVenta.producto_id).filter(
+        DetalleVenta.venta_id.in_(venta_ids)
+    ).order_by(DetalleVenta.venta_id, DetalleVenta.id):
+        detalles.setdefault(fila.venta_id, []).append(DetalleLote(
+            fila.cantidad, fila.precio_unitario, fila.subtotal,
+            ProductoLote(fila.codigo_barras, fila.nombre, fila.objeto_impuesto_sat, fila.tasa_iva_sat)
+        ))
+
+    ventas = []
+    for fila in filas:
+        cliente = ClienteLote(*fila[4:]) if fila.cliente_id else None
+        ventas.append((VentaLote(fila.id, fila.folio, fila.total, detalles.get(fila.id, [])), cliente))
+    return ventas
+
+
+def _generar_cfdi(argumentos):
+    """Arma y timbra un CFDI; se ejecuta en los procesos del pool"""
+    venta, cliente, emisor_info = argumentos
+    xml_cfdi = generar_xml_cfdi(venta, cliente, emisor_info)
+    return xml_cfdi, generar_qr_cfdi(xml_cfdi, emisor_info), generar_timbre_fiscal(xml_cfdi)
+
+
+def procesar_lote(lote, procesos=None):
+    """
+    Factura las ventas del lote por bloques: precarga cada bloque, reutiliza los CFDI ya
+    guardados con la misma huella, genera los faltantes en paralelo y va escribiendo el ZIP.
+    """
+    lote.estado = 'procesando'
+    try:
+        with ProcessPoolExecutor(max_workers=procesos) as pool, \
+                zipfile.ZipFile(lote.archivo, 'w', compression=zipfile.ZIP_DEFLATED) as archivo_zip:
+            for inicio in range(0, lote.total, TAMANO_BLOQUE_LOTE):
+                bloque = lote.venta_ids[inicio:inicio + TAMANO_BLOQUE_LOTE]
+                ventas = _precargar_ventas(bloque)
+
+                huellas = {
+                    venta.id: huella_cfdi(venta.folio, venta.total, cliente, [
+                        (d.cantidad, d.precio_unitario, d.subtotal) + tuple(d.producto)
+                        for d in venta.detalles
+                    ], lote.emisor_info)
+                    for venta, cliente in ventas
+                }
+                guardados = dict(db.session.query(DocumentoCFDI.venta_id, DocumentoCFDI.xml).filter(
+                    DocumentoCFDI.venta_id.in_(bloque),
+                    DocumentoCFDI.huella.in_(huellas.values())
+                ).all())
+
+                for venta, cliente in ventas:
+                    if venta.id in guardados:
+                        archivo_zip.writestr(f'factura_{venta.folio}.xml', guardados[venta.id])
+                        lote.reutilizadas += 1
+                        lote.procesadas += 1
+
+                pendientes = [(venta, cliente) for venta, cliente in ventas if venta.id not in guardados]
+                resultados = pool.map(_generar_cfdi, [
+                    (venta, cliente, lote.emisor_info) for venta, cliente in pendientes
+                ], chunksize=VENTAS_POR_ENVIO)
+
+                nuevos = []
+                for (venta, cliente), (xml_cfdi, qr_url, timbre) in zip(pendientes, resultados):
+                    archivo_zip.writestr(f'factura_{venta.folio}.xml', xml_cfdi)
+                    nuevos.append({
+                        'venta_id': venta.id,
+                        'huella': huellas[venta.id],
+                        'xml': xml_cfdi,
+                        'qr_url': qr_url,
+                        'uuid': timbre['uuid'],
+                        'fecha_timbrado': timbre['fecha_timbrado'],
+                        'no_certificado_sat': timbre['no_certificado_sat'],
+                        'fecha_creacion': datetime.utcnow()
+                    })
+                    lote.generadas += 1
+                    lote.procesadas += 1
+
+                if nuevos:
+                    db.session.execute(DocumentoCFDI.__table__.insert(), nuevos)
+                db.session.commit()
+
+        lote.estado = 'terminado'
+    except Exception as e:
+        db.session.rollback()
+        lote.estado = 'error'
+        lote.mensaje = str(e)
+    finally:
+        lote.fecha_fin = datetime.now()
+    return lote
+
+
+def iniciar_lote_facturacion(app, venta_ids, emisor_info, procesos=None):
+    """Registra el lote y lo procesa en un hilo en segundo plano; el progreso se consulta con obtener_lote"""
+    directorio = os.path.join(app.instance_path, 'lotes_cfdi')
+    os.makedirs(directorio, exist_ok=True)
+
+    lote = LoteFacturacion(venta_ids, emisor_info, directorio)
+    with _lock_lotes:
+        _depurar_lotes()
+        _lotes[lote.id] = lote
+
+    def ejecutar():
+        with app.app_context():
+            try:
+                procesar_lote(lote, procesos)
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=ejecutar, name=f'lote-cfdi-{lote.id[:8]}', daemon=True).start()
+    return lote
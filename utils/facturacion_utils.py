@@ -1,82 +1,133 @@
 import xml.etree.ElementTree as ET
 from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
 import uuid
+from utils.impuestos_utils import calcular_impuestos
+
+CFDI = '{http://www.sat.gob.mx/cfd/4}'
+
+# Receptor de las ventas sin cliente (público en general)
+RFC_PUBLICO_GENERAL = 'XAXX010101000'
+
+# Decimales del ValorUnitario; el Importe del concepto sigue redondeado al centavo
+DECIMALES_VALOR_UNITARIO = Decimal('0.000001')
+
+@lru_cache(maxsize=8)
+def _esqueleto_emisor(rfc, razon_social, regimen_fiscal, codigo_postal):
+    """
+    Partes constantes del comprobante para un emisor: atributos del Comprobante
+    (en su orden, con los variables en None) y el elemento Emisor ya construido.
+    """
+    atributos = {
+        'Version': '4.0',
+        'Serie': 'A',
+        'Folio': None,
+        'Fecha': None,
+        'FormaPago': '01',  # Efectivo
+        'Moneda': 'MXN',
+        'TipoCambio': '1',
+        'Total': None,
+        'SubTotal': None,
+        'MetodoPago': 'PUE',  # Pago en una sola exhibición
+        'LugarExpedicion': codigo_postal,
+        'Exportacion': '01'
+    }
+    emisor = ET.Element(f'{CFDI}Emisor', {
+        'Rfc': rfc,
+        'Nombre': razon_social,
+        'RegimenFiscal': regimen_fiscal
+    })
+    return atributos, emisor
+
+
+def esqueleto_emisor(emisor_info):
+    """Devuelve el esqueleto precompilado para la configuración del emisor"""
+    return _esqueleto_emisor(emisor_info['rfc'], emisor_info['razon_social'],
+                             emisor_info['regimen_fiscal'], emisor_info['codigo_postal'])
+
+
+def _atributos_traslado(traslado):
+    """Atributos de un nodo Traslado; los exentos no llevan TasaOCuota ni Importe"""
+    atributos = {'Base': str(traslado.base), 'Impuesto': traslado.impuesto, 'TipoFactor': traslado.tipo_factor}
+    if traslado.tasa_o_cuota is not None:
+        atributos['TasaOCuota'] = traslado.tasa_o_cuota
+        atributos['Importe'] = str(traslado.importe)
+    return atributos
+
 
 def generar_xml_cfdi(venta, cliente, emisor_info):
     """
     Genera el XML para CFDI 4.0
     emisor_info: diccionario con datos fiscales del emisor
     """
-    # Namespaces necesarios
-    namespaces = {
-        'cfdi': 'http://www.sat.gob.mx/cfd/4',
-        'xsi': 'http://www.w3.org/2001/XMLSchema-instance'
-    }
+    atributos, emisor = esqueleto_emisor(emisor_info)
+    detalles = list(venta.detalles)
     
-    # Crear elemento raíz
-    comprobante = ET.Element('{http://www.sat.gob.mx/cfd/4}Comprobante')
-    comprobante.set('Version', '4.0')
-    comprobante.set('Serie', 'A')
+    # Impuestos de todos los conceptos en una pasada, con importes exactos al centavo.
+    # Los precios del POS ya incluyen el IVA: se separa la base y el Total es venta.total
+    impuestos_documento = calcular_impuestos((
+        (detalle.subtotal, detalle.producto.objeto_impuesto_sat, detalle.producto.tasa_iva_sat)
+        for detalle in detalles
+    ), incluidos=True)
+    
+    # Crear elemento raíz a partir del esqueleto del emisor
+    comprobante = ET.Element(f'{CFDI}Comprobante', atributos)
     comprobante.set('Folio', venta.folio)
     comprobante.set('Fecha', datetime.now().isoformat()[:19])
-    comprobante.set('FormaPago', '01')  # Efectivo
-    comprobante.set('Moneda', 'MXN')
-    comprobante.set('TipoCambio', '1')
-    comprobante.set('Total', str(venta.total))
-    comprobante.set('SubTotal', str(venta.total))
-    comprobante.set('MetodoPago', 'PUE')  # Pago en una sola exhibición
-    comprobante.set('LugarExpedicion', emisor_info['codigo_postal'])
-    comprobante.set('Exportacion', '01')
+    comprobante.set('Total', str(impuestos_documento.total))
+    comprobante.set('SubTotal', str(impuestos_documento.subtotal))
     
-    # Emisor
-    emisor = ET.SubElement(comprobante, '{http://www.sat.gob.mx/cfd/4}Emisor')
-    emisor.set('Rfc', emisor_info['rfc'])
-    emisor.set('Nombre', emisor_info['razon_social'])
-    emisor.set('RegimenFiscal', emisor_info['regimen_fiscal'])
+    # Emisor (el mismo elemento sirve para todos los comprobantes del emisor)
+    comprobante.append(emisor)
     
     # Receptor
-    receptor = ET.SubElement(comprobante, '{http://www.sat.gob.mx/cfd/4}Receptor')
-    receptor.set('Rfc', cliente.rfc or 'XAXX010101000')
-    receptor.set('Nombre', cliente.razon_social or f'{cliente.nombre} {cliente.apellido}')
-    receptor.set('DomicilioFiscalReceptor', cliente.codigo_postal or '')
-    receptor.set('RegimenFiscalReceptor', cliente.regimen_fiscal or '')
-    receptor.set('UsoCFDI', cliente.uso_cfdi or 'G03')
+    receptor = ET.SubElement(comprobante, f'{CFDI}Receptor')
+    if cliente is None:
+        # Venta de mostrador: público en general, con el código postal del emisor
+        receptor.set('Rfc', RFC_PUBLICO_GENERAL)
+        receptor.set('Nombre', 'PUBLICO EN GENERAL')
+        receptor.set('DomicilioFiscalReceptor', emisor_info['codigo_postal'])
+        receptor.set('RegimenFiscalReceptor', '616')
+        receptor.set('UsoCFDI', 'S01')
+    else:
+        receptor.set('Rfc', cliente.rfc or RFC_PUBLICO_GENERAL)
+        receptor.set('Nombre', cliente.razon_social or f'{cliente.nombre} {cliente.apellido}')
+        receptor.set('DomicilioFiscalReceptor', cliente.codigo_postal or '')
+        receptor.set('RegimenFiscalReceptor', cliente.regimen_fiscal or '')
+        receptor.set('UsoCFDI', cliente.uso_cfdi or 'G03')
     
     # Conceptos
-    conceptos = ET.SubElement(comprobante, '{http://www.sat.gob.mx/cfd/4}Conceptos')
+    conceptos = ET.SubElement(comprobante, f'{CFDI}Conceptos')
     
-    for detalle in venta.detalles:
-        concepto = ET.SubElement(conceptos, '{http://www.sat.gob.mx/cfd/4}Concepto')
+    for detalle, impuestos_concepto in zip(detalles, impuestos_documento.conceptos):
+        concepto = ET.SubElement(conceptos, f'{CFDI}Concepto')
         concepto.set('ClaveProdServ', '01010101')  # Código genérico
         concepto.set('NoIdentificacion', detalle.producto.codigo_barras or '')
         concepto.set('Cantidad', str(detalle.cantidad))
         concepto.set('ClaveUnidad', 'H87')  # Pieza
         concepto.set('Unidad', 'Pieza')
         concepto.set('Descripcion', detalle.producto.nombre)
-        concepto.set('ValorUnitario', str(detalle.precio_unitario))
-        concepto.set('Importe', str(detalle.subtotal))
-        concepto.set('ObjetoImp', '01')  # No objeto de impuesto
+        valor_unitario = impuestos_concepto.base / Decimal(str(detalle.cantidad))
+        concepto.set('ValorUnitario', str(valor_unitario.quantize(DECIMALES_VALOR_UNITARIO)))
+        concepto.set('Importe', str(impuestos_concepto.base))
+        concepto.set('ObjetoImp', impuestos_concepto.objeto_impuesto)
         
-        # Impuestos del concepto
-        impuestos = ET.SubElement(concepto, '{http://www.sat.gob.mx/cfd/4}Impuestos')
-        traslados = ET.SubElement(impuestos, '{http://www.sat.gob.mx/cfd/4}Traslados')
-        traslado = ET.SubElement(traslados, '{http://www.sat.gob.mx/cfd/4}Traslado')
-        traslado.set('Base', str(detalle.subtotal))
-        traslado.set('Impuesto', '002')  # IVA
-        traslado.set('TipoFactor', 'Tasa')
-        traslado.set('TasaOCuota', '0.160000')
-        traslado.set('Importe', str(detalle.subtotal * 0.16))
-    
-    # Impuestos del comprobante
-    impuestos = ET.SubElement(comprobante, '{http://www.sat.gob.mx/cfd/4}Impuestos')
-    impuestos.set('TotalImpuestosTrasladados', str(venta.total * 0.16))
+        # Impuestos del concepto (solo si es objeto de impuesto con desglose)
+        if impuestos_concepto.traslado:
+            impuestos = ET.SubElement(concepto, f'{CFDI}Impuestos')
+            traslados = ET.SubElement(impuestos, f'{CFDI}Traslados')
+            ET.SubElement(traslados, f'{CFDI}Traslado', _atributos_traslado(impuestos_concepto.traslado))
     
-    traslados = ET.SubElement(impuestos, '{http://www.sat.gob.mx/cfd/4}Traslados')
-    traslado = ET.SubElement(traslados, '{http://www.sat.gob.mx/cfd/4}Traslado')
-    traslado.set('Impuesto', '002')
-    traslado.set('TipoFactor', 'Tasa')
-    traslado.set('TasaOCuota', '0.160000')
-    traslado.set('Importe', str(venta.total * 0.16))
+    # Impuestos del comprobante: suma de los conceptos por tasa
+    if impuestos_documento.traslados:
+        impuestos = ET.SubElement(comprobante, f'{CFDI}Impuestos')
+        if any(traslado.importe is not None for traslado in impuestos_documento.traslados):
+            impuestos.set('TotalImpuestosTrasladados', str(impuestos_documento.total_impuestos_trasladados))
+        
+        traslados = ET.SubElement(impuestos, f'{CFDI}Traslados')
+        for traslado in impuestos_documento.traslados:
+            ET.SubElement(traslados, f'{CFDI}Traslado', _atributos_traslado(traslado))
     
     # Convertir a XML
     xml_str = ET.tostring(comprobante, encoding='unicode')
@@ -89,4 +140,13 @@ def generar_xml_cfdi(venta, cliente, emisor_info):
 def generar_qr_cfdi(xml_str, emisor_info):
     """Genera el código QR para el CFDI (implementación básica)"""
     # En una implementación real, esto generaría un código QR con los datos del CFDI
-    return f"https://verificacfdi.facturaelectronica.sat.gob.mx/default.aspx?{uuid.uuid4()}"
\ No newline at end of file
+    return f"https://verificacfdi.facturaelectronica.sat.gob.mx/default.aspx?{uuid.uuid4()}"
+
+def generar_timbre_fiscal(xml_str):
+    """Genera los datos del timbre fiscal (simulado, sin PAC)"""
+    # En una implementación real, el PAC timbra el XML y devuelve estos datos
+    return {
+        'uuid': str(uuid.uuid4()).upper(),
+        'fecha_timbrado': datetime.now().isoformat()[:19],
+        'no_certificado_sat': '00001000000504465028'
+    }
\ No newline at end of file
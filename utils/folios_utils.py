@@ -0,0 +1,82 @@
+import os
+import threading
+from sqlalchemy.dialects.sqlite import insert
+from models import db, ContadorFolio
+from utils.base_datos_utils import es_sqlite_en_archivo
+
+# Folios que reserva cada proceso por serie. Con 1 el número se toma dentro de la
+# transacción del documento: si ésta se revierte, el número se libera y la serie
+# queda sin huecos. Con bloques, el contador solo se escribe una vez por bloque;
+# a cambio, los números que un proceso no llegue a usar quedan como huecos.
+TAMANO_BLOQUE_FOLIOS = {
+    'VTA': 50
+}
+
+DIGITOS_FOLIO = 8
+
+
+def formatear_folio(serie, numero):
+    return f"{serie}-{numero:0{DIGITOS_FOLIO}d}"
+
+
+def _reservar(conexion, serie, cantidad):
+    """Incrementa el contador de la serie en `cantidad` y devuelve el último número reservado"""
+    sentencia = insert(ContadorFolio).values(serie=serie, ultimo=cantidad)
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=['serie'],
+        set_={'ultimo': ContadorFolio.ultimo + sentencia.excluded.ultimo}
+    ).returning(ContadorFolio.ultimo)
+    return conexion.execute(sentencia).scalar_one()
+
+
+class AsignadorFolios:
+    """Entrega folios secuenciales por serie, reservando bloques del contador compartido"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloques = {}
+
+    def siguiente(self, serie):
+        """Devuelve el siguiente folio de la serie (requiere contexto de aplicación)"""
+        tamano = TAMANO_BLOQUE_FOLIOS.get(serie, 1)
+        motor = db.engine
+
+        # Una base SQLite en memoria comparte una sola conexión: no se puede reservar
+        # en una transacción aparte sin confirmar también la del documento
+        if tamano <= 1 or (motor.dialect.name == 'sqlite' and not es_sqlite_en_archivo(motor.url)):
+            return formatear_folio(serie, _reservar(db.session, serie, 1))
+
+        clave = (str(motor.url), serie)
+        with self._lock:
+            bloque = self._bloques.get(clave)
+            if not bloque or bloque[0] > bloque[1]:
+                # Transacción corta y propia: el contador queda libre aunque el documento tarde
+                with motor.begin() as conexion:
+                    ultimo = _reservar(conexion, serie, tamano)
+                bloque = self._bloques[clave] = [ultimo - tamano + 1, ultimo]
+            numero = bloque[0]
+            bloque[0] += 1
+        return formatear_folio(serie, numero)
+
+    def reservar(self, serie, cantidad):
+        """
+        Folios consecutivos para `cantidad` documentos con un solo incremento del
+        contador, dentro de la transacción actual (sin huecos si ésta se revierte)
+        """
+        if cantidad <= 0:
+            return []
+        ultimo = _reservar(db.session, serie, cantidad)
+        return [formatear_folio(serie, numero) for numero in range(ultimo - cantidad + 1, ultimo + 1)]
+
+    def descartar_bloques(self):
+        """Olvida los bloques reservados; se llama en el proceso hijo tras un fork"""
+        # En el hijo solo sobrevive el hilo que hizo el fork: el candado heredado pudo quedar tomado
+        self._lock = threading.Lock()
+        self._bloques = {}
+
+
+asignador_folios = AsignadorFolios()
+
+# Un proceso hijo (workers de gunicorn con --preload, multiprocessing) heredaría el bloque
+# del padre y entregaría los mismos folios; el hijo reserva su propio bloque
+os.register_at_fork(after_in_child=asignador_folios.descartar_bloques)
@@ -1,186 +1,384 @@
 import pandas as pd
 from models import Proveedor, Cliente, Producto, db
-from datetime import datetime
+from utils.indice_productos import indice_productos
+from utils.paginacion_utils import cache_conteos
+from utils.metricas_utils import metricas_dashboard
+from datetime import datetime, timedelta
 import io
+import os
+import tempfile
+import threading
+import uuid
 
-def importar_proveedores_desde_csv(archivo):
+# Filas que se leen, validan e insertan por transacción
+TAMANO_BLOQUE_IMPORTACION = 5000
+
+# Las importaciones terminadas se conservan este tiempo para consultar su resultado
+VIGENCIA_IMPORTACION_TERMINADA = timedelta(hours=1)
+
+# Errores que devuelve la consulta de progreso; el total se informa aparte
+MAXIMO_ERRORES_PROGRESO = 100
+
+
+class FilaDuplicada(Exception):
+    """Fila que ya existe en la base de datos o más arriba en el mismo archivo"""
+    pass
+
+
+def _texto(fila, campo, default=''):
+    """Devuelve el valor de una columna como texto sin espacios, o el default si viene vacío"""
+    valor = fila.get(campo)
+    if valor is None:
+        return default
+    valor = str(valor).strip()
+    return valor if valor else default
+
+
+def _booleano(fila, campo, default=True):
+    valor = _texto(fila, campo).lower()
+    if not valor:
+        return default
+    return valor in ('true', '1', 'si', 'sí', 'yes', 'verdadero')
+
+
+def _importar_en_bloques(archivo, tabla, preparar_fila, descartar_fila, progreso=None,
+                         tamano_bloque=TAMANO_BLOQUE_IMPORTACION):
     """
-    Importa proveedores desde un archivo CSV con campos fiscales
+    Lee el CSV por bloques, prepara cada fila con `preparar_fila` y la inserta
+    con un INSERT masivo por bloque, confirmando la transacción en cada uno. Si un
+    bloque se revierte, `descartar_fila(registro)` quita sus claves de los conjuntos
+    de duplicados para que un reintento con las mismas filas no se tome como duplicado.
+    `progreso(filas_leidas, registros_importados)` se llama al terminar cada bloque.
     """
-    try:
-        # Leer el archivo CSV
-        df = pd.read_csv(archivo)
+    columnas = set(tabla.c.keys())
+    importados = 0
+    filas_leidas = 0
+    errores = []
+    
+    lector = pd.read_csv(archivo, dtype=str, keep_default_na=False, chunksize=tamano_bloque)
+    
+    for bloque in lector:
+        registros = []
+        for index, row in zip(bloque.index, bloque.to_dict('records')):
+            try:
+                registro = preparar_fila(row)
+                registros.append({k: v for k, v in registro.items() if k in columnas})
+            except FilaDuplicada as e:
+                errores.append(f"Fila {index+1}: {str(e)}")
+            except Exception as e:
+                errores.append(f"Fila {index+1}: Error - {str(e)}")
         
-        proveedores_importados = 0
-        errores = []
+        filas_leidas += len(bloque)
         
-        for index, row in df.iterrows():
+        if registros:
             try:
-                # Verificar si el proveedor ya existe
-                existe = Proveedor.query.filter(
-                    (Proveedor.nombre == row['nombre']) | 
-                    (Proveedor.rfc == row.get('rfc', ''))
-                ).first()
-                
-                if existe:
-                    errores.append(f"Fila {index+1}: Proveedor '{row['nombre']}' ya existe")
-                    continue
-                
-                # Crear nuevo proveedor con campos fiscales
-                proveedor = Proveedor(
-                    nombre=row['nombre'],
-                    contacto=row.get('contacto', ''),
-                    telefono=row.get('telefono', ''),
-                    email=row.get('email', ''),
-                    direccion=row.get('direccion', ''),
-                    # Campos fiscales
-                    razon_social=row.get('razon_social', row['nombre']),
-                    rfc=row.get('rfc', ''),
-                    regimen_fiscal=row.get('regimen_fiscal', ''),
-                    codigo_postal=row.get('codigo_postal', ''),
-                    calle=row.get('calle', ''),
-                    numero_exterior=row.get('numero_exterior', ''),
-                    numero_interior=row.get('numero_interior', ''),
-                    colonia=row.get('colonia', ''),
-                    municipio=row.get('municipio', ''),
-                    estado=row.get('estado', ''),
-                    pais=row.get('pais', 'México'),
-                    fecha_creacion=datetime.utcnow()
-                )
-                
-                db.session.add(proveedor)
-                proveedores_importados += 1
-                
+                db.session.execute(tabla.insert(), registros)
+                db.session.commit()
+                importados += len(registros)
             except Exception as e:
-                errores.append(f"Fila {index+1}: Error - {str(e)}")
+                db.session.rollback()
+                for registro in registros:
+                    descartar_fila(registro)
+                errores.append(f"Filas {bloque.index[0]+1}-{bloque.index[-1]+1}: Error al guardar - {str(e)}")
+        
+        if progreso:
+            progreso(filas_leidas, importados)
+    
+    return importados, errores
+
+def importar_proveedores_desde_csv(archivo, progreso=None):
+    """
+    Importa proveedores desde un archivo CSV con campos fiscales
+    """
+    try:
+        # Precargar nombres y RFC existentes para detectar duplicados sin consultar por fila
+        nombres = set()
+        rfcs = set()
+        for nombre, rfc in db.session.query(Proveedor.nombre, Proveedor.rfc):
+            nombres.add(nombre)
+            if rfc:
+                rfcs.add(rfc)
+        
+        ahora = datetime.utcnow()
         
-        db.session.commit()
+        def preparar_fila(row):
+            nombre = _texto(row, 'nombre')
+            if not nombre:
+                raise ValueError("El nombre es obligatorio")
+            rfc = _texto(row, 'rfc')
+            
+            if nombre in nombres or (rfc and rfc in rfcs):
+                raise FilaDuplicada(f"Proveedor '{nombre}' ya existe")
+            nombres.add(nombre)
+            if rfc:
+                rfcs.add(rfc)
+            
+            return {
+                'nombre': nombre,
+                'contacto': _texto(row, 'contacto'),
+                'telefono': _texto(row, 'telefono'),
+                'email': _texto(row, 'email'),
+                'direccion': _texto(row, 'direccion'),
+                # Campos fiscales
+                'razon_social': _texto(row, 'razon_social', nombre),
+                'rfc': rfc,
+                'regimen_fiscal': _texto(row, 'regimen_fiscal'),
+                'codigo_postal': _texto(row, 'codigo_postal'),
+                'fecha_creacion': ahora
+            }
+        
+        def descartar_fila(registro):
+            nombres.discard(registro['nombre'])
+            rfcs.discard(registro['rfc'])
+        
+        proveedores_importados, errores = _importar_en_bloques(
+            archivo, Proveedor.__table__, preparar_fila, descartar_fila, progreso
+        )
+        if proveedores_importados:
+            cache_conteos.invalidar('proveedores')
+            metricas_dashboard.ajustar({'total_proveedores': proveedores_importados})
         return proveedores_importados, errores
         
     except Exception as e:
+        db.session.rollback()
         return 0, [f"Error al procesar el archivo: {str(e)}"]
 
-def importar_clientes_desde_csv(archivo):
+def importar_clientes_desde_csv(archivo, progreso=None):
     """
     Importa clientes desde un archivo CSV con campos fiscales
     """
     try:
-        # Leer el archivo CSV
-        df = pd.read_csv(archivo)
+        # Precargar email, teléfono y RFC existentes (por email, teléfono o RFC)
+        emails = set()
+        telefonos = set()
+        rfcs = set()
+        for email, telefono, rfc in db.session.query(Cliente.email, Cliente.telefono, Cliente.rfc):
+            if email:
+                emails.add(email)
+            if telefono:
+                telefonos.add(telefono)
+            if rfc:
+                rfcs.add(rfc)
         
-        clientes_importados = 0
-        errores = []
+        ahora = datetime.utcnow()
         
-        for index, row in df.iterrows():
-            try:
-                # Verificar si el cliente ya existe (por email, teléfono o RFC)
-                existe_email = Cliente.query.filter_by(email=row.get('email', '')).first() if row.get('email') else None
-                existe_telefono = Cliente.query.filter_by(telefono=row.get('telefono', '')).first() if row.get('telefono') else None
-                existe_rfc = Cliente.query.filter_by(rfc=row.get('rfc', '')).first() if row.get('rfc') else None
-                
-                if existe_email or existe_telefono or existe_rfc:
-                    errores.append(f"Fila {index+1}: Cliente con email, teléfono o RFC ya existe")
-                    continue
-                
-                # Crear nuevo cliente con campos fiscales
-                cliente = Cliente(
-                    nombre=row['nombre'],
-                    apellido=row.get('apellido', ''),
-                    telefono=row.get('telefono', ''),
-                    email=row.get('email', ''),
-                    direccion=row.get('direccion', ''),
-                    tipo_cliente=row.get('tipo_cliente', 'mostrador'),
-                    # Campos fiscales
-                    razon_social=row.get('razon_social', f"{row['nombre']} {row.get('apellido', '')}"),
-                    rfc=row.get('rfc', ''),
-                    regimen_fiscal=row.get('regimen_fiscal', ''),
-                    codigo_postal=row.get('codigo_postal', ''),
-                    calle=row.get('calle', ''),
-                    numero_exterior=row.get('numero_exterior', ''),
-                    numero_interior=row.get('numero_interior', ''),
-                    colonia=row.get('colonia', ''),
-                    municipio=row.get('municipio', ''),
-                    estado=row.get('estado', ''),
-                    pais=row.get('pais', 'México'),
-                    uso_cfdi=row.get('uso_cfdi', 'G03'),
-                    fecha_registro=datetime.utcnow()
-                )
-                
-                db.session.add(cliente)
-                clientes_importados += 1
-                
-            except Exception as e:
-                errores.append(f"Fila {index+1}: Error - {str(e)}")
+        def preparar_fila(row):
+            nombre = _texto(row, 'nombre')
+            if not nombre:
+                raise ValueError("El nombre es obligatorio")
+            email = _texto(row, 'email')
+            telefono = _texto(row, 'telefono')
+            rfc = _texto(row, 'rfc')
+            
+            if (email and email in emails) or (telefono and telefono in telefonos) or (rfc and rfc in rfcs):
+                raise FilaDuplicada("Cliente con email, teléfono o RFC ya existe")
+            if email:
+                emails.add(email)
+            if telefono:
+                telefonos.add(telefono)
+            if rfc:
+                rfcs.add(rfc)
+            
+            apellido = _texto(row, 'apellido')
+            return {
+                'nombre': nombre,
+                'apellido': apellido,
+                'telefono': telefono,
+                'email': email,
+                'direccion': _texto(row, 'direccion'),
+                'tipo_cliente': _texto(row, 'tipo_cliente', 'mostrador'),
+                # Campos fiscales
+                'razon_social': _texto(row, 'razon_social', f"{nombre} {apellido}".strip()),
+                'rfc': rfc,
+                'regimen_fiscal': _texto(row, 'regimen_fiscal'),
+                'codigo_postal': _texto(row, 'codigo_postal'),
+                'uso_cfdi': _texto(row, 'uso_cfdi', 'G03'),
+                'fecha_registro': ahora
+            }
         
-        db.session.commit()
+        def descartar_fila(registro):
+            emails.discard(registro['email'])
+            telefonos.discard(registro['telefono'])
+            rfcs.discard(registro['rfc'])
+        
+        clientes_importados, errores = _importar_en_bloques(
+            archivo, Cliente.__table__, preparar_fila, descartar_fila, progreso
+        )
+        if clientes_importados:
+            cache_conteos.invalidar('clientes')
+            metricas_dashboard.ajustar({'total_clientes': clientes_importados})
         return clientes_importados, errores
         
     except Exception as e:
+        db.session.rollback()
         return 0, [f"Error al procesar el archivo: {str(e)}"]
 
-def importar_productos_desde_csv(archivo):
+def importar_productos_desde_csv(archivo, progreso=None):
     """
     Importa productos desde un archivo CSV con campos fiscales
     """
     try:
-        # Leer el archivo CSV
-        df = pd.read_csv(archivo)
+        # Precargar códigos, códigos de barras, nombres y proveedores existentes
+        codigos = set()
+        codigos_barras = set()
+        nombres = set()
+        for codigo, codigo_barras, nombre in db.session.query(Producto.codigo, Producto.codigo_barras, Producto.nombre):
+            if codigo:
+                codigos.add(codigo)
+            if codigo_barras:
+                codigos_barras.add(codigo_barras)
+            nombres.add(nombre)
+        proveedores = {proveedor_id for (proveedor_id,) in db.session.query(Proveedor.id)}
         
-        productos_importados = 0
-        errores = []
+        ahora = datetime.utcnow()
         
-        for index, row in df.iterrows():
-            try:
-                # Verificar si el producto ya existe (por código, código_barras o nombre)
-                existe_codigo = Producto.query.filter_by(codigo=row.get('codigo', '')).first() if row.get('codigo') else None
-                existe_codigo_barras = Producto.query.filter_by(codigo_barras=row.get('codigo_barras', '')).first() if row.get('codigo_barras') else None
-                existe_nombre = Producto.query.filter_by(nombre=row['nombre']).first()
-                
-                if existe_codigo or existe_codigo_barras or existe_nombre:
-                    errores.append(f"Fila {index+1}: Producto con código, código de barras o nombre ya existe")
-                    continue
-                
-                # Verificar que el proveedor existe
-                proveedor_id = row.get('proveedor_id')
-                if proveedor_id:
-                    proveedor = Proveedor.query.get(int(proveedor_id))
-                    if not proveedor:
-                        errores.append(f"Fila {index+1}: Proveedor con ID {proveedor_id} no existe")
-                        continue
-                
-                # Crear nuevo producto con campos fiscales
-                producto = Producto(
-                    codigo=row.get('codigo', ''),
-                    codigo_barras=row.get('codigo_barras', ''),
-                    nombre=row['nombre'],
-                    descripcion=row.get('descripcion', ''),
-                    precio_compra=float(row['precio_compra']),
-                    precio_venta=float(row['precio_venta']),
-                    stock=int(row.get('stock', 0)),
-                    stock_minimo=int(row.get('stock_minimo', 5)),
-                    categoria=row.get('categoria', ''),
-                    # Campos fiscales
-                    clave_producto_sat=row.get('clave_producto_sat', ''),
-                    unidad_medida_sat=row.get('unidad_medida_sat', 'H87'),
-                    clave_unidad_sat=row.get('clave_unidad_sat', 'E48'),
-                    objeto_impuesto_sat=row.get('objeto_impuesto_sat', '02'),
-                    proveedor_id=int(row['proveedor_id']),
-                    fecha_creacion=datetime.utcnow(),
-                    activo=row.get('activo', True)
-                )
-                
-                db.session.add(producto)
-                productos_importados += 1
-                
-            except Exception as e:
-                errores.append(f"Fila {index+1}: Error - {str(e)}")
+        def preparar_fila(row):
+            nombre = _texto(row, 'nombre')
+            if not nombre:
+                raise ValueError("El nombre es obligatorio")
+            # Los códigos vacíos se guardan como NULL para no chocar con la restricción UNIQUE
+            codigo = _texto(row, 'codigo', None)
+            codigo_barras = _texto(row, 'codigo_barras', None)
+            
+            if (codigo and codigo in codigos) or (codigo_barras and codigo_barras in codigos_barras) or nombre in nombres:
+                raise FilaDuplicada("Producto con código, código de barras o nombre ya existe")
+            
+            # Verificar que el proveedor existe
+            proveedor_id = int(float(_texto(row, 'proveedor_id', '0')))
+            if proveedor_id not in proveedores:
+                raise ValueError(f"Proveedor con ID {proveedor_id} no existe")
+            
+            registro = {
+                'codigo': codigo,
+                'codigo_barras': codigo_barras,
+                'nombre': nombre,
+                'descripcion': _texto(row, 'descripcion'),
+                'precio_compra': float(row['precio_compra']),
+                'precio_venta': float(row['precio_venta']),
+                'stock': int(float(_texto(row, 'stock', '0'))),
+                'stock_minimo': int(float(_texto(row, 'stock_minimo', '5'))),
+                'categoria': _texto(row, 'categoria'),
+                # Campos fiscales
+                'clave_producto_sat': _texto(row, 'clave_producto_sat'),
+                'unidad_medida_sat': _texto(row, 'unidad_medida_sat', 'H87'),
+                'clave_unidad_sat': _texto(row, 'clave_unidad_sat', 'E48'),
+                'objeto_impuesto_sat': _texto(row, 'objeto_impuesto_sat', '02'),
+                'tasa_iva_sat': _texto(row, 'tasa_iva_sat', '0.160000'),
+                'proveedor_id': proveedor_id,
+                'fecha_creacion': ahora,
+                'activo': _booleano(row, 'activo')
+            }
+            
+            if codigo:
+                codigos.add(codigo)
+            if codigo_barras:
+                codigos_barras.add(codigo_barras)
+            nombres.add(nombre)
+            return registro
+        
+        def descartar_fila(registro):
+            codigos.discard(registro['codigo'])
+            codigos_barras.discard(registro['codigo_barras'])
+            nombres.discard(registro['nombre'])
         
-        db.session.commit()
+        productos_importados, errores = _importar_en_bloques(
+            archivo, Producto.__table__, preparar_fila, descartar_fila, progreso
+        )
+        if productos_importados:
+            indice_productos.invalidar()
+            cache_conteos.invalidar('productos')
+            metricas_dashboard.reconciliar()
         return productos_importados, errores
         
     except Exception as e:
+        db.session.rollback()
         return 0, [f"Error al procesar el archivo: {str(e)}"]
 
+IMPORTADORES = {
+    'proveedores': importar_proveedores_desde_csv,
+    'clientes': importar_clientes_desde_csv,
+    'productos': importar_productos_desde_csv
+}
+
+
+class ImportacionCSV:
+    """Estado y progreso de una importación en segundo plano"""
+
+    def __init__(self, tipo, archivo):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.archivo = archivo
+        self.estado = 'pendiente'  # pendiente, procesando, terminado, error
+        self.filas_leidas = 0
+        self.importados = 0
+        self.errores = []
+        self.fecha_inicio = datetime.now()
+        self.fecha_fin = None
+
+    def avanzar(self, filas_leidas, importados):
+        self.filas_leidas = filas_leidas
+        self.importados = importados
+
+    def progreso(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'estado': self.estado,
+            'filas_leidas': self.filas_leidas,
+            'importados': self.importados,
+            'total_errores': len(self.errores),
+            'errores': self.errores[:MAXIMO_ERRORES_PROGRESO],
+            'fecha_inicio': self.fecha_inicio.isoformat(),
+            'fecha_fin': self.fecha_fin.isoformat() if self.fecha_fin else None
+        }
+
+
+_importaciones = {}
+_lock_importaciones = threading.Lock()
+
+
+def obtener_importacion(importacion_id):
+    with _lock_importaciones:
+        return _importaciones.get(importacion_id)
+
+
+def iniciar_importacion(app, tipo, archivo):
+    """
+    Guarda el archivo subido en un temporal y lo importa en un hilo en segundo plano;
+    el avance de cada bloque se consulta con obtener_importacion.
+    """
+    directorio = os.path.join(app.instance_path, 'importaciones')
+    os.makedirs(directorio, exist_ok=True)
+    descriptor, ruta = tempfile.mkstemp(suffix='.csv', dir=directorio)
+    with os.fdopen(descriptor, 'wb') as destino:
+        archivo.save(destino)
+
+    importacion = ImportacionCSV(tipo, ruta)
+    with _lock_importaciones:
+        # Se olvidan las importaciones terminadas hace tiempo; su temporal ya se borró
+        limite = datetime.now() - VIGENCIA_IMPORTACION_TERMINADA
+        for vencida in [i for i in _importaciones.values() if i.fecha_fin and i.fecha_fin < limite]:
+            del _importaciones[vencida.id]
+        _importaciones[importacion.id] = importacion
+
+    def ejecutar():
+        importacion.estado = 'procesando'
+        with app.app_context():
+            try:
+                importacion.importados, importacion.errores = IMPORTADORES[tipo](ruta, progreso=importacion.avanzar)
+                importacion.estado = 'terminado'
+            except Exception as e:
+                importacion.estado = 'error'
+                importacion.errores = [str(e)]
+            finally:
+                importacion.fecha_fin = datetime.now()
+                db.session.remove()
+                os.remove(ruta)
+
+    threading.Thread(target=ejecutar, name=f'importacion-{importacion.id[:8]}', daemon=True).start()
+    return importacion
+
+
 def generar_ejemplo_csv(tipo):
     """
     Genera un ejemplo de CSV según el tipo con campos fiscales
@@ -242,7 +440,8 @@ def generar_ejemplo_csv(tipo):
             'clave_producto_sat': ['01010101', '01010102'],
             'unidad_medida_sat': ['H87', 'H87'],
             'clave_unidad_sat': ['E48', 'E48'],
-            'objeto_impuesto_sat': ['02', '02']
+            'objeto_impuesto_sat': ['02', '02'],
+            'tasa_iva_sat': ['0.000000', '0.160000']
         }
     else:
         return None
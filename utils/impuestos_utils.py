@@ -0,0 +1,109 @@
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+
+CENTAVO = Decimal('0.01')
+
+IMPUESTO_IVA = '002'
+TASA_IVA_GENERAL = '0.160000'
+TASA_IVA_EXENTO = 'Exento'
+
+# Tasas de IVA admitidas (valor TasaOCuota del SAT); Exento no lleva tasa ni importe
+TASAS_IVA = ('0.160000', '0.080000', '0.000000', TASA_IVA_EXENTO)
+
+# Únicamente el objeto de impuesto 02 ("sí objeto de impuesto") desglosa traslados
+OBJETO_IMPUESTO_DESGLOSADO = '02'
+
+Traslado = namedtuple('Traslado', ['base', 'impuesto', 'tipo_factor', 'tasa_o_cuota', 'importe'])
+ImpuestosConcepto = namedtuple('ImpuestosConcepto', ['objeto_impuesto', 'base', 'traslado'])
+ImpuestosDocumento = namedtuple('ImpuestosDocumento', [
+    'conceptos', 'traslados', 'subtotal', 'total_impuestos_trasladados', 'total'
+])
+
+
+def _a_decimal(valor):
+    if isinstance(valor, Decimal):
+        return valor
+    return Decimal(str(valor))
+
+
+def calcular_impuestos(lineas, incluidos=False):
+    """
+    Calcula en una pasada los traslados de IVA de todas las líneas de un documento.
+
+    `lineas` son tuplas (importe, objeto_impuesto, tasa_iva). Cada importe de concepto
+    se redondea al centavo y los traslados del documento son la suma de los de sus
+    conceptos agrupados por tasa, como pide el SAT.
+
+    Con incluidos=False el importe de la línea es la base y el IVA se suma. Con
+    incluidos=True el importe ya trae el IVA, como los precios del POS: se separa la
+    base y el total no cambia.
+    """
+    factores = {}
+    conceptos = []
+    traslados = {}
+    subtotal = Decimal('0')
+    total_trasladado = Decimal('0')
+
+    for importe, objeto_impuesto, tasa in lineas:
+        importe = _a_decimal(importe).quantize(CENTAVO, ROUND_HALF_UP)
+        objeto_impuesto = objeto_impuesto or OBJETO_IMPUESTO_DESGLOSADO
+        tasa = tasa or TASA_IVA_GENERAL
+
+        if objeto_impuesto != OBJETO_IMPUESTO_DESGLOSADO:
+            conceptos.append(ImpuestosConcepto(objeto_impuesto, importe, None))
+            subtotal += importe
+            continue
+
+        if tasa == TASA_IVA_EXENTO:
+            traslado = Traslado(importe, IMPUESTO_IVA, 'Exento', None, None)
+            base = importe
+        else:
+            factor = factores.get(tasa)
+            if factor is None:
+                if tasa not in TASAS_IVA:
+                    raise ValueError(f'Tasa de IVA no válida: {tasa}')
+                factor = factores[tasa] = Decimal(tasa)
+
+            if incluidos:
+                base = (importe / (1 + factor)).quantize(CENTAVO, ROUND_HALF_UP)
+                impuesto = importe - base
+            else:
+                base = importe
+                impuesto = (base * factor).quantize(CENTAVO, ROUND_HALF_UP)
+            traslado = Traslado(base, IMPUESTO_IVA, 'Tasa', tasa, impuesto)
+            total_trasladado += impuesto
+
+        conceptos.append(ImpuestosConcepto(objeto_impuesto, base, traslado))
+        subtotal += base
+
+        clave = (traslado.impuesto, traslado.tipo_factor, traslado.tasa_o_cuota)
+        acumulado = traslados.get(clave)
+        if acumulado is None:
+            traslados[clave] = [traslado.base, traslado.importe]
+        else:
+            acumulado[0] += traslado.base
+            if traslado.importe is not None:
+                acumulado[1] += traslado.importe
+
+    return ImpuestosDocumento(
+        conceptos=conceptos,
+        traslados=[
+            Traslado(base, impuesto, tipo_factor, tasa, importe)
+            for (impuesto, tipo_factor, tasa), (base, importe) in traslados.items()
+        ],
+        subtotal=subtotal,
+        total_impuestos_trasladados=total_trasladado,
+        total=subtotal + total_trasladado
+    )
+
+
+def calcular_impuestos_venta(venta):
+    """
+    Impuestos de una venta a partir de sus detalles y los datos fiscales de cada
+    producto. Los precios de venta ya incluyen el IVA, así que el total es venta.total
+    tanto en el ticket como en la factura.
+    """
+    return calcular_impuestos((
+        (detalle.subtotal, detalle.producto.objeto_impuesto_sat, detalle.producto.tasa_iva_sat)
+        for detalle in venta.detalles
+    ), incluidos=True)
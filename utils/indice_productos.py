@@ -0,0 +1,82 @@
+import threading
+from collections import namedtuple
+from models import Producto, db
+
+# Registro compacto de producto para las búsquedas del POS
+ProductoIndexado = namedtuple('ProductoIndexado', [
+    'id', 'codigo', 'codigo_barras', 'nombre', 'precio_venta', 'stock', 'stock_minimo', 'activo'
+])
+
+
+class IndiceProductos:
+    """
+    Índice en memoria de productos por código de barras, código e id.
+    Se comparte en todo el proceso y se reconstruye bajo demanda.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_id = {}
+        self._por_codigo_barras = {}
+        self._por_codigo = {}
+        self._cargado = False
+
+    def cargar(self):
+        """Carga todos los productos en el índice (requiere contexto de aplicación)"""
+        filas = db.session.query(
+            Producto.id, Producto.codigo, Producto.codigo_barras, Producto.nombre,
+            Producto.precio_venta, Producto.stock, Producto.stock_minimo, Producto.activo
+        ).all()
+
+        por_id = {}
+        por_codigo_barras = {}
+        por_codigo = {}
+        for fila in filas:
+            registro = ProductoIndexado(*fila)
+            por_id[registro.id] = registro
+            if registro.codigo_barras:
+                por_codigo_barras[registro.codigo_barras] = registro.id
+            if registro.codigo:
+                por_codigo[registro.codigo] = registro.id
+
+        # Se reemplazan los diccionarios completos para que los lectores nunca vean un índice a medias
+        with self._lock:
+            self._por_id = por_id
+            self._por_codigo_barras = por_codigo_barras
+            self._por_codigo = por_codigo
+            self._cargado = True
+
+    def invalidar(self):
+        """Marca el índice como obsoleto; se recarga en la siguiente búsqueda"""
+        with self._lock:
+            self._cargado = False
+
+    def buscar(self, codigo):
+        """Busca por código de barras, código o id, en ese orden"""
+        if not self._cargado:
+            self.cargar()
+
+        codigo = str(codigo).strip()
+        producto_id = self._por_codigo_barras.get(codigo)
+        if producto_id is None:
+            producto_id = self._por_codigo.get(codigo)
+        if producto_id is None and codigo.isdigit():
+            producto_id = int(codigo)
+
+        return self._por_id.get(producto_id)
+
+    def obtener(self, producto_id):
+        """Devuelve el producto con ese id, o None"""
+        if not self._cargado:
+            self.cargar()
+        return self._por_id.get(producto_id)
+
+    def actualizar_stock(self, producto_id, stock):
+        """Actualiza el stock de un producto ya indexado sin recargar el índice"""
+        with self._lock:
+            registro = self._por_id.get(producto_id)
+            if registro is not None:
+                self._por_id[producto_id] = registro._replace(stock=stock)
+
+
+indice_productos = IndiceProductos()
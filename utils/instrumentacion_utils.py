@@ -0,0 +1,184 @@
+import math
+import threading
+import time
+from collections import deque
+from flask import request
+from sqlalchemy import event
+from models import db
+
+# Muestras recientes que se conservan por ruta para calcular los percentiles
+VENTANA_MUESTRAS = 1024
+
+CUANTILES = (0.5, 0.95, 0.99)
+
+# (nombre, descripción) de cada métrica por petición, en el orden en que se exportan
+METRICAS_PETICION = (
+    ('tienda_peticion_segundos', 'Duración de la petición en segundos'),
+    ('tienda_peticion_consultas_sql', 'Sentencias SQL ejecutadas por petición'),
+    ('tienda_peticion_sql_segundos', 'Tiempo dentro de la base de datos por petición'),
+    ('tienda_peticion_filas_leidas', 'Filas leídas de la base de datos por petición')
+)
+
+_estado = threading.local()
+
+
+class SerieMetrica:
+    """Suma, cuenta y ventana circular de las últimas muestras de una métrica"""
+
+    __slots__ = ('muestras', 'suma', 'cuenta')
+
+    def __init__(self):
+        self.muestras = deque(maxlen=VENTANA_MUESTRAS)
+        self.suma = 0.0
+        self.cuenta = 0
+
+    def registrar(self, valor):
+        self.muestras.append(valor)
+        self.suma += valor
+        self.cuenta += 1
+
+    def cuantiles(self):
+        """Percentiles por rango más cercano sobre la ventana actual"""
+        ordenadas = sorted(self.muestras)
+        if not ordenadas:
+            return []
+        return [(q, ordenadas[max(0, math.ceil(q * len(ordenadas)) - 1)]) for q in CUANTILES]
+
+
+class RegistroMetricas:
+    """
+    Métricas por ruta en memoria del proceso. Registrar una petición solo agrega
+    muestras; los percentiles se calculan al exportar.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self._peticiones = {}
+
+    def registrar_peticion(self, ruta, codigo, valores):
+        """`valores` sigue el orden de METRICAS_PETICION"""
+        with self._lock:
+            series = self._series.get(ruta)
+            if series is None:
+                series = self._series[ruta] = tuple(SerieMetrica() for _ in METRICAS_PETICION)
+            for serie, valor in zip(series, valores):
+                serie.registrar(valor)
+            clave = (ruta, codigo)
+            self._peticiones[clave] = self._peticiones.get(clave, 0) + 1
+
+    def limpiar(self):
+        with self._lock:
+            self._series.clear()
+            self._peticiones.clear()
+
+    def exportar_prometheus(self):
+        """Texto en el formato de exposición de Prometheus (versión 0.0.4)"""
+        with self._lock:
+            series = {ruta: [(s.cuantiles(), s.suma, s.cuenta) for s in valores]
+                      for ruta, valores in self._series.items()}
+            peticiones = dict(self._peticiones)
+
+        lineas = [
+            '# HELP tienda_peticiones_total Peticiones atendidas por ruta y código de respuesta',
+            '# TYPE tienda_peticiones_total counter'
+        ]
+        for (ruta, codigo), total in sorted(peticiones.items()):
+            lineas.append(f'tienda_peticiones_total{{ruta="{ruta}",codigo="{codigo}"}} {total}')
+
+        for indice, (nombre, descripcion) in enumerate(METRICAS_PETICION):
+            lineas.append(f'# HELP {nombre} {descripcion}')
+            lineas.append(f'# TYPE {nombre} summary')
+            for ruta in sorted(series):
+                cuantiles, suma, cuenta = series[ruta][indice]
+                for q, valor in cuantiles:
+                    lineas.append(f'{nombre}{{ruta="{ruta}",quantile="{q}"}} {valor:.6g}')
+                lineas.append(f'{nombre}_sum{{ruta="{ruta}"}} {suma:.6g}')
+                lineas.append(f'{nombre}_count{{ruta="{ruta}"}} {cuenta}')
+        return '\n'.join(lineas) + '\n'
+
+
+registro_metricas = RegistroMetricas()
+
+
+class MedicionPeticion:
+    __slots__ = ('inicio', 'consultas', 'tiempo_sql', 'filas')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tiempo_sql = 0.0
+        self.filas = 0
+
+
+def _contar_fila(cursor, fila):
+    """row_factory de sqlite3: se llama por cada fila leída y la devuelve sin cambios"""
+    medicion = getattr(_estado, 'medicion', None)
+    if medicion is not None:
+        medicion.filas += 1
+    return fila
+
+
+def _al_conectar(conexion_dbapi, registro):
+    if hasattr(conexion_dbapi, 'row_factory'):
+        conexion_dbapi.row_factory = _contar_fila
+
+
+def _antes_de_ejecutar(conexion, cursor, sentencia, parametros, contexto, executemany):
+    if getattr(_estado, 'medicion', None) is not None:
+        conexion.info.setdefault('inicio_sentencia', []).append(time.perf_counter())
+
+
+def _despues_de_ejecutar(conexion, cursor, sentencia, parametros, contexto, executemany):
+    medicion = getattr(_estado, 'medicion', None)
+    inicios = conexion.info.get('inicio_sentencia')
+    if medicion is not None and inicios:
+        medicion.consultas += 1
+        medicion.tiempo_sql += time.perf_counter() - inicios.pop()
+
+
+def _al_fallar(contexto):
+    # Una sentencia que falla no pasa por after_cursor_execute; se descarta su marca de inicio
+    inicios = contexto.connection.info.get('inicio_sentencia') if contexto.connection is not None else None
+    if inicios:
+        inicios.pop()
+
+
+def registrar_instrumentacion(app):
+    """
+    Mide cada petición (duración, sentencias SQL, tiempo en SQL y filas leídas) y la
+    agrega a registro_metricas. Debe llamarse antes de abrir conexiones, para que todas
+    cuenten filas. Con INSTRUMENTACION = False al registrar no se instala nada (ni el
+    row_factory, que cuesta una llamada por fila también fuera de las peticiones); si
+    está activa, cambiarla a False después solo deja de medir las peticiones.
+    """
+    if not app.config.get('INSTRUMENTACION', True):
+        return
+
+    with app.app_context():
+        for motor in db.engines.values():
+            event.listen(motor, 'connect', _al_conectar)
+            event.listen(motor, 'before_cursor_execute', _antes_de_ejecutar)
+            event.listen(motor, 'after_cursor_execute', _despues_de_ejecutar)
+            event.listen(motor, 'handle_error', _al_fallar)
+
+    @app.before_request
+    def _iniciar_medicion():
+        if app.config.get('INSTRUMENTACION', True):
+            _estado.medicion = MedicionPeticion()
+
+    @app.after_request
+    def _registrar_medicion(respuesta):
+        medicion = getattr(_estado, 'medicion', None)
+        if medicion is not None and request.endpoint != 'static':
+            registro_metricas.registrar_peticion(request.endpoint or 'sin_ruta', respuesta.status_code, (
+                time.perf_counter() - medicion.inicio,
+                medicion.consultas,
+                medicion.tiempo_sql,
+                medicion.filas
+            ))
+        return respuesta
+
+    @app.teardown_request
+    def _terminar_medicion(exc):
+        _estado.medicion = None
@@ -0,0 +1,152 @@
+import threading
+import time
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import db, Proveedor, Cliente, Producto
+
+# Segundos entre reconciliaciones completas de los contadores contra la base de datos
+INTERVALO_RECONCILIACION = 300
+
+MODELOS_CONTADOS = {
+    Proveedor: 'total_proveedores',
+    Cliente: 'total_clientes',
+    Producto: 'total_productos'
+}
+
+
+def _bajo_stock(stock, stock_minimo):
+    """Misma regla que Producto.necesita_reabastecimiento, con los defaults del modelo para NULL"""
+    return (stock if stock is not None else 0) <= (stock_minimo if stock_minimo is not None else 5)
+
+
+def _valor_anterior(estado, atributo):
+    historial = estado.attrs[atributo].history
+    if historial.deleted:
+        return historial.deleted[0]
+    return estado.attrs[atributo].value
+
+
+class MetricasDashboard:
+    """
+    Contadores del dashboard en memoria. Se ajustan de forma incremental con los
+    eventos de la sesión y se reconcilian periódicamente con COUNT(*).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._valores = {}
+
+    def reconciliar(self):
+        """Recalcula todos los contadores desde la base de datos (requiere contexto de aplicación)"""
+        valores = {
+            'total_proveedores': db.session.query(db.func.count(Proveedor.id)).scalar() or 0,
+            'total_clientes': db.session.query(db.func.count(Cliente.id)).scalar() or 0,
+            'total_productos': db.session.query(db.func.count(Producto.id)).scalar() or 0,
+            'productos_bajo_stock': db.session.query(db.func.count(Producto.id)).filter(
+                Producto.stock <= Producto.stock_minimo
+            ).scalar() or 0
+        }
+        with self._lock:
+            self._valores = valores
+        return valores
+
+    def obtener(self):
+        """Devuelve una copia de los contadores, cargándolos si aún no existen"""
+        if not self._valores:
+            self.reconciliar()
+        with self._lock:
+            return dict(self._valores)
+
+    def ajustar(self, cambios):
+        """Aplica incrementos {'contador': delta}; sin valores cargados no hay nada que ajustar"""
+        with self._lock:
+            if not self._valores:
+                return
+            for contador, delta in cambios.items():
+                self._valores[contador] = self._valores.get(contador, 0) + delta
+
+
+metricas_dashboard = MetricasDashboard()
+
+
+def _cambios_pendientes(session):
+    return session.info.setdefault('metricas_pendientes', {})
+
+
+def _sumar(cambios, contador, delta):
+    if delta:
+        cambios[contador] = cambios.get(contador, 0) + delta
+
+
+# active_history obliga a cargar el valor anterior al asignar stock sobre un objeto expirado,
+# sin eso el historial no permite saber si el producto ya estaba en stock bajo
+@event.listens_for(Producto.stock, 'set', active_history=True)
+@event.listens_for(Producto.stock_minimo, 'set', active_history=True)
+def _conservar_valor_anterior(objeto, valor, anterior, iniciador):
+    pass
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_cambios(session, flush_context):
+    """Acumula los deltas de la transacción; se aplican solo si se confirma"""
+    cambios = _cambios_pendientes(session)
+
+    for objeto in session.new:
+        contador = MODELOS_CONTADOS.get(type(objeto))
+        if contador:
+            _sumar(cambios, contador, 1)
+        if isinstance(objeto, Producto) and _bajo_stock(objeto.stock, objeto.stock_minimo):
+            _sumar(cambios, 'productos_bajo_stock', 1)
+
+    for objeto in session.deleted:
+        contador = MODELOS_CONTADOS.get(type(objeto))
+        if contador:
+            _sumar(cambios, contador, -1)
+        if isinstance(objeto, Producto) and _bajo_stock(objeto.stock, objeto.stock_minimo):
+            _sumar(cambios, 'productos_bajo_stock', -1)
+
+    for objeto in session.dirty:
+        if not isinstance(objeto, Producto):
+            continue
+        estado = inspect(objeto)
+        antes = _bajo_stock(_valor_anterior(estado, 'stock'), _valor_anterior(estado, 'stock_minimo'))
+        despues = _bajo_stock(objeto.stock, objeto.stock_minimo)
+        _sumar(cambios, 'productos_bajo_stock', int(despues) - int(antes))
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_cambios(session):
+    cambios = session.info.pop('metricas_pendientes', None)
+    if cambios:
+        metricas_dashboard.ajustar(cambios)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_cambios(session):
+    session.info.pop('metricas_pendientes', None)
+
+
+def iniciar_reconciliacion_periodica(app, intervalo=INTERVALO_RECONCILIACION, tareas=()):
+    """
+    Lanza un hilo en segundo plano que reconcilia los contadores cada `intervalo`
+    segundos. `tareas` son funciones de mantenimiento que se ejecutan en el mismo ciclo.
+    """
+    def reconciliar_en_ciclo():
+        while True:
+            time.sleep(intervalo)
+            with app.app_context():
+                try:
+                    metricas_dashboard.reconciliar()
+                except Exception as e:
+                    app.logger.warning(f"No se pudieron reconciliar las métricas: {str(e)}")
+                for tarea in tareas:
+                    try:
+                        tarea()
+                    except Exception as e:
+                        db.session.rollback()
+                        app.logger.warning(f"Falló la tarea {tarea.__name__}: {str(e)}")
+                db.session.remove()
+
+    hilo = threading.Thread(target=reconciliar_en_ciclo, name='reconciliacion-metricas', daemon=True)
+    hilo.start()
+    return hilo
@@ -0,0 +1,131 @@
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import tuple_
+
+TAMANO_PAGINA_DEFECTO = 50
+TAMANO_PAGINA_MAXIMO = 500
+
+# Segundos que se reutiliza un total antes de volver a contarlo
+VIGENCIA_CONTEOS = 60
+
+# Totales guardados como máximo; los filtros vienen de la petición y pueden ser cualquier texto
+MAXIMO_CONTEOS_EN_CACHE = 1000
+
+
+def obtener_tamano_pagina(args):
+    """Lee el tamaño de página de los parámetros de la petición, acotado al máximo permitido"""
+    try:
+        tamano = int(args.get('por_pagina', TAMANO_PAGINA_DEFECTO))
+    except (TypeError, ValueError):
+        tamano = TAMANO_PAGINA_DEFECTO
+    return max(1, min(tamano, TAMANO_PAGINA_MAXIMO))
+
+
+def codificar_cursor(nombre, id):
+    """Codifica la última posición (nombre, id) de una página como texto seguro para URL"""
+    datos = json.dumps([nombre, id]).encode('utf-8')
+    return base64.urlsafe_b64encode(datos).decode('ascii')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (nombre, id) de un cursor, o None si viene vacío o es inválido"""
+    if not cursor:
+        return None
+    try:
+        nombre, id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return nombre, int(id)
+    except (ValueError, TypeError):
+        return None
+
+
+def paginar_por_keyset(query, columna_nombre, columna_id, cursor=None, tamano=TAMANO_PAGINA_DEFECTO):
+    """
+    Devuelve (registros, siguiente_cursor) buscando a partir del cursor sobre (nombre, id),
+    sin OFFSET, de modo que cada página cuesta lo mismo sin importar qué tan adentro esté.
+    """
+    posicion = decodificar_cursor(cursor)
+    if posicion:
+        query = query.filter(tuple_(columna_nombre, columna_id) > tuple_(*posicion))
+
+    registros = query.order_by(columna_nombre, columna_id).limit(tamano + 1).all()
+
+    siguiente_cursor = None
+    if len(registros) > tamano:
+        registros = registros[:tamano]
+        ultimo = registros[-1]
+        siguiente_cursor = codificar_cursor(
+            getattr(ultimo, columna_nombre.key), getattr(ultimo, columna_id.key)
+        )
+
+    return registros, siguiente_cursor
+
+
+class CacheConteos:
+    """Cache en memoria de totales por listado y filtros, con vigencia y tamaño limitados"""
+
+    def __init__(self, vigencia=VIGENCIA_CONTEOS, maximo=MAXIMO_CONTEOS_EN_CACHE):
+        self._lock = threading.Lock()
+        self._valores = OrderedDict()
+        self.vigencia = vigencia
+        self.maximo = maximo
+
+    def contar(self, tabla, filtros, query):
+        """Devuelve el total de `query`, reutilizando el último valor si sigue vigente"""
+        clave = (tabla, tuple(sorted(filtros.items())))
+        ahora = time.monotonic()
+
+        with self._lock:
+            guardado = self._valores.get(clave)
+        if guardado and guardado[1] > ahora:
+            return guardado[0]
+
+        total = query.order_by(None).count()
+        with self._lock:
+            self._valores[clave] = (total, ahora + self.vigencia)
+            self._valores.move_to_end(clave)
+            # Las entradas quedan en orden de escritura, que es también el de vencimiento:
+            # se quitan las vencidas del frente y, si aún sobran, las más viejas
+            while self._valores and (
+                len(self._valores) > self.maximo or next(iter(self._valores.values()))[1] <= ahora
+            ):
+                self._valores.popitem(last=False)
+        return total
+
+    def invalidar(self, tabla):
+        """Descarta todos los totales guardados de una tabla"""
+        with self._lock:
+            for clave in [clave for clave in self._valores if clave[0] == tabla]:
+                del self._valores[clave]
+
+
+cache_conteos = CacheConteos()
+
+
+def paginar_listado(query, columna_nombre, columna_id, args, tabla, filtros):
+    """
+    Aplica paginación por keyset a un listado y devuelve (registros, paginacion), donde
+    paginacion trae el total (desde la cache), el tamaño de página y los parámetros
+    para pedir la página siguiente.
+    """
+    tamano = obtener_tamano_pagina(args)
+    cursor = args.get('cursor')
+    total = cache_conteos.contar(tabla, filtros, query)
+    registros, siguiente_cursor = paginar_por_keyset(query, columna_nombre, columna_id, cursor, tamano)
+
+    args_primera = {clave: valor for clave, valor in args.items() if clave != 'cursor'}
+    args_siguiente = None
+    if siguiente_cursor:
+        args_siguiente = dict(args_primera, cursor=siguiente_cursor)
+
+    paginacion = {
+        'total': total,
+        'por_pagina': tamano,
+        'es_primera': not cursor,
+        'siguiente_cursor': siguiente_cursor,
+        'args_primera': args_primera,
+        'args_siguiente': args_siguiente
+    }
+    return registros, paginacion
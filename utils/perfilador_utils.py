@@ -0,0 +1,152 @@
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from flask import g, request
+
+# Segundos entre muestras; con el intervalo de cambio de hilo por defecto de CPython (5 ms)
+# no tiene caso muestrear más seguido
+INTERVALO_MUESTREO = 0.005
+
+# Perfiles que se conservan en disco; al guardar uno nuevo se borran los más antiguos
+PERFILES_CONSERVADOS = 100
+
+EXTENSION_PERFIL = '.folded'
+
+# Rutas que nunca se perfilan (el propio índice de perfiles y los archivos estáticos)
+RUTAS_EXCLUIDAS = {'static', 'lista_perfiles', 'descargar_perfil'}
+
+
+@lru_cache(maxsize=None)
+def _etiqueta(codigo):
+    return f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})'
+
+
+class Muestreador(threading.Thread):
+    """Toma la pila de un hilo cada `intervalo` segundos y cuenta las pilas repetidas"""
+
+    def __init__(self, hilo_id, intervalo=INTERVALO_MUESTREO):
+        super().__init__(daemon=True)
+        self.hilo_id = hilo_id
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self.muestras = 0
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            marco = sys._current_frames().get(self.hilo_id)
+            pila = []
+            while marco is not None:
+                pila.append(_etiqueta(marco.f_code))
+                marco = marco.f_back
+            if pila:
+                self.pilas[';'.join(reversed(pila))] += 1
+                self.muestras += 1
+
+    def detener(self):
+        self._detener.set()
+        self.join()
+
+    def colapsado(self):
+        """Formato de pilas colapsadas ("a;b;c 12" por línea) que leen flamegraph.pl y speedscope"""
+        return ''.join(f'{pila} {total}\n' for pila, total in self.pilas.most_common())
+
+
+def directorio_perfiles(app):
+    return os.path.join(app.instance_path, 'perfiles')
+
+
+def perfilador_activo(app):
+    return bool(app.config.get('PERFILADOR_TOKEN') or app.config.get('PERFILADOR_MUESTREO'))
+
+
+def acceso_perfiles(app):
+    """True si la petición trae el token de administración en X-Perfilar o ?perfilar="""
+    token = app.config.get('PERFILADOR_TOKEN')
+    enviado = request.headers.get('X-Perfilar') or request.args.get('perfilar')
+    return bool(token and enviado and hmac.compare_digest(enviado, token))
+
+
+def _perfilar_peticion(app):
+    if request.endpoint in RUTAS_EXCLUIDAS:
+        return False
+    if acceso_perfiles(app):
+        return True
+    muestreo = app.config.get('PERFILADOR_MUESTREO') or 0
+    return muestreo > 0 and random.random() < muestreo
+
+
+def guardar_perfil(app, ruta, duracion, muestreador):
+    """Escribe el perfil colapsado; los datos del listado van en el nombre del archivo"""
+    directorio = directorio_perfiles(app)
+    os.makedirs(directorio, exist_ok=True)
+    nombre = (f"{datetime.now().strftime('%Y%m%d_%H%M%S')}__{ruta}__{duracion * 1000:.0f}ms"
+              f"__{muestreador.muestras}__{uuid.uuid4().hex[:8]}{EXTENSION_PERFIL}")
+    with open(os.path.join(directorio, nombre), 'w', encoding='utf-8') as archivo:
+        archivo.write(muestreador.colapsado())
+
+    antiguos = sorted(n for n in os.listdir(directorio) if n.endswith(EXTENSION_PERFIL))[:-PERFILES_CONSERVADOS]
+    for antiguo in antiguos:
+        try:
+            os.remove(os.path.join(directorio, antiguo))
+        except OSError:
+            pass
+    return nombre
+
+
+def listar_perfiles(app):
+    """Perfiles guardados, del más reciente al más antiguo"""
+    directorio = directorio_perfiles(app)
+    if not os.path.isdir(directorio):
+        return []
+
+    perfiles = []
+    for nombre in sorted(os.listdir(directorio), reverse=True):
+        partes = nombre[:-len(EXTENSION_PERFIL)].split('__')
+        if not nombre.endswith(EXTENSION_PERFIL) or len(partes) != 5:
+            continue
+        fecha, ruta, duracion, muestras, _ = partes
+        perfiles.append({
+            'archivo': nombre,
+            'fecha': datetime.strptime(fecha, '%Y%m%d_%H%M%S'),
+            'ruta': ruta,
+            'duracion_ms': int(duracion[:-2]),
+            'muestras': int(muestras)
+        })
+    return perfiles
+
+
+def registrar_perfilador(app):
+    """
+    Perfila por muestreo las peticiones que traen el token (PERFILADOR_TOKEN) o una
+    fracción aleatoria del tráfico (PERFILADOR_MUESTREO, de 0 a 1). Sin ninguno de los
+    dos configurado no se registra ningún hook.
+    """
+    if not perfilador_activo(app):
+        return
+
+    @app.before_request
+    def _iniciar_perfil():
+        if _perfilar_peticion(app):
+            g.muestreador = Muestreador(threading.get_ident(), app.config.get('PERFILADOR_INTERVALO', INTERVALO_MUESTREO))
+            g.inicio_perfil = time.perf_counter()
+            g.muestreador.start()
+
+    @app.teardown_request
+    def _terminar_perfil(exc):
+        muestreador = g.pop('muestreador', None)
+        if muestreador is None:
+            return
+        duracion = time.perf_counter() - g.pop('inicio_perfil')
+        muestreador.detener()
+        try:
+            guardar_perfil(app, request.endpoint or 'sin_ruta', duracion, muestreador)
+        except OSError as e:
+            app.logger.warning(f"No se pudo guardar el perfil: {str(e)}")
@@ -1,19 +1,43 @@
-import random
-import string
 from datetime import datetime
-from models import Venta, DetalleVenta, Producto
+from sqlalchemy import bindparam, text
+from models import Venta, DetalleVenta, Producto, ContadorFolio
+from utils.folios_utils import asignador_folios
+from utils.indice_productos import indice_productos
+from utils.metricas_utils import metricas_dashboard
+from utils.resumen_ventas_utils import acumular_venta, obtener_resumen_rango
 
 def generar_folio():
-    """Genera un folio único para la venta"""
-    fecha = datetime.now().strftime('%Y%m%d')
-    random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-    return f"{fecha}-{random_str}"
+    """Genera el siguiente folio de venta (serie VTA)"""
+    return asignador_folios.siguiente('VTA')
 
 def procesar_venta(carrito, cliente_id=None, efectivo=0):
-    """Procesa una venta y actualiza el inventario"""
+    """
+    Procesa una venta y actualiza el inventario en una sola transacción.
+    Los productos se cargan en una consulta, el stock se descuenta con
+    UPDATE condicionales (stock >= cantidad) y los detalles se insertan en bloque.
+    """
     from models import db
     
     try:
+        if not carrito:
+            raise Exception("El carrito está vacío")
+        
+        # Agrupar cantidades por producto (el carrito puede repetir un producto)
+        cantidades = {}
+        for item in carrito:
+            producto_id = int(item['producto_id'])
+            cantidades[producto_id] = cantidades.get(producto_id, 0) + int(item['cantidad'])
+        
+        # Cargar todos los productos del carrito en una sola consulta
+        productos = {
+            fila.id: fila for fila in db.session.query(
+                Producto.id, Producto.nombre, Producto.stock
+            ).filter(Producto.id.in_(cantidades)).all()
+        }
+        faltantes = [producto_id for producto_id in cantidades if producto_id not in productos]
+        if faltantes:
+            raise Exception(f"Producto no encontrado: {faltantes[0]}")
+        
         # Calcular total
         total = sum(item['subtotal'] for item in carrito)
         
@@ -31,30 +55,63 @@ def procesar_venta(carrito, cliente_id=None, efectivo=0):
         )
         
         db.session.add(venta)
+        db.session.flush()
+        
+        # Descontar stock de forma atómica; solo se actualiza si alcanza la existencia
+        tabla = Producto.__table__
+        descontar = tabla.update().where(
+            tabla.c.id == bindparam('b_id'),
+            tabla.c.stock >= bindparam('b_cantidad')
+        ).values(stock=tabla.c.stock - bindparam('b_cantidad'))
+        
+        resultado = db.session.execute(descontar, [
+            {'b_id': producto_id, 'b_cantidad': cantidad}
+            for producto_id, cantidad in cantidades.items()
+        ])
         
-        # Crear detalles de venta y actualizar inventario
+        if resultado.rowcount != len(cantidades):
+            db.session.rollback()
+            existencias = dict(db.session.query(Producto.id, Producto.stock).filter(
+                Producto.id.in_(cantidades)
+            ).all())
+            for producto_id, cantidad in cantidades.items():
+                if (existencias.get(producto_id) or 0) < cantidad:
+                    return None, f"Stock insuficiente para {productos[producto_id].nombre}"
+            return None, "Stock insuficiente"
+        
+        # Crear detalles de venta en bloque
+        db.session.execute(DetalleVenta.__table__.insert(), [{
+            'venta_id': venta.id,
+            'producto_id': int(item['producto_id']),
+            'cantidad': int(item['cantidad']),
+            'precio_unitario': item['precio'],
+            'subtotal': item['subtotal']
+        } for item in carrito])
+        
+        # Actualizar los resúmenes de ventas dentro de la misma transacción
+        importes = {}
         for item in carrito:
-            producto = Producto.query.get(item['producto_id'])
-            
-            # Verificar stock suficiente
-            if producto.stock < item['cantidad']:
-                raise Exception(f"Stock insuficiente para {producto.nombre}")
-            
-            # Actualizar stock
-            producto.stock -= item['cantidad']
-            
-            # Crear detalle de venta
-            detalle = DetalleVenta(
-                venta=venta,
-                producto_id=item['producto_id'],
-                cantidad=item['cantidad'],
-                precio_unitario=item['precio'],
-                subtotal=item['subtotal']
-            )
-            
-            db.session.add(detalle)
+            producto_id = int(item['producto_id'])
+            importes[producto_id] = importes.get(producto_id, 0) + float(item['subtotal'])
+        acumular_venta(venta.fecha_creacion, total, {
+            producto_id: (cantidad, importes[producto_id]) for producto_id, cantidad in cantidades.items()
+        })
+        
+        nuevo_stock = db.session.query(Producto.id, Producto.stock, Producto.stock_minimo).filter(
+            Producto.id.in_(cantidades)
+        ).all()
         
         db.session.commit()
+        
+        # Mantener el índice del POS y el contador de stock bajo al día con el nuevo stock
+        nuevos_bajo_stock = 0
+        for producto_id, stock, stock_minimo in nuevo_stock:
+            indice_productos.actualizar_stock(producto_id, stock)
+            if stock <= stock_minimo < stock + cantidades[producto_id]:
+                nuevos_bajo_stock += 1
+        if nuevos_bajo_stock:
+            metricas_dashboard.ajustar({'productos_bajo_stock': nuevos_bajo_stock})
+        
         return venta, None
         
     except Exception as e:
@@ -62,23 +119,146 @@ def procesar_venta(carrito, cliente_id=None, efectivo=0):
         return None, str(e)
 
 def buscar_producto_por_codigo(codigo):
-    """Busca un producto por código de barras"""
-    return Producto.query.filter(
-        (Producto.codigo_barras == codigo) | (Producto.id == codigo)
-    ).first()
+    """Busca un producto por código de barras, código o id usando el índice en memoria"""
+    return indice_productos.buscar(codigo)
+
+def cancelar_venta(venta_id):
+    """
+    Cancela una venta completada: regresa el stock vendido y la descuenta de
+    los resúmenes de ventas, todo en una transacción.
+    """
+    from models import db
+    
+    try:
+        venta = db.session.get(Venta, venta_id)
+        if not venta:
+            return None, "Venta no encontrada"
+        
+        # Solo una petición puede pasar la venta de completada a cancelada
+        cancelada = db.session.execute(
+            Venta.__table__.update().where(
+                Venta.__table__.c.id == venta_id,
+                Venta.__table__.c.estado == 'completada'
+            ).values(estado='cancelada')
+        )
+        if cancelada.rowcount != 1:
+            db.session.rollback()
+            return None, "Solo se pueden cancelar ventas completadas"
+        
+        lineas = {}
+        for producto_id, cantidad, subtotal in db.session.query(
+            DetalleVenta.producto_id, DetalleVenta.cantidad, DetalleVenta.subtotal
+        ).filter(DetalleVenta.venta_id == venta_id):
+            anterior = lineas.get(producto_id, (0, 0))
+            lineas[producto_id] = (anterior[0] + cantidad, anterior[1] + float(subtotal))
+        
+        if lineas:
+            tabla = Producto.__table__
+            db.session.execute(
+                tabla.update().where(tabla.c.id == bindparam('b_id')).values(
+                    stock=tabla.c.stock + bindparam('b_cantidad')
+                ),
+                [{'b_id': producto_id, 'b_cantidad': cantidad} for producto_id, (cantidad, importe) in lineas.items()]
+            )
+        
+        acumular_venta(venta.fecha_creacion, venta.total, lineas, signo=-1)
+        nuevo_stock = db.session.query(Producto.id, Producto.stock, Producto.stock_minimo).filter(
+            Producto.id.in_(lineas)
+        ).all()
+        db.session.commit()
+        
+        # El stock regresó: se actualiza el índice y salen del contador los que dejaron el stock bajo
+        salieron_bajo_stock = 0
+        for producto_id, stock, stock_minimo in nuevo_stock:
+            indice_productos.actualizar_stock(producto_id, stock)
+            if stock - lineas[producto_id][0] <= stock_minimo < stock:
+                salieron_bajo_stock += 1
+        if salieron_bajo_stock:
+            metricas_dashboard.ajustar({'productos_bajo_stock': -salieron_bajo_stock})
+        
+        return venta, None
+        
+    except Exception as e:
+        db.session.rollback()
+        return None, str(e)
 
 def obtener_resumen_ventas(fecha_inicio=None, fecha_fin=None):
-    """Obtiene un resumen de ventas para el día o rango de fechas"""
+    """
+    Obtiene un resumen de ventas para el día o rango de fechas (inclusive).
+    Se lee de resumen_ventas_diario, no de la tabla de ventas.
+    """
+    return obtener_resumen_rango(fecha_inicio, fecha_fin)
+
+
+# Contador (en contadores_folio) de cambios al catálogo del POS
+SERIE_VERSION_CATALOGO = 'CATALOGO'
+
+# Cada producto insertado o modificado toma el siguiente número del contador. El número se
+# toma con el candado de escritura de la transacción que cambia el producto, así que sigue
+# el orden de confirmación: una caja que ya vio el número N no puede perder un cambio que
+# se confirme después con un número menor (lo que sí pasaba con fechas de reloj).
+_SQL_TOMAR_VERSION = f"""
+        INSERT INTO contadores_folio(serie, ultimo) VALUES ('{SERIE_VERSION_CATALOGO}', 1)
+            ON CONFLICT(serie) DO UPDATE SET ultimo = ultimo + 1;
+        UPDATE productos SET version_catalogo = (
+            SELECT ultimo FROM contadores_folio WHERE serie = '{SERIE_VERSION_CATALOGO}'
+        ) WHERE id = new.id;
+"""
+SQL_VERSION_CATALOGO = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS productos_version_insertar AFTER INSERT ON productos BEGIN
+        {_SQL_TOMAR_VERSION}
+    END
+    """,
+    # La condición evita que el UPDATE del propio trigger vuelva a tomar número
+    f"""
+    CREATE TRIGGER IF NOT EXISTS productos_version_actualizar AFTER UPDATE ON productos
+    WHEN new.version_catalogo IS old.version_catalogo BEGIN
+        {_SQL_TOMAR_VERSION}
+    END
+    """
+]
+
+
+def inicializar_version_catalogo():
+    """Crea los triggers que numeran los cambios de productos para el catálogo del POS"""
+    from models import db
+    
+    for sql in SQL_VERSION_CATALOGO:
+        db.session.execute(text(sql))
+    db.session.commit()
+
+def obtener_version_catalogo():
+    """
+    Devuelve (version, total) del catálogo del POS. La versión combina el último
+    número de cambio de productos y el número de productos activos; con el total
+    las cajas detectan productos eliminados y piden el catálogo completo.
+    """
+    from models import db
+    
+    ultimo = db.session.query(ContadorFolio.ultimo).filter(
+        ContadorFolio.serie == SERIE_VERSION_CATALOGO
+    ).scalar() or 0
+    total = db.session.query(db.func.count(Producto.id)).filter(Producto.activo == True).scalar()
+    return f"{ultimo}_{total}", total
+
+def obtener_catalogo_pos(desde=None, despues_de_id=0, limite=500):
+    """
+    Página del catálogo del POS ordenada por id. Con `desde` (una versión previa)
+    solo incluye los productos modificados a partir de ella, también los
+    desactivados para que la caja los quite.
+    """
     from models import db
     
     query = db.session.query(
-        db.func.count(Venta.id).label('total_ventas'),
-        db.func.sum(Venta.total).label('total_ingresos')
-    ).filter(Venta.estado == 'completada')
+        Producto.id, Producto.codigo, Producto.codigo_barras, Producto.nombre,
+        Producto.precio_venta, Producto.stock, Producto.activo, Producto.imagen_url
+    ).filter(Producto.id > despues_de_id)
     
-    if fecha_inicio:
-        query = query.filter(Venta.fecha_creacion >= fecha_inicio)
-    if fecha_fin:
-        query = query.filter(Venta.fecha_creacion <= fecha_fin)
+    marca = int(desde.split('_', 1)[0]) if desde else 0
+    if marca:
+        query = query.filter(Producto.version_catalogo > marca)
+    else:
+        query = query.filter(Producto.activo == True)
     
-    return query.first()
\ No newline at end of file
+    return query.order_by(Producto.id).limit(limite).all()
@@ -0,0 +1,228 @@
+import math
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert, literal
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+from models import (
+    db, Producto, Proveedor, Venta, DetalleVenta, RequisicionCompra, DetalleRequisicion,
+    CotizacionCompra, DetalleCotizacionCompra, OrdenCompra, DetalleOrdenCompra, ConfiguracionSistema
+)
+from utils.folios_utils import asignador_folios
+
+# Días de ventas con que se calcula la velocidad de cada producto
+DIAS_HISTORIAL = 28
+
+# Se pide cuando el stock alcanza para menos de estos días (entrega del proveedor más margen)
+DIAS_COBERTURA_MINIMA = 7
+
+# Días de venta que debe cubrir el stock después de recibir el pedido
+DIAS_COBERTURA_OBJETIVO = 21
+
+# Documentos abiertos cuyas cantidades ya vienen en camino y no se vuelven a pedir. Al
+# convertirse, el documento pasa a convertida_* y sus cantidades se cuentan en el siguiente
+ESTADOS_REQUISICION_ABIERTA = ('pendiente', 'aprobada')
+ESTADOS_COTIZACION_ABIERTA = ('pendiente', 'aceptada')
+ESTADOS_ORDEN_ABIERTA = ('pendiente', 'parcial')
+
+SOLICITANTE_REABASTECIMIENTO = 'Reabastecimiento automático'
+DEPARTAMENTO_REABASTECIMIENTO = 'Almacén'
+
+# Fecha de la última corrida nocturna; el upsert condicionado sobre esta clave evita
+# que dos procesos generen las requisiciones del mismo día
+CLAVE_ULTIMA_EJECUCION = 'reabastecimiento_ultima_ejecucion'
+
+Sugerencia = namedtuple('Sugerencia', [
+    'producto_id', 'nombre', 'proveedor_id', 'stock', 'stock_minimo', 'en_camino',
+    'velocidad', 'dias_cobertura', 'cantidad', 'precio_compra', 'unidad_medida'
+])
+
+ResultadoReabastecimiento = namedtuple('ResultadoReabastecimiento', [
+    'requisiciones', 'renglones', 'total_estimado', 'folios'
+])
+
+
+def _en_camino():
+    """Cantidades por producto en requisiciones, cotizaciones y órdenes de compra abiertas"""
+    requisiciones = db.session.query(
+        DetalleRequisicion.producto_id.label('producto_id'),
+        DetalleRequisicion.cantidad.label('cantidad')
+    ).join(RequisicionCompra).filter(RequisicionCompra.estado.in_(ESTADOS_REQUISICION_ABIERTA))
+    cotizaciones = db.session.query(
+        DetalleCotizacionCompra.producto_id, DetalleCotizacionCompra.cantidad
+    ).join(CotizacionCompra).filter(CotizacionCompra.estado.in_(ESTADOS_COTIZACION_ABIERTA))
+    ordenes = db.session.query(
+        DetalleOrdenCompra.producto_id, DetalleOrdenCompra.cantidad
+    ).join(OrdenCompra).filter(OrdenCompra.estado.in_(ESTADOS_ORDEN_ABIERTA))
+
+    abiertos = requisiciones.union_all(cotizaciones, ordenes).subquery()
+    return db.session.query(
+        abiertos.c.producto_id, db.func.sum(abiertos.c.cantidad).label('en_camino')
+    ).filter(abiertos.c.producto_id.isnot(None)).group_by(abiertos.c.producto_id).subquery()
+
+
+def calcular_sugerencias(dias_historial=DIAS_HISTORIAL, cobertura_minima=DIAS_COBERTURA_MINIMA,
+                         cobertura_objetivo=DIAS_COBERTURA_OBJETIVO):
+    """
+    Productos activos que hay que pedir. Las unidades vendidas en los últimos
+    `dias_historial` días salen de una sola agregación de detalles_venta; un producto
+    se pide si su stock (más lo que ya viene en camino) cubre menos de
+    `cobertura_minima` días o no pasa de stock_minimo, y la cantidad lleva el stock
+    a `cobertura_objetivo` días de venta más el stock mínimo.
+    """
+    desde = datetime.utcnow() - timedelta(days=dias_historial)
+    vendidas = db.session.query(
+        DetalleVenta.producto_id, db.func.sum(DetalleVenta.cantidad).label('vendidas')
+    ).join(Venta).filter(
+        Venta.estado == 'completada', Venta.fecha_creacion >= desde
+    ).group_by(DetalleVenta.producto_id).subquery()
+    en_camino = _en_camino()
+
+    unidades = db.func.coalesce(vendidas.c.vendidas, 0)
+    camino = db.func.coalesce(en_camino.c.en_camino, 0)
+    stock_minimo = db.func.coalesce(Producto.stock_minimo, 5)
+    disponible = db.func.coalesce(Producto.stock, 0) + camino
+
+    # La condición se evalúa en la base de datos: solo regresan los productos por pedir.
+    # disponible / velocidad < cobertura_minima, sin dividir entre cero
+    filas = db.session.query(
+        Producto.id, Producto.nombre, Producto.proveedor_id, db.func.coalesce(Producto.stock, 0),
+        stock_minimo, Producto.precio_compra, Producto.unidad_medida_sat, unidades, camino
+    ).outerjoin(vendidas, vendidas.c.producto_id == Producto.id) \
+        .outerjoin(en_camino, en_camino.c.producto_id == Producto.id) \
+        .filter(Producto.activo == True) \
+        .filter(db.or_(
+            disponible <= stock_minimo,
+            disponible * dias_historial < unidades * cobertura_minima
+        )).order_by(Producto.proveedor_id, Producto.id)
+
+    sugerencias = []
+    for producto_id, nombre, proveedor_id, stock, stock_minimo, precio, unidad, unidades, camino in filas:
+        disponible = stock + camino
+        velocidad = unidades / dias_historial
+        dias_cobertura = disponible / velocidad if velocidad else math.inf
+        # Al menos lo necesario para quedar arriba del stock mínimo, aunque no haya ventas
+        cantidad = max(math.ceil(velocidad * cobertura_objetivo) + stock_minimo, stock_minimo + 1) - disponible
+        if cantidad <= 0:
+            continue
+        sugerencias.append(Sugerencia(
+            producto_id, nombre, proveedor_id, stock, stock_minimo, camino,
+            velocidad, dias_cobertura, cantidad, precio or 0.0, unidad
+        ))
+    return sugerencias
+
+
+def _agrupar_por_proveedor(sugerencias):
+    grupos = {}
+    for sugerencia in sugerencias:
+        grupos.setdefault(sugerencia.proveedor_id, []).append(sugerencia)
+    return grupos
+
+
+def generar_requisiciones(sugerencias):
+    """
+    Crea una requisición pendiente por proveedor con sus renglones, en bloque y en
+    la transacción actual (no hace commit). Devuelve un ResultadoReabastecimiento.
+    """
+    grupos = _agrupar_por_proveedor(sugerencias)
+    if not grupos:
+        return ResultadoReabastecimiento(0, 0, 0.0, [])
+
+    nombres = dict(db.session.query(Proveedor.id, Proveedor.nombre).filter(Proveedor.id.in_(grupos)).all())
+    folios = asignador_folios.reservar('REQ', len(grupos))
+    ahora = datetime.utcnow()
+
+    encabezados = []
+    for folio, (proveedor_id, renglones) in zip(folios, grupos.items()):
+        encabezados.append({
+            'folio': folio,
+            'fecha_creacion': ahora,
+            'solicitante': SOLICITANTE_REABASTECIMIENTO,
+            'departamento': DEPARTAMENTO_REABASTECIMIENTO,
+            'justificacion': (f"Reabastecimiento del proveedor {nombres.get(proveedor_id, proveedor_id)} "
+                              f"(id {proveedor_id}): {len(renglones)} productos bajo "
+                              f"{DIAS_COBERTURA_MINIMA} días de cobertura o en stock mínimo"),
+            'estado': 'pendiente',
+            'total_estimado': round(sum(s.cantidad * s.precio_compra for s in renglones), 2)
+        })
+    ids = dict(db.session.execute(
+        insert(RequisicionCompra).returning(RequisicionCompra.folio, RequisicionCompra.id, sort_by_parameter_order=True),
+        encabezados
+    ).all())
+
+    detalles = [{
+        'requisicion_id': ids[folio],
+        'producto_id': s.producto_id,
+        'descripcion': s.nombre,
+        'cantidad': s.cantidad,
+        'unidad_medida': s.unidad_medida,
+        'precio_estimado': s.precio_compra
+    } for folio, renglones in zip(folios, grupos.values()) for s in renglones]
+    db.session.execute(DetalleRequisicion.__table__.insert(), detalles)
+
+    return ResultadoReabastecimiento(
+        len(encabezados), len(detalles), sum(e['total_estimado'] for e in encabezados), folios
+    )
+
+
+def _reclamar_ejecucion(hoy):
+    """True si este proceso es el primero en reclamar la corrida de `hoy` (toma el candado de escritura)"""
+    sentencia = insert_sqlite(ConfiguracionSistema).values(
+        clave=CLAVE_ULTIMA_EJECUCION, valor=hoy.isoformat(), tipo='string',
+        descripcion='Fecha de la última corrida de reabastecimiento', categoria='sistema'
+    )
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=['clave'],
+        set_={'valor': sentencia.excluded.valor},
+        where=ConfiguracionSistema.valor < sentencia.excluded.valor
+    ).returning(literal(1))
+    return db.session.execute(sentencia).first() is not None
+
+
+def ejecutar_reabastecimiento(hoy=None, **parametros):
+    """
+    Calcula las sugerencias y genera las requisiciones en una transacción. Con `hoy`
+    es la corrida nocturna: solo se ejecuta una vez por fecha aunque haya varios procesos.
+    """
+    try:
+        if hoy is not None and not _reclamar_ejecucion(hoy):
+            db.session.rollback()
+            return None
+        resultado = generar_requisiciones(calcular_sugerencias(**parametros))
+        db.session.commit()
+        return resultado
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def _segundos_hasta(hora):
+    ahora = datetime.now()
+    siguiente = ahora.replace(hour=hora, minute=0, second=0, microsecond=0)
+    if siguiente <= ahora:
+        siguiente += timedelta(days=1)
+    return (siguiente - ahora).total_seconds()
+
+
+def iniciar_reabastecimiento_nocturno(app, hora):
+    """Lanza un hilo que genera las requisiciones de reabastecimiento cada día a la `hora` local"""
+    def ejecutar_en_ciclo():
+        while True:
+            time.sleep(_segundos_hasta(hora))
+            with app.app_context():
+                try:
+                    resultado = ejecutar_reabastecimiento(hoy=date.today())
+                    if resultado is not None:
+                        app.logger.info(
+                            f"Reabastecimiento: {resultado.requisiciones} requisiciones, "
+                            f"{resultado.renglones} renglones"
+                        )
+                except Exception as e:
+                    app.logger.warning(f"No se pudo generar el reabastecimiento: {str(e)}")
+                finally:
+                    db.session.remove()
+
+    hilo = threading.Thread(target=ejecutar_en_ciclo, name='reabastecimiento-nocturno', daemon=True)
+    hilo.start()
+    return hilo
@@ -0,0 +1,117 @@
+from datetime import datetime, timezone
+from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert
+from models import db, Venta, ResumenVentasDiario, ResumenVentasProducto
+
+
+def fecha_hora_local(fecha_utc):
+    """Convierte una fecha_creacion (UTC sin zona) a (fecha, hora) en la hora local del servidor"""
+    local = fecha_utc.replace(tzinfo=timezone.utc).astimezone()
+    return local.date(), local.hour
+
+
+def _como_fecha(valor):
+    """Acepta date o datetime y devuelve date, para comparar siempre por día completo"""
+    if isinstance(valor, datetime):
+        return valor.date()
+    return valor
+
+
+def acumular_venta(fecha_creacion, total, lineas, signo=1):
+    """
+    Suma (signo=1) o resta (signo=-1) una venta en los resúmenes, dentro de la
+    transacción actual. `lineas` es {producto_id: (cantidad, importe)}.
+    """
+    fecha, hora = fecha_hora_local(fecha_creacion)
+
+    resumen = insert(ResumenVentasDiario).values(
+        fecha=fecha, hora=hora, total_ventas=signo, total_ingresos=signo * float(total)
+    )
+    db.session.execute(resumen.on_conflict_do_update(
+        index_elements=['fecha', 'hora'],
+        set_={
+            'total_ventas': ResumenVentasDiario.total_ventas + resumen.excluded.total_ventas,
+            'total_ingresos': ResumenVentasDiario.total_ingresos + resumen.excluded.total_ingresos
+        }
+    ))
+
+    if lineas:
+        por_producto = insert(ResumenVentasProducto)
+        db.session.execute(por_producto.on_conflict_do_update(
+            index_elements=['fecha', 'producto_id'],
+            set_={
+                'cantidad': ResumenVentasProducto.cantidad + por_producto.excluded.cantidad,
+                'importe': ResumenVentasProducto.importe + por_producto.excluded.importe
+            }
+        ), [{
+            'fecha': fecha,
+            'producto_id': producto_id,
+            'cantidad': signo * cantidad,
+            'importe': signo * float(importe)
+        } for producto_id, (cantidad, importe) in lineas.items()])
+
+
+def reconstruir_resumen_ventas():
+    """Regenera ambos resúmenes a partir de las ventas completadas"""
+    db.session.query(ResumenVentasDiario).delete()
+    db.session.query(ResumenVentasProducto).delete()
+    db.session.execute(text("""
+        INSERT INTO resumen_ventas_diario (fecha, hora, total_ventas, total_ingresos)
+        SELECT date(fecha_creacion, 'localtime'),
+               CAST(strftime('%H', fecha_creacion, 'localtime') AS INTEGER),
+               COUNT(*), SUM(total)
+        FROM ventas
+        WHERE estado = 'completada'
+        GROUP BY 1, 2
+    """))
+    db.session.execute(text("""
+        INSERT INTO resumen_ventas_producto (fecha, producto_id, cantidad, importe)
+        SELECT date(v.fecha_creacion, 'localtime'), d.producto_id, SUM(d.cantidad), SUM(d.subtotal)
+        FROM detalles_venta d
+        JOIN ventas v ON v.id = d.venta_id
+        WHERE v.estado = 'completada'
+        GROUP BY 1, 2
+    """))
+    db.session.commit()
+
+
+def resumen_pendiente_de_construir():
+    """True si hay ventas pero el resumen nunca se ha generado (bases de datos anteriores)"""
+    return (db.session.query(ResumenVentasDiario.fecha).first() is None and
+            db.session.query(Venta.id).first() is not None)
+
+
+def obtener_resumen_rango(fecha_inicio=None, fecha_fin=None):
+    """Número de ventas e ingresos entre dos fechas (inclusive), leídos del resumen"""
+    query = db.session.query(
+        db.func.coalesce(db.func.sum(ResumenVentasDiario.total_ventas), 0).label('total_ventas'),
+        db.func.coalesce(db.func.sum(ResumenVentasDiario.total_ingresos), 0).label('total_ingresos')
+    )
+    if fecha_inicio:
+        query = query.filter(ResumenVentasDiario.fecha >= _como_fecha(fecha_inicio))
+    if fecha_fin:
+        query = query.filter(ResumenVentasDiario.fecha <= _como_fecha(fecha_fin))
+    return query.first()
+
+
+def obtener_ventas_por_hora(fecha):
+    """Ventas e ingresos por hora de un día"""
+    return db.session.query(
+        ResumenVentasDiario.hora, ResumenVentasDiario.total_ventas, ResumenVentasDiario.total_ingresos
+    ).filter(
+        ResumenVentasDiario.fecha == _como_fecha(fecha)
+    ).order_by(ResumenVentasDiario.hora).all()
+
+
+def obtener_ventas_por_producto(fecha_inicio, fecha_fin, limite=20):
+    """Productos más vendidos (por importe) entre dos fechas"""
+    return db.session.query(
+        ResumenVentasProducto.producto_id,
+        db.func.sum(ResumenVentasProducto.cantidad).label('cantidad'),
+        db.func.sum(ResumenVentasProducto.importe).label('importe')
+    ).filter(
+        ResumenVentasProducto.fecha >= _como_fecha(fecha_inicio),
+        ResumenVentasProducto.fecha <= _como_fecha(fecha_fin)
+    ).group_by(
+        ResumenVentasProducto.producto_id
+    ).order_by(db.desc('importe')).limit(limite).all()